@@ -61,6 +61,16 @@ extras_require['xrootd'] = [
     'xrootdpyfs>=0.1.5',
 ]
 
+# Columnar (Parquet/Arrow) record exports
+extras_require['columnar'] = [
+    'pyarrow>=0.13.0',
+]
+
+# Zstandard compression for the exporter
+extras_require['zstd'] = [
+    'zstandard>=0.15.0',
+]
+
 setup_requires = [
     'Babel>=2.6.0',
     'pytest-runner>=2.7.0',
@@ -81,7 +91,7 @@ install_requires = [
     'Flask-Debugtoolbar>=0.10.1',
     'Flask>=1.0.2',
     'ftfy>=4.4.3,<5',
-    'httpretty>=0.9.6',
+    'futures>=3.1.1;python_version=="2.7"',
     'idutils>=1.1.5',
     'invenio-access>=1.1.0',
     'invenio-accounts>=1.1.1',
@@ -171,6 +181,7 @@ setup(
         ],
         'flask.commands': [
             'audit = zenodo.modules.auditor.cli:audit',
+            'exporter = zenodo.modules.exporter.cli:exporter',
             'github = zenodo.modules.github.cli:github',
             'stats = zenodo.modules.stats.cli:stats',
             'utils = zenodo.modules.utils.cli:utils',
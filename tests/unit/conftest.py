@@ -50,6 +50,7 @@ from invenio_access.models import ActionUsers
 from invenio_accounts.testutils import create_test_user
 from invenio_admin.permissions import action_admin_access
 from invenio_app.config import set_rate_limit
+from invenio_cache import current_cache
 from invenio_communities.models import Community
 from invenio_db import db as db_
 from invenio_deposit.permissions import \
@@ -338,6 +339,9 @@ def db(app):
     yield db_
     db_.session.remove()
     db_.drop_all()
+    # Records resolved by recid don't outlive the database
+    current_cache.clear()
+    app.extensions['zenodo-stats'].record_cache.local.clear()
 
 
 @pytest.yield_fixture
@@ -900,6 +904,30 @@ def bibtex_records(app, db, full_record):
     return (record_good, record_bad, record_empty, r_good)
 
 
+@pytest.fixture
+def search_hits(db, minimal_record, full_record):
+    """Search hits of some records, and the PID fetcher for them.
+
+    The last record is funded by grants.
+    """
+    metadata = [
+        dict(minimal_record, title='Title {0}'.format(i)) for i in range(2)]
+    metadata.append(full_record)
+    hits = []
+    for i, data in enumerate(metadata):
+        record = Record.create(dict(data, recid=i + 1))
+        PersistentIdentifier.create(
+            pid_type='recid', pid_value=str(i + 1), object_type='rec',
+            object_uuid=record.id)
+        hits.append(dict(_id=str(record.id), _version=1,
+                         _source=record.dumps()))
+
+    def pid_fetcher(id_, source):
+        return PersistentIdentifier.get('recid', str(source['recid']))
+
+    return hits, pid_fetcher
+
+
 @pytest.fixture
 def funder_record(db):
     """Create a funder record."""
@@ -32,11 +32,15 @@ from invenio_pidstore.models import PersistentIdentifier, PIDStatus
 from invenio_records.api import Record
 from invenio_search import current_search
 from invenio_search.api import RecordsSearch
+from mock import patch
 from six import BytesIO, b
 
 from zenodo.modules.deposit.api import ZenodoDeposit
 from zenodo.modules.deposit.resolvers import deposit_resolver
+from zenodo.modules.records.indexer import ZenodoRecordIndexer
 from zenodo.modules.records.resolvers import record_resolver
+from zenodo.modules.records.tasks import process_bulk_queue, \
+    update_records_relations
 
 
 def test_deposit_index(db, es):
@@ -282,3 +286,110 @@ def test_versioning_indexing(db, es, deposit, deposit_file):
     }
     assert s_rec1['relations'] == expected_r1
     assert s_rec2['relations'] == expected_r2
+
+
+def test_siblings_relations_update(db, es, deposit, deposit_file):
+    """Test the partial update of the siblings' relations."""
+    records_index_name = 'records-record-v1.0.0'
+
+    deposit_v1 = publish_and_expunge(db, deposit)
+    recid_v1, record_v1 = deposit_v1.fetch_published()
+    RecordIndexer().index_by_id(str(record_v1.id))
+    current_search.flush_and_refresh(index=records_index_name)
+    doc_v1 = RecordIndexer().client.get(
+        index=records_index_name, id=str(record_v1.id))
+
+    deposit_v1.newversion()
+    pv = PIDVersioning(child=recid_v1)
+    depid_v2 = pv.draft_child_deposit
+    deposit_v2 = ZenodoDeposit.get_record(depid_v2.object_uuid)
+    deposit_v2.files['file.txt'] = BytesIO(b('file1'))
+    deposit_v2 = publish_and_expunge(db, deposit_v2)
+    recid_v2, record_v2 = deposit_v2.fetch_published()
+    current_search.flush_and_refresh(index=records_index_name)
+
+    # Only the relations of the previous version were updated in place
+    doc = RecordIndexer().client.get(
+        index=records_index_name, id=str(record_v1.id))
+    assert doc['_version'] == doc_v1['_version']
+    version = doc['_source']['relations']['version'][0]
+    assert version['is_last'] is False
+    assert version['count'] == 2
+    assert version['last_child']['pid_value'] == recid_v2.pid_value
+    for field in ('relations', '_indexed'):
+        doc['_source'].pop(field)
+        doc_v1['_source'].pop(field)
+    assert doc['_source'] == doc_v1['_source']
+
+    # Full reindexing of the same revision is still accepted
+    RecordIndexer().index_by_id(str(record_v1.id))
+    current_search.flush_and_refresh(index=records_index_name)
+    doc = RecordIndexer().client.get(
+        index=records_index_name, id=str(record_v1.id))
+    assert doc['_source']['relations']['version'][0]['is_last'] is False
+
+
+def test_siblings_relations_deferred(db, es, deposit, deposit_file):
+    """Test that only the relations of the nearest versions are updated."""
+    records_index_name = 'records-record-v1.0.0'
+
+    def get_version(record):
+        current_search.flush_and_refresh(index=records_index_name)
+        return RecordIndexer().client.get(
+            index=records_index_name,
+            id=str(record.id))['_source']['relations']['version'][0]
+
+    def new_version(deposit):
+        deposit.newversion()
+        recid, _ = deposit.fetch_published()
+        depid = PIDVersioning(child=recid).draft_child_deposit
+        new_deposit = ZenodoDeposit.get_record(depid.object_uuid)
+        new_deposit.files['file.txt'] = BytesIO(b('file1'))
+        return new_deposit
+
+    deposit_v1 = publish_and_expunge(db, deposit)
+    deposit_v2 = publish_and_expunge(db, new_version(deposit_v1))
+    _, record_v1 = deposit_v1.fetch_published()
+    _, record_v2 = deposit_v2.fetch_published()
+    RecordIndexer().index(record_v1)
+    RecordIndexer().index(record_v2)
+
+    task = 'zenodo.modules.records.tasks.update_records_relations.apply_async'
+    with patch(task) as apply_async:
+        deposit_v3 = new_version(deposit_v2)
+        deposit_v3.publish()
+        # The task is sent only once the publication is committed
+        assert not apply_async.called
+        db.session.commit()
+    assert apply_async.called
+    for call in apply_async.call_args_list:
+        assert call[1]['args'] == ([str(record_v1.id)], )
+
+    # The previous version is updated right away
+    version = get_version(record_v2)
+    assert version['is_last'] is False
+    assert version['count'] == 3
+    # The first version is updated by the task
+    assert get_version(record_v1)['count'] == 2
+    update_records_relations([str(record_v1.id)])
+    assert get_version(record_v1)['count'] == 3
+
+
+def test_siblings_relations_interactive_lane(db, es, deposit, deposit_file):
+    """Test that publishing queues unindexed siblings in the interactive lane.
+    """
+    interactive = ZenodoRecordIndexer(lane='interactive')
+    process_bulk_queue(lane='interactive')
+    assert interactive.queue_stats()['depth'] == 0
+
+    # The first version is not indexed
+    deposit_v1 = publish_and_expunge(db, deposit)
+    recid_v1, _ = deposit_v1.fetch_published()
+    deposit_v1.newversion()
+    depid_v2 = PIDVersioning(child=recid_v1).draft_child_deposit
+    deposit_v2 = ZenodoDeposit.get_record(depid_v2.object_uuid)
+    deposit_v2.files['file.txt'] = BytesIO(b('file1'))
+    publish_and_expunge(db, deposit_v2)
+
+    assert interactive.queue_stats()['depth'] >= 1
+    process_bulk_queue(lane='interactive')
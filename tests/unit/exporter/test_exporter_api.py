@@ -26,11 +26,20 @@
 
 from __future__ import absolute_import, print_function
 
+import bz2
+import json
+
+import pytest
 from invenio_files_rest.models import ObjectVersion
 from invenio_indexer.api import RecordIndexer
 from invenio_search import current_search
 
-from zenodo.modules.exporter.tasks import export_job
+from zenodo.modules.exporter.api import Exporter
+from zenodo.modules.exporter.errors import FailedExportJobError
+from zenodo.modules.exporter.streams import iter_decompressed
+from zenodo.modules.exporter.tasks import compact_job, export_job
+from zenodo.modules.exporter.utils import get_bookmark, get_checkpoint
+from zenodo.modules.records.indexer import bulk_partial_index
 
 
 def test_exporter(app, db, es, exporter_bucket, record_with_files_creation):
@@ -42,4 +51,154 @@ def test_exporter(app, db, es, exporter_bucket, record_with_files_creation):
     with app.app_context():
         assert ObjectVersion.get_by_bucket(exporter_bucket).count() == 0
         export_job(job_id='records')
-        assert ObjectVersion.get_by_bucket(exporter_bucket).count() == 1
+        # The export and the bookmark of the job
+        assert ObjectVersion.get_by_bucket(exporter_bucket).count() == 2
+
+
+def test_sliced_exporter(app, db, es, exporter_bucket, monkeypatch,
+                         record_with_files_creation):
+    """Test parallel record exporter with sliced scrolls."""
+    pid, record, record_url = record_with_files_creation
+    RecordIndexer().index_by_id(record.id)
+    current_search.flush_and_refresh('records')
+    monkeypatch.setitem(app.config['EXPORTER_JOBS']['records'], 'slices', 2)
+    monkeypatch.setitem(
+        app.config['EXPORTER_JOBS']['records'], 'chunk_size', None)
+
+    with app.app_context():
+        export_job(job_id='records')
+        objs = ObjectVersion.get_by_bucket(exporter_bucket).all()
+        # Two part objects and the manifest
+        assert len(objs) == 3
+        manifest = [o for o in objs if o.key.endswith('-manifest.json')][0]
+        with manifest.file.storage().open() as fp:
+            data = json.loads(fp.read().decode('utf8'))
+        assert data['records'] == 1
+        assert [p['slice'] for p in data['parts']] == [0, 1]
+        assert all(p['checksum'] for p in data['parts'])
+
+
+def _read_export(bucket_id, key):
+    """Read the lines of a bzip2 compressed export."""
+    obj = ObjectVersion.get(bucket_id, key)
+    with obj.file.storage().open() as fp:
+        return b''.join(iter_decompressed(fp, 'bzip2')).splitlines()
+
+
+def test_delta_exporter(app, db, es, exporter_bucket, monkeypatch,
+                        record_with_files_creation):
+    """Test delta exports and their compaction."""
+    pid, record, record_url = record_with_files_creation
+    RecordIndexer().index_by_id(record.id)
+    current_search.flush_and_refresh('records')
+    monkeypatch.setitem(app.config, 'EXPORTER_DELTA_MARGIN', 0)
+
+    with app.app_context():
+        # Without a bookmark a full export is made
+        export_job(job_id='records', delta=True)
+        bookmark = get_bookmark('records')
+        assert len(bookmark['chain']) == 1
+
+        # Partial updates of the indexed stats are exported as well
+        bulk_partial_index([(record.id, {'_stats': {'views': 1}})])
+        current_search.flush_and_refresh('records')
+        export_job(job_id='records', delta=True)
+        bookmark = get_bookmark('records')
+        assert len(_read_export(exporter_bucket, bookmark['chain'][1])) == 1
+
+        # Update the record after the bookmark
+        record['title'] = 'Updated title'
+        record.commit()
+        db.session.commit()
+        RecordIndexer().index_by_id(record.id)
+        current_search.flush_and_refresh('records')
+
+        export_job(job_id='records', delta=True)
+        bookmark = get_bookmark('records')
+        assert len(bookmark['chain']) == 3
+        assert bookmark['chain'][2].endswith('-delta.json.bz2')
+
+        compact_job(job_id='records')
+        bookmark = get_bookmark('records')
+        assert len(bookmark['chain']) == 1
+        lines = _read_export(exporter_bucket, bookmark['chain'][0])
+        assert len(lines) == 1
+        assert json.loads(lines[0].decode('utf8'))['metadata']['title'] == \
+            'Updated title'
+
+
+def test_checkpointed_exporter(app, db, es, exporter_bucket, monkeypatch,
+                               record_with_files_creation):
+    """Test checkpointed export in chunks."""
+    pid, record, record_url = record_with_files_creation
+    RecordIndexer().index_by_id(record.id)
+    current_search.flush_and_refresh('records')
+    monkeypatch.setitem(
+        app.config['EXPORTER_JOBS']['records'], 'chunk_size', 1)
+
+    with app.app_context():
+        export_job(job_id='records')
+        assert get_checkpoint('records') is None
+        key = get_bookmark('records')['chain'][0]
+        # Only the merged object is left, chunks are deleted
+        objs = ObjectVersion.get_by_bucket(exporter_bucket).all()
+        assert sorted(o.key for o in objs) == [key, 'records-bookmark.json']
+        with objs[0].file.storage().open() as fp:
+            lines = b''.join(iter_decompressed(fp, 'bzip2')).splitlines()
+        assert len(lines) == 1
+
+
+def test_compact_columnar():
+    """Test that only line-based exports are compacted."""
+    with pytest.raises(ValueError):
+        Exporter().compact([
+            'records-flat-2018-01-01T00:00:00.parquet',
+            'records-flat-2018-01-02T00:00:00-delta.parquet',
+        ])
+
+
+def test_checkpointed_exporter_empty(app, db, es, exporter_bucket,
+                                     monkeypatch):
+    """Test checkpointed export without records."""
+    monkeypatch.setitem(
+        app.config['EXPORTER_JOBS']['records'], 'chunk_size', 1)
+
+    with app.app_context():
+        export_job(job_id='records')
+        key = get_bookmark('records')['chain'][0]
+        with ObjectVersion.get(exporter_bucket, key).file.storage().open() \
+                as fp:
+            # A valid, empty compressed object
+            assert bz2.decompress(fp.read()) == b''
+
+
+def test_checkpointed_exporter_sliced():
+    """Test that checkpointed exports can not be sliced."""
+    with pytest.raises(ValueError):
+        Exporter(slices=2, chunk_size=1)
+    assert Exporter(slices=1, chunk_size=1).slices == 1
+
+
+def test_checkpointed_exporter_failed(app, db, es, exporter_bucket,
+                                      monkeypatch, record_with_files_creation):
+    """Test failed records of a checkpointed export."""
+    class FailingSerializer(object):
+        def serialize_exporter(self, pid, record):
+            raise ValueError()
+
+    pid, record, record_url = record_with_files_creation
+    RecordIndexer().index_by_id(record.id)
+    current_search.flush_and_refresh('records')
+    monkeypatch.setitem(
+        app.config['EXPORTER_JOBS']['records'], 'chunk_size', 1)
+    monkeypatch.setitem(
+        app.config['EXPORTER_JOBS']['records'], 'serializer',
+        FailingSerializer())
+
+    with app.app_context():
+        with pytest.raises(FailedExportJobError):
+            export_job(job_id='records')
+        # The export is finished nonetheless
+        assert get_checkpoint('records') is None
+        key = get_bookmark('records')['chain'][0]
+        assert ObjectVersion.get(exporter_bucket, key)
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Zenodo.
+# Copyright (C) 2018 CERN.
+#
+# Zenodo is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Zenodo is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Zenodo; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Exporter formats tests."""
+
+from __future__ import absolute_import, print_function
+
+import json
+
+import pytest
+from six import BytesIO
+
+from zenodo.modules.exporter import ColumnarResultStream, \
+    FlatRecordSerializer, NDJSONSerializer
+from zenodo.modules.exporter.formats import flatten_record
+
+
+@pytest.fixture()
+def serialized_record():
+    """Record serialized with RecordSchemaV1."""
+    return {
+        'id': 123,
+        'conceptrecid': '122',
+        'doi': '10.5072/zenodo.123',
+        'conceptdoi': '10.5072/zenodo.122',
+        'created': '2018-01-01T10:00:00.123456+00:00',
+        'updated': '2018-02-01T10:00:00+00:00',
+        'metadata': {
+            'title': 'Test',
+            'access_right': 'open',
+            'license': {'id': 'CC-BY-4.0'},
+            'publication_date': '2017-12-31',
+            'resource_type': {'type': 'publication', 'subtype': 'article'},
+            'communities': [{'id': 'c1'}, {'id': 'c2'}],
+        },
+        'files': [{'size': 10}, {'size': 20}],
+    }
+
+
+@pytest.fixture()
+def searchobj():
+    """Search object."""
+    class Hit(dict):
+        def __init__(self, *args, **kwargs):
+            super(Hit, self).__init__(*args, **kwargs)
+
+            class Meta(object):
+                id = args[0]['id']
+
+            self.meta = Meta()
+            self._d_ = args[0]
+
+    class Search(object):
+        def scan(self):
+            return iter([Hit({'id': 1}), Hit({'id': 2})])
+    return Search()
+
+
+@pytest.fixture()
+def jsonserializer(serialized_record):
+    """Record serializer."""
+    class Serializer(object):
+        def transform_search_hit(self, pid, record_hit):
+            return dict(serialized_record, id=record_hit['_source']['id'])
+    return Serializer()
+
+
+def test_flatten_record(serialized_record):
+    """Test flattening of a serialized record."""
+    assert flatten_record(serialized_record) == dict(
+        recid=123,
+        conceptrecid='122',
+        doi='10.5072/zenodo.123',
+        conceptdoi='10.5072/zenodo.122',
+        title='Test',
+        resource_type='publication',
+        resource_subtype='article',
+        access_right='open',
+        license='CC-BY-4.0',
+        communities=['c1', 'c2'],
+        publication_date='2017-12-31',
+        created='2018-01-01T10:00:00.123456+00:00',
+        updated='2018-02-01T10:00:00+00:00',
+        files_count=2,
+        files_size=30,
+        file_sizes=[10, 20],
+    )
+    assert flatten_record({'id': 1})['files_size'] == 0
+
+
+def test_ndjson_serializer(jsonserializer):
+    """Test NDJSON serializer."""
+    data = NDJSONSerializer(jsonserializer).serialize_exporter(
+        None, {'_source': {'id': 1}})
+    assert data.endswith(b'\n')
+    assert json.loads(data.decode('utf8'))['recid'] == 1
+
+
+@pytest.mark.parametrize('format', ['parquet', 'arrow'])
+def test_columnar_resultstream(searchobj, jsonserializer, format):
+    """Test columnar result stream."""
+    pyarrow = pytest.importorskip('pyarrow')
+    import pyarrow.parquet
+
+    stream = ColumnarResultStream(
+        searchobj, lambda id_, data: id_,
+        FlatRecordSerializer(jsonserializer), format=format,
+        row_group_size=1)
+    data = b''
+    chunk = stream.read()
+    while chunk:
+        data += chunk
+        chunk = stream.read()
+
+    if format == 'parquet':
+        pf = pyarrow.parquet.ParquetFile(BytesIO(data))
+        assert pf.num_row_groups == 2
+        table = pf.read(columns=['recid', 'files_size'])
+    else:
+        table = pyarrow.RecordBatchFileReader(BytesIO(data)).read_all()
+    assert table.column('recid').to_pylist() == [1, 2]
+    assert table.column('files_size').to_pylist() == [30, 30]
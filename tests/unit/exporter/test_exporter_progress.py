@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Zenodo.
+# Copyright (C) 2018 CERN.
+#
+# Zenodo is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Zenodo is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Zenodo; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Exporter progress tests."""
+
+from __future__ import absolute_import, print_function
+
+from click.testing import CliRunner
+from invenio_cache import current_cache
+
+from zenodo.modules.exporter.cli import status
+from zenodo.modules.exporter.progress import ExportProgress, get_progress, \
+    progress_key
+
+
+def test_export_progress(app, resultstream):
+    """Test progress instrumentation of a result stream."""
+    current_cache.delete(progress_key('records'))
+    progress = ExportProgress('records', total=2)
+    resultstream.progress = progress
+    assert resultstream.read() == b'test 1'
+    assert resultstream.read() == b'test 2'
+    assert resultstream.read() == b''
+    progress.finish()
+
+    data = get_progress('records')
+    assert data['records'] == 2
+    assert data['failed'] == 0
+    assert data['uncompressed_bytes'] == 12
+    assert data['finished'] is not None
+    assert set(data['timings']) == {'fetch', 'serialize', 'compress', 'write'}
+
+
+def test_export_status_cli(app, script_info):
+    """Test export job status command."""
+    current_cache.delete(progress_key('records'))
+    current_cache.delete('exporter:records:checkpoint')
+    runner = CliRunner()
+    res = runner.invoke(status, ['records'], obj=script_info)
+    assert 'No progress information' in res.output
+
+    progress = ExportProgress('records', total=10)
+    progress.add_record(100)
+    progress.update(force=True)
+    res = runner.invoke(status, ['records'], obj=script_info)
+    assert res.exit_code == 0
+    assert 'running' in res.output
+    assert 'records: 1 / 10' in res.output
@@ -27,10 +27,14 @@
 from __future__ import absolute_import, print_function
 
 import bz2
+import zlib
 
 import pytest
 
-from zenodo.modules.exporter import BZip2ResultStream, ResultStream
+from zenodo.modules.exporter import BZip2ResultStream, \
+    CompressedResultStream, ResultStream
+from zenodo.modules.exporter.streams import ChecksumStream, HitsSearch, \
+    IterableStream, format_for_key, iter_chunks
 
 
 @pytest.fixture()
@@ -101,3 +105,90 @@ def test_resultstream(bzip2resultstream):
 
     assert bzip2resultstream.read() == data
     assert bzip2resultstream.read() == b''
+
+
+def _read_all(stream):
+    """Read all the data of a stream."""
+    data = b''
+    chunk = stream.read()
+    while chunk:
+        data += chunk
+        chunk = stream.read()
+    return data
+
+
+@pytest.mark.parametrize('executor', ['thread', 'process'])
+def test_compressed_resultstream_bzip2(searchobj, serializerobj, fetcher,
+                                       executor):
+    """Test block-parallel bzip2 compressed result stream."""
+    stream = CompressedResultStream(
+        searchobj, fetcher, serializerobj, codec='bzip2', block_size=1,
+        workers=2, executor=executor)
+    data = _read_all(stream)
+    # One bzip2 stream per block
+    assert data == bz2.compress(b'test 1') + bz2.compress(b'test 2')
+    assert stream.read() == b''
+
+
+def test_compressed_resultstream_gzip(searchobj, serializerobj, fetcher):
+    """Test gzip compressed result stream is a valid multi-member file."""
+    stream = CompressedResultStream(
+        searchobj, fetcher, serializerobj, codec='gzip', block_size=1)
+    data = _read_all(stream)
+    d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    assert d.decompress(data) == b'test 1'
+    assert zlib.decompress(d.unused_data, 16 + zlib.MAX_WBITS) == b'test 2'
+
+
+def test_compressed_resultstream_empty(serializerobj, fetcher):
+    """Test compressed result stream of an empty search."""
+    class Search(object):
+        def scan(self):
+            return iter([])
+
+    stream = CompressedResultStream(Search(), fetcher, serializerobj)
+    assert bz2.decompress(_read_all(stream)) == b''
+
+
+def test_compressed_resultstream_codec(searchobj, serializerobj, fetcher):
+    """Test unknown codec."""
+    with pytest.raises(ValueError):
+        CompressedResultStream(
+            searchobj, fetcher, serializerobj, codec='unknown')
+
+
+def test_checksum_stream():
+    """Test rolling checksum of a stream."""
+    stream = ChecksumStream(IterableStream([b'test 1']))
+    assert stream.read() == b'test 1'
+    assert stream.read() == b''
+    # Continue the checksum of the previous stream
+    stream = ChecksumStream(IterableStream([b'test 2']), crc32=stream.crc32)
+    _read_all(stream)
+    assert stream.crc32 == zlib.crc32(b'test 1test 2') & 0xffffffff
+
+
+def test_iter_chunks():
+    """Test streamed chunks of an iterator."""
+    consumed = []
+
+    def items():
+        for i in range(5):
+            consumed.append(i)
+            yield i
+
+    chunks = iter_chunks(items(), 2)
+    search = HitsSearch(next(chunks))
+    assert consumed == [0]
+    assert list(search.scan()) == [0, 1]
+    assert search.last == 1
+    assert consumed == [0, 1]
+    assert [list(c) for c in chunks] == [[2, 3], [4]]
+    assert list(iter_chunks([], 2)) == []
+
+
+def test_format_for_key():
+    """Test the format of exported objects."""
+    assert format_for_key('records-2018-01-01T00:00:00.json.bz2') == 'json'
+    assert format_for_key('records-flat-delta.ndjson.gz') == 'ndjson'
+    assert format_for_key('records-flat.parquet') == 'parquet'
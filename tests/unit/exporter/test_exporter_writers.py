@@ -30,7 +30,8 @@ import pytest
 from invenio_files_rest.models import ObjectVersion
 from six import BytesIO
 
-from zenodo.modules.exporter import filename_factory
+from zenodo.modules.exporter import filename_factory, manifest_filename, \
+    part_filename
 
 
 def test_filename_factory():
@@ -42,6 +43,15 @@ def test_filename_factory():
     assert fname.endswith('.json')
 
 
+def test_part_filename():
+    """Test part and manifest filenames."""
+    key = 'records-2018-01-01T04:00:00.json.bz2'
+    assert part_filename(key, 3) == \
+        'records-2018-01-01T04:00:00-part0003.json.bz2'
+    assert manifest_filename(key) == \
+        'records-2018-01-01T04:00:00-manifest.json'
+
+
 def test_bucket_writer(writer):
     """Test bucket writer."""
     writer.open()
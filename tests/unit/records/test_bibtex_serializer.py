@@ -62,6 +62,13 @@ def test_serializer(bibtex_records):
     assert bibtex == serializer.serialize_search(search_result=results,
                                                  pid_fetcher=None)
 
+    # Serialization of search results record by record
+    results['hits']['hits'] *= 2
+    parts = list(serializer.iter_search(None, results))
+    assert parts == [bibtex, '\n' + bibtex]
+    assert serializer.serialize_search(None, results) == '\n'.join(
+        [bibtex, bibtex])
+
 
 def test_get_entry_type(bibtex_records):
     """Test."""
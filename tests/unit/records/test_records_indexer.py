@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Zenodo.
+# Copyright (C) 2018 CERN.
+#
+# Zenodo is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Zenodo is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Zenodo; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Test Zenodo records indexer."""
+
+from __future__ import absolute_import, print_function
+
+from threading import Thread
+
+import pytest
+from invenio_indexer.api import RecordIndexer
+from invenio_search import current_search, current_search_client
+from invenio_search.utils import build_alias_name
+from mock import patch
+
+from zenodo.modules.records.api import ZenodoRecord
+from zenodo.modules.records.indexer import ZenodoRecordIndexer, \
+    bulk_partial_index, call_after_commit, lock_documents
+from zenodo.modules.records.minters import zenodo_record_minter
+
+
+@pytest.fixture()
+def indexed_record(db, es, minimal_record):
+    """Indexed record."""
+    record = ZenodoRecord.create(minimal_record)
+    zenodo_record_minter(record.id, record)
+    db.session.commit()
+    RecordIndexer().index(record)
+    current_search.flush_and_refresh(index='records')
+    return record
+
+
+def _get_doc(record):
+    """Get the indexed document of a record."""
+    current_search.flush_and_refresh(index='records')
+    return current_search_client.get(
+        index=build_alias_name('records'), id=str(record.id))
+
+
+def test_bulk_partial_index_concurrent(app, indexed_record):
+    """Test concurrent partial updates of a record."""
+    record = indexed_record
+    client = current_search_client._get_current_object()
+    mget = client.mget
+    results = []
+
+    def update_relations():
+        with app.app_context():
+            results.append(bulk_partial_index(
+                [(record.id, {'relations': {'version': []}})]))
+
+    def concurrent_mget(*args, **kwargs):
+        # Another update starts after the document was read
+        thread = Thread(target=update_relations)
+        thread.start()
+        thread.join()
+        return mget(*args, **kwargs)
+
+    with patch.object(client, 'mget', side_effect=concurrent_mget), \
+            patch.object(ZenodoRecordIndexer, 'bulk_index') as bulk_index:
+        assert bulk_partial_index(
+            [(record.id, {'_stats': {'views': 1}})]) == (1, 0)
+    # The locked document is fully indexed instead
+    assert results == [(0, 0)]
+    bulk_index.assert_called_once_with([str(record.id)])
+
+    doc = _get_doc(record)
+    assert doc['_source']['_stats'] == {'views': 1}
+    assert doc['_version'] == record.revision_id
+    # The lock was released
+    assert bulk_partial_index(
+        [(record.id, {'relations': {'version': []}})]) == (1, 0)
+
+
+def test_bulk_partial_index_reindexed(app, db, indexed_record):
+    """Test a partial update of a record reindexed with a new revision."""
+    record = indexed_record
+    client = current_search_client._get_current_object()
+    mget = client.mget
+
+    def reindexing_mget(*args, **kwargs):
+        docs = mget(*args, **kwargs)
+        record['title'] = 'New title'
+        record.commit()
+        db.session.commit()
+        RecordIndexer().index(record)
+        return docs
+
+    with patch.object(client, 'mget', side_effect=reindexing_mget), \
+            patch.object(ZenodoRecordIndexer, 'bulk_index') as bulk_index:
+        assert bulk_partial_index(
+            [(record.id, {'_stats': {'views': 1}})]) == (0, 0)
+    # The update was rejected and the record is fully indexed instead
+    bulk_index.assert_called_once_with([str(record.id)])
+
+    doc = _get_doc(record)
+    assert doc['_source']['title'] == 'New title'
+    assert '_stats' not in doc['_source']
+    assert doc['_version'] == record.revision_id
+
+
+def test_bulk_partial_index_bulk_indexed(app, db, indexed_record):
+    """Test a partial update of a record bulk indexed meanwhile."""
+    record = indexed_record
+    client = current_search_client._get_current_object()
+    mget = client.mget
+    indexer = ZenodoRecordIndexer()
+    indexer.bulk_index([str(record.id)])
+
+    def reindexing_mget(*args, **kwargs):
+        docs = mget(*args, **kwargs)
+        # The same revision is indexed with the fields of the database
+        with lock_documents([str(record.id)]):
+            RecordIndexer().index(record)
+        return docs
+
+    with patch.object(client, 'mget', side_effect=reindexing_mget), \
+            patch.object(ZenodoRecordIndexer, 'bulk_index') as bulk_index:
+        assert bulk_partial_index(
+            [(record.id, {'_stats': {'views': 1}})]) == (0, 0)
+    # The outdated document read was not written
+    bulk_index.assert_called_once_with([str(record.id)])
+    assert '_stats' not in _get_doc(record)['_source']
+
+    # Bulk indexing releases the locks of the documents once written
+    assert indexer.process_bulk_queue() == (1, 0)
+    assert bulk_partial_index(
+        [(record.id, {'_stats': {'views': 1}})]) == (1, 0)
+    assert _get_doc(record)['_source']['_stats'] == {'views': 1}
+
+
+def test_call_after_commit(db):
+    """Test calls made once the outermost transaction is committed."""
+    calls = []
+    call_after_commit(calls.append, 1)
+    with db.session.begin_nested():
+        call_after_commit(calls.append, 2)
+    assert calls == []
+    db.session.commit()
+    assert calls == [1, 2]
+
+    call_after_commit(calls.append, 3)
+    db.session.rollback()
+    db.session.commit()
+    assert calls == [1, 2]
@@ -25,12 +25,17 @@ from helpers import publish_and_expunge
 from invenio_pidrelations.contrib.versioning import PIDVersioning
 from invenio_pidrelations.serializers.utils import serialize_relations
 from invenio_pidstore.models import PersistentIdentifier
+from invenio_search import current_search, current_search_client
+from invenio_search.utils import build_alias_name
+from mock import patch
 from six import BytesIO, b
 
 from zenodo.modules.deposit.api import ZenodoDeposit
 from zenodo.modules.deposit.resolvers import deposit_resolver
+from zenodo.modules.records.api import ZenodoRecord
+from zenodo.modules.records.indexer import ZenodoRecordIndexer
 from zenodo.modules.records.serializers.pidrelations import \
-    serialize_related_identifiers
+    build_records_relations, serialize_related_identifiers
 
 
 def test_relations_serialization(app, db, deposit, deposit_file):
@@ -208,3 +213,67 @@ def test_related_identifiers_serialization(app, db, deposit, deposit_file):
         }
     ]
     assert rids == expected_parent
+
+
+def test_build_records_relations(app, db, deposit, deposit_file):
+    """Test batch building of relations against the per-record ones."""
+    def assert_equivalent(*recids):
+        records = [ZenodoRecord.get_record(p.object_uuid) for p in recids]
+        result = build_records_relations(records)
+        assert len(result) == len(recids)
+        for recid in recids:
+            relations, rels = result[str(recid.object_uuid)]
+            assert relations == serialize_relations(recid)
+            assert rels == serialize_related_identifiers(recid)
+
+    deposit_v1 = publish_and_expunge(db, deposit)
+    depid_v1_value = deposit_v1['_deposit']['id']
+    depid_v1, deposit_v1 = deposit_resolver.resolve(depid_v1_value)
+    recid_v1, record_v1 = deposit_v1.fetch_published()
+    assert_equivalent(recid_v1)
+
+    # With a draft of a new version
+    deposit_v1.newversion()
+    assert_equivalent(recid_v1)
+
+    pv = PIDVersioning(child=recid_v1)
+    depid_v2 = pv.draft_child_deposit
+    deposit_v2 = ZenodoDeposit.get_record(depid_v2.get_assigned_object())
+    deposit_v2.files['file.txt'] = BytesIO(b('file1'))
+    deposit_v2 = publish_and_expunge(db, deposit_v2)
+    recid_v2, record_v2 = deposit_v2.fetch_published()
+    assert_equivalent(recid_v1, recid_v2)
+
+    # Nothing to resolve
+    assert build_records_relations([]) == {}
+
+
+def test_bulk_index_prefetched_relations(app, db, es, deposit, deposit_file):
+    """Test that bulk indexing of published versions uses batch relations."""
+    deposit_v1 = publish_and_expunge(db, deposit)
+    depid_v1, deposit_v1 = deposit_resolver.resolve(
+        deposit_v1['_deposit']['id'])
+    recid_v1, record_v1 = deposit_v1.fetch_published()
+    deposit_v1.newversion()
+    pv = PIDVersioning(child=recid_v1)
+    depid_v2 = pv.draft_child_deposit
+    deposit_v2 = ZenodoDeposit.get_record(depid_v2.get_assigned_object())
+    deposit_v2.files['file.txt'] = BytesIO(b('file1'))
+    deposit_v2 = publish_and_expunge(db, deposit_v2)
+    recid_v2, record_v2 = deposit_v2.fetch_published()
+    recids = [recid_v1, recid_v2]
+    expected = dict(
+        (str(p.object_uuid), serialize_relations(p)) for p in recids)
+
+    with patch('zenodo.modules.records.indexer.serialize_relations') as m1, \
+            patch('zenodo.modules.records.indexer.'
+                  'serialize_related_identifiers') as m2:
+        ZenodoRecordIndexer().bulk_index([p.object_uuid for p in recids])
+        ZenodoRecordIndexer().process_bulk_queue()
+        assert not m1.called and not m2.called
+    current_search.flush_and_refresh(index='records')
+
+    for uuid, relations in expected.items():
+        doc = current_search_client.get(
+            index=build_alias_name('records'), id=uuid)
+        assert doc['_source']['relations'] == relations
@@ -30,10 +30,14 @@ from datetime import datetime
 from invenio_cache import current_cache
 from invenio_pidrelations.contrib.versioning import PIDVersioning
 from invenio_pidstore.models import PersistentIdentifier, PIDStatus
+from invenio_search import current_search, current_search_client
+from invenio_search.utils import build_alias_name
 
 from zenodo.modules.records.api import ZenodoRecord
+from zenodo.modules.records.indexer import ZenodoRecordIndexer
 from zenodo.modules.records.minters import zenodo_record_minter
-from zenodo.modules.records.tasks import schedule_update_datacite_metadata
+from zenodo.modules.records.tasks import process_bulk_queue, \
+    schedule_update_datacite_metadata
 
 
 def test_datacite_update(mocker, db, minimal_record):
@@ -134,3 +138,63 @@ def test_datacite_update(mocker, db, minimal_record):
     assert update_date < new_update_date3
 
     assert_datacite_calls_and_content(r1, doi_tags)
+
+
+def test_process_bulk_queue_lanes(app, db, es, minimal_record):
+    """Test the coalescing and lanes of the bulk indexing queue."""
+    record = ZenodoRecord.create(minimal_record)
+    zenodo_record_minter(record.id, record)
+    db.session.commit()
+    record_id = str(record.id)
+    bulk = ZenodoRecordIndexer(lane='bulk')
+    interactive = ZenodoRecordIndexer(lane='interactive')
+    process_bulk_queue(lane='bulk')
+    process_bulk_queue(lane='interactive')
+
+    # Pending records are queued only once per lane
+    bulk.bulk_index([record_id, record_id, record_id])
+    interactive.bulk_index([record_id])
+    assert bulk.queue_stats()['depth'] == 1
+    assert interactive.queue_stats()['depth'] == 1
+
+    process_bulk_queue(lane='interactive')
+    stats = interactive.queue_stats()
+    assert stats['depth'] == 0
+    assert stats['lag'] >= 0
+    assert bulk.queue_stats()['depth'] == 1
+
+    process_bulk_queue(lane='bulk')
+    assert bulk.queue_stats()['depth'] == 0
+
+    # Once processed, the record can be queued again
+    bulk.bulk_index([record_id])
+    assert bulk.queue_stats()['depth'] == 1
+    process_bulk_queue(lane='bulk')
+
+
+def test_process_bulk_queue_operations(app, db, es, minimal_record):
+    """Test that coalescing keeps the order of different operations."""
+    record = ZenodoRecord.create(minimal_record)
+    zenodo_record_minter(record.id, record)
+    db.session.commit()
+    record_id = str(record.id)
+    bulk = ZenodoRecordIndexer(lane='bulk')
+    process_bulk_queue(lane='bulk')
+
+    def is_indexed():
+        current_search.flush_and_refresh(index='records')
+        return current_search_client.exists(
+            index=build_alias_name('records'), id=record_id)
+
+    # An operation following a different pending one is always queued
+    bulk.bulk_index([record_id])
+    bulk.bulk_delete([record_id])
+    bulk.bulk_index([record_id, record_id])
+    assert bulk.queue_stats()['depth'] == 3
+    process_bulk_queue(lane='bulk')
+    assert is_indexed()
+
+    bulk.bulk_delete([record_id, record_id])
+    assert bulk.queue_stats()['depth'] == 1
+    process_bulk_queue(lane='bulk')
+    assert not is_indexed()
@@ -26,8 +26,11 @@
 
 from __future__ import absolute_import, print_function
 
+from threading import Thread
+
+from zenodo.modules.records.serializers import datacite_v41
 from zenodo.modules.records.utils import build_record_custom_fields, \
-    is_valid_openaire_type
+    datacite_xsd, is_valid_openaire_type, validate_datacite
 
 
 def test_openaire_type_validation(app):
@@ -96,3 +99,21 @@ def test_build_record_custom_fields(app, full_record, custom_metadata):
             (v['key'], tuple(v['subject']), tuple(v['object']))
             for v in result['custom_relationships']},
     }
+
+
+def test_datacite_xsd(db, minimal_record_model, recid_pid):
+    """Test the DataCite XML schema validators."""
+    validator = datacite_xsd('4.1')
+    assert datacite_xsd('4.1') is validator
+    validators = []
+    thread = Thread(target=lambda: validators.append(datacite_xsd('4.1')))
+    thread.start()
+    thread.join()
+    assert validators[0] is not validator
+
+    doc = datacite_v41.serialize(recid_pid, minimal_record_model)
+    invalid_doc = doc.replace('<publisher>Zenodo</publisher>', '')
+    assert invalid_doc != doc
+    errors = validate_datacite([doc, invalid_doc, doc])
+    assert errors[0] == [] and errors[2] == []
+    assert len(errors[1]) == 1
@@ -27,10 +27,13 @@
 from __future__ import absolute_import, print_function
 
 from datetime import datetime
+from threading import Thread
 
+from citeproc_styles import get_style_filepath
 from invenio_records.api import Record
 
-from zenodo.modules.records.serializers import csl_v1
+from zenodo.modules.records.serializers import citeproc_v1, csl_v1
+from zenodo.modules.records.serializers.citeproc import normalize_locale
 
 
 def test_minimal(db, minimal_record, recid_pid):
@@ -203,3 +206,51 @@ def test_other(db, minimal_record, recid_pid):
     assert obj['language'] == 'en'
     assert obj['note'] == 'Test note'
     assert obj['publisher'] == 'Zenodo'
+
+
+def test_citeproc_styles(app, db, full_record, recid_pid):
+    """Test that parsed citation styles are reused within a thread."""
+    record = Record(full_record)
+    apa = citeproc_v1.serialize(recid_pid, record, style='apa')
+    assert 'Doe, J.' in apa
+    style = citeproc_v1.get_style(get_style_filepath('apa'), 'en-US')
+    assert citeproc_v1.get_style(get_style_filepath('apa'), 'en-US') is style
+    assert citeproc_v1.serialize(recid_pid, record, style='apa') == apa
+    assert citeproc_v1.serialize_styles(
+        recid_pid, record, ['apa', 'invalid']) == {'apa': apa, 'invalid': None}
+
+    styles = []
+    thread = Thread(target=lambda: styles.append(
+        citeproc_v1.get_style(get_style_filepath('apa'), 'en-US')))
+    thread.start()
+    thread.join()
+    assert styles[0] is not style
+
+
+def test_citeproc_locales(app, db, full_record, recid_pid):
+    """Test that citation locales are normalized to the available ones."""
+    assert normalize_locale('en-US') == 'en-US'
+    assert normalize_locale('en') == 'en-US'
+    assert normalize_locale('de') == 'de-DE'
+    assert normalize_locale('de-AT') == 'de-AT'
+    assert normalize_locale('fr_FR') == 'fr-FR'
+    assert normalize_locale('zh') == 'zh-CN'
+    assert normalize_locale('xx-YY') == 'en-US'
+    assert normalize_locale('<script>') == 'en-US'
+    assert normalize_locale(None) == 'en-US'
+
+    record = Record.create(full_record)
+    apa = citeproc_v1.serialize(recid_pid, record, style='apa')
+    assert citeproc_v1.serialize(
+        recid_pid, record, style='apa', locale='invalid') == apa
+    assert citeproc_v1.serialize_styles(
+        recid_pid, record, ['apa'], locale='en') == {'apa': apa}
+
+    def key(locale):
+        return citeproc_v1.cache.key(
+            citeproc_v1.serializer_id, record.id, record.revision_id,
+            citeproc_v1.cache.generation(record.id), recid_pid.pid_type,
+            recid_pid.pid_value, 'apa.csl', locale)
+    assert citeproc_v1.cache.get(key('en-US')) == apa
+    assert citeproc_v1.cache.get(key('invalid')) is None
+    assert citeproc_v1.cache.get(key('en')) is None
@@ -26,6 +26,9 @@
 
 from __future__ import absolute_import, print_function
 
+from copy import deepcopy
+from threading import Thread
+
 from zenodo.modules.records.serializers import dcat_v1
 
 
@@ -39,3 +42,31 @@ def test_dcat_serializer(db, es, record_with_bucket):
     for creator in record['creators']:
         assert creator['familyname'] in serialized_record
         assert creator['givennames'] in serialized_record
+
+
+def test_dcat_serializer_search(app, search_hits):
+    """Test that a search page is transformed as each of its records."""
+    hits, pid_fetcher = search_hits
+    assert hits[-1]['_source']['grants']
+    expected = [
+        dcat_v1._etree_tostring(dcat_v1.transform_with_xslt(
+            pid_fetcher(hit['_id'], hit['_source']), deepcopy(hit),
+            search_hit=True).getroot())
+        for hit in hits
+    ]
+    serialized = dcat_v1.serialize_search(
+        pid_fetcher, {'hits': {'hits': deepcopy(hits)}})
+    assert serialized == '\n'.join(expected)
+    assert dcat_v1.serialize_search(
+        pid_fetcher, {'hits': {'hits': []}}) == ''
+
+
+def test_dcat_serializer_xslt_per_thread(app):
+    """Test that the compiled XSLT is not shared between threads."""
+    transforms = []
+    thread = Thread(
+        target=lambda: transforms.append(dcat_v1.xslt_transform_func))
+    thread.start()
+    thread.join()
+    assert dcat_v1.xslt_transform_func is dcat_v1.xslt_transform_func
+    assert transforms[0] is not dcat_v1.xslt_transform_func
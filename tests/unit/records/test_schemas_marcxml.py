@@ -26,6 +26,7 @@
 
 from __future__ import absolute_import, print_function
 
+from copy import deepcopy
 from datetime import datetime
 
 from invenio_pidstore.models import PersistentIdentifier
@@ -392,3 +393,19 @@ def assert_dict(a1, a2):
         else:
             assert a2[k] == v
     assert len(a2) == len(a1)
+
+
+def test_streamed_search(app, search_hits):
+    """Test record by record serialization of search results."""
+    hits, pid_fetcher = search_hits
+
+    def search_result(hits):
+        return {'hits': {'hits': deepcopy(hits)}}
+
+    expected = marcxml_v1.serialize_search(pid_fetcher, search_result(hits))
+    parts = list(marcxml_v1.iter_search(pid_fetcher, search_result(hits)))
+    assert len(parts) == 5
+    assert b''.join(parts) == expected
+    # No results
+    assert list(marcxml_v1.iter_search(pid_fetcher, search_result([]))) == \
+        [marcxml_v1.serialize_search(pid_fetcher, search_result([]))]
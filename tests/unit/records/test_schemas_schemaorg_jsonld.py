@@ -27,6 +27,9 @@ from __future__ import absolute_import, print_function
 from datetime import datetime
 
 from flask_security import login_user
+from invenio_indexer.api import RecordIndexer
+from invenio_search import current_search, current_search_client
+from mock import patch
 
 from zenodo.modules.records.serializers import schemaorg_jsonld_v1
 from zenodo.modules.records.serializers.schemaorg import \
@@ -348,3 +351,29 @@ def test_dataset(app, users, minimal_record_model, recid_pid):
                 dict(metadata=minimal_record_model))
             assert not err
             assert 'distribution' not in data
+
+
+def test_precomputed_jsonld(app, db, es, record_with_files_creation):
+    """Test the JSON-LD stored in the index when indexing records."""
+    pid, record, _ = record_with_files_creation
+    expected = schemaorg_jsonld_v1.transform_record(pid, record)
+
+    with patch.dict(app.config, {'ZENODO_RECORDS_SCHEMAORG_PRECOMPUTE': True}):
+        RecordIndexer().index(record)
+        current_search.flush_and_refresh(index='records')
+        hit = current_search_client.get(index='records', id=str(record.id))
+        assert hit['_source']['_jsonld'] == {
+            'revision': record.revision_id, 'data': expected}
+
+        # The stored JSON-LD is used instead of serializing the record
+        serializer = schemaorg_jsonld_v1
+        with patch.object(serializer, 'dump', side_effect=Exception):
+            assert serializer.transform_record(pid, record) == expected
+            assert serializer.transform_search_hit(pid, hit) == expected
+
+        # ...unless the indexed document is stale
+        record['title'] = 'New title'
+        record.commit()
+        db.session.commit()
+        assert schemaorg_jsonld_v1.transform_record(
+            pid, record)['name'] == 'New title'
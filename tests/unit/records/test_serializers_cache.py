@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Zenodo.
+# Copyright (C) 2018 CERN.
+#
+# Zenodo is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Zenodo is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Zenodo; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Unit tests for the serialization cache."""
+
+from __future__ import absolute_import, print_function
+
+from collections import namedtuple
+
+import pytest
+
+from zenodo.modules.records.serializers.cache import CachedExportSerializer, \
+    CachedSerializer, LRUCache, SerializationCache
+
+
+class DictCache(dict):
+    """Minimal shared cache backend."""
+
+    def set(self, key, value, timeout=None):
+        self[key] = value
+
+    def set_many(self, mapping, timeout=None):
+        self.update(mapping)
+
+    def delete(self, key):
+        self.pop(key, None)
+
+
+@pytest.fixture()
+def cache():
+    """Serialization cache with a dictionary as shared cache."""
+    return SerializationCache(max_entries=2, backend=DictCache())
+
+
+def test_serialization_cache_not_shared(app):
+    """Test that serializations are only cached in-process by default."""
+    cache = SerializationCache(max_entries=2)
+    assert cache.backend is None
+    key = cache.key('json_v1', 'uuid', 1)
+    assert cache.get(key) is None
+    cache.set(key, b'data')
+    assert cache.get(key) == b'data'
+    cache.delete(key)
+    assert cache.get(key) is None
+    # Generations are shared in the application cache
+    cache.invalidate(['uuid'])
+    assert cache.generation('uuid') != 0
+
+
+def test_export_serialization_cache_shared(app, monkeypatch):
+    """Test that exports always use the shared cache."""
+    redis = app.extensions['zenodo-records'].serialization_cache_redis
+    assert not app.config['ZENODO_RECORDS_SERIALIZATION_CACHE_SHARED']
+    assert SerializationCache(shared=True).backend is redis
+    assert CachedExportSerializer(None, 'test').cache.backend is redis
+    monkeypatch.setitem(
+        app.config, 'ZENODO_RECORDS_SERIALIZATION_CACHE_SHARED', True)
+    assert SerializationCache().backend is redis
+    assert SerializationCache(shared=False).backend is None
+
+
+def test_lru_cache():
+    """Test LRU eviction by number of entries and size."""
+    lru = LRUCache(max_entries=2, max_size=10)
+    lru.set('a', b'1234')
+    lru.set('b', b'1234')
+    assert lru.get('a') == b'1234'
+    lru.set('c', b'1234')
+    # "b" was the least recently used
+    assert lru.get('b') is None
+    assert len(lru) == 2
+    lru.set('d', b'123456789')
+    assert lru.size == 9
+    assert lru.get('a') is None and lru.get('c') is None
+    lru.clear()
+    assert len(lru) == 0 and lru.size == 0
+
+
+def test_serialization_cache(cache):
+    """Test cache keys, fingerprints and the shared cache."""
+    key = cache.key('json_v1', 'uuid', 1)
+    assert key == 'serialization:json_v1:uuid:1'
+    assert cache.get(key) is None
+    cache.set(key, b'data', fingerprint='f1')
+    assert cache.get(key, fingerprint='f1') == b'data'
+    # Different fingerprint is a miss
+    assert cache.get(key, fingerprint='f2') is None
+    # Entries evicted from the local cache are fetched from the shared one
+    cache.local.clear()
+    assert cache.get(key, fingerprint='f1') == b'data'
+    assert (cache.hits, cache.misses) == (2, 2)
+    cache.delete(key)
+    assert cache.get(key, fingerprint='f1') is None
+
+
+def test_cached_export_serializer(cache):
+    """Test exporter serializer cache."""
+    calls = []
+
+    class Serializer(object):
+        def serialize_exporter(self, pid, record):
+            calls.append(pid)
+            return record['_source']['title'].encode('utf8')
+
+    serializer = CachedExportSerializer(Serializer(), 'test', cache=cache)
+    record = dict(_id='uuid', _version=2, _source={'title': 'test'})
+    assert serializer.serialize_exporter(1, record) == b'test'
+    assert serializer.serialize_exporter(1, record) == b'test'
+    assert len(calls) == 1
+    # New revision
+    serializer.serialize_exporter(1, dict(record, _version=3))
+    assert len(calls) == 2
+    # Same revision, but updated stats
+    serializer.serialize_exporter(
+        1, dict(record, _source={'title': 'test', '_stats': {'views': 1}}))
+    assert len(calls) == 3
+
+
+def test_cached_serializer(cache):
+    """Test record serializer cache."""
+    calls = []
+    PID = namedtuple('PID', ['pid_type', 'pid_value'])
+    context = ['harvard1']
+
+    class Record(dict):
+        id = 'uuid'
+        revision_id = 1
+
+    class Serializer(object):
+        mimetype = 'text/plain'
+
+        def serialize(self, pid, record, links_factory=None, **kwargs):
+            calls.append(pid)
+            return u'{0}:{1}'.format(pid.pid_value, record['title'])
+
+    serializer = CachedSerializer(
+        Serializer(), 'test', context=lambda: context, cache=cache)
+    record = Record(title='test')
+    recid, conceptrecid = PID('recid', '2'), PID('recid', '1')
+    # Attributes of the wrapped serializer are available
+    assert serializer.mimetype == 'text/plain'
+    assert serializer.serialize(recid, record) == u'2:test'
+    assert serializer.serialize(recid, record) == u'2:test'
+    assert len(calls) == 1
+    # Different PID or context
+    assert serializer.serialize(conceptrecid, record) == u'1:test'
+    context[0] = 'apa'
+    serializer.serialize(recid, record)
+    assert len(calls) == 3
+    # New revision
+    record.revision_id = 2
+    serializer.serialize(recid, record)
+    assert len(calls) == 4
+    # Invalidated record
+    cache.invalidate(['uuid'])
+    serializer.serialize(recid, record)
+    serializer.serialize(recid, record)
+    assert len(calls) == 5
+    # Records without revision and extra arguments are not cached
+    serializer.serialize(recid, dict(title='test'))
+    serializer.serialize(recid, record, style='apa')
+    assert len(calls) == 7
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Zenodo.
+# Copyright (C) 2018 CERN.
+#
+# Zenodo is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Zenodo is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Zenodo; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Unit tests for the schema dump plans."""
+
+from __future__ import absolute_import, print_function
+
+from copy import deepcopy
+from threading import Thread
+
+import pytest
+
+from zenodo.modules.records.serializers import datacite_v31, datacite_v41, \
+    dc_v1, geojson_v1, json_v1, legacyjson_v1, marcxml_v1, openaire_json_v1, \
+    schemaorg_jsonld_v1
+from zenodo.modules.records.serializers.plans import dump_plan
+from zenodo.modules.records.serializers.schemas.geojson import \
+    FeatureCollection
+
+
+def _schema_class(serializer, obj):
+    """Get the schema class a serializer dumps an object with."""
+    if serializer is schemaorg_jsonld_v1:
+        return serializer._get_schema_class(obj)
+    elif serializer is geojson_v1:
+        return FeatureCollection
+    return serializer.schema_class
+
+
+@pytest.mark.parametrize('serializer', [
+    datacite_v31, datacite_v41, dc_v1, geojson_v1, json_v1, legacyjson_v1,
+    marcxml_v1, openaire_json_v1, schemaorg_jsonld_v1,
+])
+def test_dump_plan_equivalence(app, db, minimal_record_model, recid_pid,
+                               record_with_bucket, serializer):
+    """Test that dump plans give the same output as new schema instances."""
+    pid, record = record_with_bucket
+    objs = [
+        (recid_pid, serializer.preprocess_record(
+            recid_pid, minimal_record_model)),
+        (pid, serializer.preprocess_record(pid, record)),
+    ]
+    # Alternate the records, so that the context of the plans changes.
+    for pid_, obj in objs + objs:
+        schema_class = _schema_class(serializer, obj)
+        # MARCXML is dumped without a context
+        context = None if serializer is marcxml_v1 else {'pid': pid_}
+        expected = schema_class(context=context).dump(deepcopy(obj)).data
+        plan = dump_plan(schema_class, context)
+        assert plan.dump(deepcopy(obj), context) == expected
+        assert plan.context == {}
+
+
+def test_dump_plan_reuse(app):
+    """Test that plans are reused within a thread only."""
+    schema_class = json_v1.schema_class
+    plan = dump_plan(schema_class, {'pid': None})
+    assert dump_plan(schema_class, {'recid': 1}) is plan
+    assert dump_plan(schema_class) is not plan
+
+    plans = []
+    thread = Thread(target=lambda: plans.append(
+        dump_plan(schema_class, {'pid': None})))
+    thread.start()
+    thread.join()
+    assert plans[0] is not plan
@@ -38,6 +38,7 @@ from invenio_records.api import Record
 from invenio_search import current_search
 from mock import Mock, patch
 
+from zenodo.modules.records.serializers import citeproc_v1
 from zenodo.modules.records.views import zenodo_related_links
 
 
@@ -229,6 +230,31 @@ def test_citation_formatter_citeproc_get(api, api_client, es, db, full_record,
     assert '(2014).' in res.get_data(as_text=True)
 
 
+def test_records_ui_citations(app, db, full_record):
+    """Test rendering the citation of a record in many styles."""
+    r = Record.create(full_record)
+    pid = PersistentIdentifier.create(
+        'recid', '12345', object_type='rec', object_uuid=r.id,
+        status=PIDStatus.REGISTERED)
+    db.session.commit()
+
+    with app.test_client() as client:
+        url = url_for('invenio_records_ui.recid_citations', pid_value='12345')
+        res = client.get(url, query_string=[
+            ('style', 'apa'), ('style', 'science'), ('style', 'invalid'),
+            ('locale', 'en-US')])
+        assert res.status_code == 200
+        citations = json.loads(res.get_data(as_text=True))
+        assert set(citations) == {'apa', 'science', 'invalid'}
+        assert 'Doe, J.' in citations['apa']
+        assert citations['invalid'] is None
+        with app.test_request_context():
+            for style in ('apa', 'science'):
+                assert citations[style] == citeproc_v1.serialize(
+                    pid, r, style=style, locale='en-US')
+        assert client.get(url).status_code == 400
+
+
 @pytest.mark.parametrize(('stats', 'expected_result'), [
     (None, {
         'version_views': '0', 'views': '0',
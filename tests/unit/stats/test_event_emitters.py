@@ -22,12 +22,19 @@
 
 """Unit tests statistics for record views."""
 
+import gc
+
 from elasticsearch_dsl import Search
-from flask import url_for
+from flask import Flask, url_for
 from invenio_pidstore.models import PersistentIdentifier, PIDStatus
 from invenio_records.api import Record
 from invenio_search import current_search
 from invenio_stats.tasks import process_events
+from mock import patch
+
+from zenodo.modules.stats import buffer as stats_buffer
+from zenodo.modules.stats.buffer import EventBuffer
+from zenodo.modules.stats.event_builders import add_record_metadata
 
 
 def test_record_page(app, db, es, event_queues, full_record):
@@ -61,6 +68,15 @@ def test_record_page(app, db, es, event_queues, full_record):
     assert doc['owners'] == [1]
 
 
+def test_record_metadata_unresolved(app, db):
+    """Test that events of unresolved records are kept and logged."""
+    event = {'pid_type': 'recid', 'pid_value': '404', 'visitor_id': 'v'}
+    with app.test_request_context(), \
+            patch.object(app.logger, 'warning') as warning:
+        assert add_record_metadata(dict(event), app) == event
+        assert warning.called
+
+
 def test_file_download(app, db, es, event_queues, record_with_files_creation):
     """Test file download views."""
     recid, record, _ = record_with_files_creation
@@ -92,3 +108,53 @@ def test_file_download(app, db, es, event_queues, record_with_files_creation):
     assert doc['access_right'] == 'open'
     assert doc['communities'] == ['zenodo']
     assert doc['owners'] == [1]
+
+
+def test_event_buffer(app, event_queues, monkeypatch):
+    """Test pre-aggregation of events."""
+    def _event(ts, **kwargs):
+        event = dict(timestamp='2018-01-01T13:00:{0:02d}'.format(ts),
+                     pid_type='recid', pid_value='1', user_id='1')
+        event.update(kwargs)
+        return event
+
+    buffer = EventBuffer()
+    # Record views are deduplicated in windows of 30 seconds
+    buffer.add('record-view', _event(1))
+    buffer.add('record-view', _event(5))
+    buffer.add('record-view', _event(31))
+    buffer.add('record-view', _event(5, user_id='2'))
+    assert len(buffer) == 3
+    assert list(event_queues['stats-record-view'].consume()) == []
+
+    buffer.flush()
+    assert len(buffer) == 0
+    events = list(event_queues['stats-record-view'].consume())
+    assert events == [_event(5), _event(31), _event(5, user_id='2')]
+
+    # Events are queued when the buffer is full
+    monkeypatch.setitem(app.config, 'ZENODO_STATS_EVENTS_BUFFER_SIZE', 2)
+    buffer.add('record-view', _event(1))
+    buffer.add('record-view', _event(1, pid_value='2'))
+    assert len(buffer) == 0
+    assert len(list(event_queues['stats-record-view'].consume())) == 2
+
+
+def test_event_buffer_exit(app, event_queues):
+    """Test that the buffered events of each application are published."""
+    buffer = app.extensions['zenodo-stats'].event_buffer
+    assert stats_buffer._buffers[app] is buffer
+
+    # Applications are not kept alive until the exit
+    other = Flask('other')
+    stats_buffer.register_event_buffer(other, EventBuffer())
+    count = len(stats_buffer._buffers)
+    del other
+    gc.collect()
+    assert len(stats_buffer._buffers) == count - 1
+
+    buffer.add('record-view', dict(
+        timestamp='2018-01-01T13:00:00', pid_type='recid', pid_value='1'))
+    stats_buffer._flush_event_buffers()
+    assert len(buffer) == 0
+    assert len(list(event_queues['stats-record-view'].consume())) == 1
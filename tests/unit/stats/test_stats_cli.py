@@ -70,3 +70,31 @@ def test_record_view_import(app, db, es, event_queues, full_record,
         'user_agent': 'foo',
         'user_id': None,
     }
+
+
+def test_record_view_import_summary(app, db, es, event_queues, full_record,
+                                    script_info, tmpdir):
+    """Test the import summary of multiple files."""
+    r = Record.create(full_record)
+    PersistentIdentifier.create(
+        'recid', '12345', object_type='rec', object_uuid=r.id,
+        status=PIDStatus.REGISTERED)
+    db.session.commit()
+
+    header = ',userAgent,ipAddress,url,serverTimePretty,timestamp,referrer\n'
+    row = ',foo,137.138.36.206,https://zenodo.org/record/{0},,{1},\n'
+    tmpdir.join('a.csv').write(
+        header + ''.join(row.format(12345, 1367928000 + i) for i in range(5)))
+    tmpdir.join('b.csv').write(
+        header + row.format(12345, 1367928000) + row.format(99999, 0))
+
+    runner = CliRunner()
+    res = runner.invoke(
+        import_events, ['record-view', str(tmpdir), '-s', '2'],
+        obj=script_info)
+    assert res.exit_code == 0
+    assert 'a.csv: 5 rows, 5 events, 0 skipped, 0 failed' in res.output
+    assert 'b.csv: 2 rows, 1 events, 1 skipped, 0 failed' in res.output
+    assert 'Total: 7 rows' in res.output
+    events = list(event_queues['stats-record-view'].consume())
+    assert len(events) == 6
@@ -21,11 +21,14 @@
 # or submit itself to any jurisdiction.
 
 """Unit tests for statistics exporters."""
+import json
+import threading
 from datetime import datetime, timedelta
 
 import pytest
 from invenio_cache import current_cache
 from mock import mock
+from six.moves.BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
 from stats_helpers import create_stats_fixtures
 
 from zenodo.modules.stats.exporters import PiwikExporter, \
@@ -56,7 +59,7 @@ def mocked_requests_fail(*args, **kwargs):
     return MockResponse({}, 500)
 
 
-@mock.patch('zenodo.modules.stats.exporters.requests.post',
+@mock.patch('zenodo.modules.stats.exporters.requests.Session.post',
             side_effect=mocked_requests_success)
 def test_piwik_exporter(app, db, es, locations, event_queues, full_record):
     records = create_stats_fixtures(
@@ -86,7 +89,7 @@ def test_piwik_exporter(app, db, es, locations, event_queues, full_record):
     assert bookmark == u'2018-01-01T14:30:00'
 
 
-@mock.patch('zenodo.modules.stats.exporters.requests.post',
+@mock.patch('zenodo.modules.stats.exporters.requests.Session.post',
             side_effect=mocked_requests_invalid)
 def test_piwik_exporter_invalid_request(app, db, es, locations, event_queues,
                                         full_record):
@@ -111,7 +114,7 @@ def test_piwik_exporter_invalid_request(app, db, es, locations, event_queues,
     assert bookmark is None
 
 
-@mock.patch('zenodo.modules.stats.exporters.requests.post',
+@mock.patch('zenodo.modules.stats.exporters.requests.Session.post',
             side_effect=mocked_requests_fail)
 def test_piwik_exporter_request_fail(app, db, es, locations, event_queues,
                                      full_record):
@@ -152,8 +155,113 @@ def test_piwik_exporter_no_bookmark(app, db, es, locations, event_queues,
     bookmark = current_cache.get('piwik_export:bookmark')
     assert bookmark is None
 
-    with mock.patch('zenodo.modules.stats.exporters.requests.post') as mocked:
+    with mock.patch(
+            'zenodo.modules.stats.exporters.requests.Session.post') as mocked:
         PiwikExporter().run()
         mocked.assert_not_called()
     bookmark = current_cache.get('piwik_export:bookmark')
     assert bookmark is None
+
+
+class PiwikStubHandler(BaseHTTPRequestHandler):
+    """Piwik bulk tracking API stub, failing the requests of some events."""
+
+    def do_POST(self):
+        length = int(self.headers['Content-Length'])
+        payload = json.loads(self.rfile.read(length).decode('utf-8'))
+        self.server.payloads.append(payload)
+        failing = any(self.server.fail_on in r for r in payload['requests'])
+        body = json.dumps({'status': 'success', 'invalid': 0})
+        self.send_response(500 if failing else 200)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(body.encode('utf-8'))
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture()
+def piwik_server(app):
+    """Local Piwik stub server."""
+    server = HTTPServer(('127.0.0.1', 0), PiwikStubHandler)
+    server.payloads = []
+    server.fail_on = 'NO_FAILURES'
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    config = dict(app.config['ZENODO_STATS_PIWIK_EXPORTER'])
+    config.update(
+        url='http://127.0.0.1:{0}/piwik.php'.format(server.server_port),
+        chunk_size=1, max_in_flight=3)
+    with mock.patch.dict(
+            app.config, {'ZENODO_STATS_PIWIK_EXPORTER': config}):
+        yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_piwik_exporter_stub_server(app, db, es, locations, event_queues,
+                                    full_record, piwik_server):
+    """Test concurrent uploads against a stub server."""
+    create_stats_fixtures(
+        metadata=full_record, n_records=1, n_versions=1, n_files=1,
+        event_data={'user_id': '1', 'country': 'CH'},
+        # 4 event timestamps
+        start_date=datetime(2018, 1, 1, 13),
+        end_date=datetime(2018, 1, 1, 15),
+        interval=timedelta(minutes=30),
+        do_process_events=True,
+        do_aggregate_events=False,
+        do_update_record_statistics=False
+    )
+    current_cache.delete('piwik_export:bookmark')
+
+    # Uploads fail from the first event at 14:00 on...
+    piwik_server.fail_on = 'cdt=2018-01-01T14%3A00%3A00'
+    with pytest.raises(PiwikExportRequestError):
+        PiwikExporter().run(start_date=datetime(2018, 1, 1, 12))
+    # ...so the bookmark stops right before it, even if later chunks succeed
+    assert current_cache.get('piwik_export:bookmark') == \
+        u'2018-01-01T13:30:00'
+
+    piwik_server.fail_on = 'NO_FAILURES'
+    piwik_server.payloads = []
+    PiwikExporter().run()
+    assert current_cache.get('piwik_export:bookmark') == \
+        u'2018-01-01T14:30:00'
+    # One chunk per event (a view and a download at each timestamp)
+    assert len(piwik_server.payloads) == 6
+    assert all(len(p['requests']) == 1 for p in piwik_server.payloads)
+
+
+def test_piwik_exporter_unresolved_records(app, db, es, locations,
+                                           event_queues, full_record):
+    """Test that events of unresolved records are logged and counted."""
+    create_stats_fixtures(
+        metadata=full_record, n_records=1, n_versions=1, n_files=1,
+        event_data={'user_id': '1', 'country': 'CH'},
+        # 4 event timestamps
+        start_date=datetime(2018, 1, 1, 13),
+        end_date=datetime(2018, 1, 1, 15),
+        interval=timedelta(minutes=30),
+        do_process_events=True,
+        do_aggregate_events=False,
+        do_update_record_statistics=False
+    )
+    current_cache.delete('piwik_export:bookmark')
+
+    exporter = PiwikExporter()
+    with mock.patch('zenodo.modules.stats.exporters.fetch_records',
+                    return_value={}), \
+            mock.patch('zenodo.modules.stats.exporters.requests.Session.post'
+                       ) as post, \
+            mock.patch.object(app.logger, 'warning') as warning:
+        exporter.run(start_date=datetime(2018, 1, 1, 12))
+        post.assert_not_called()
+        assert warning.called
+    # A view and a download at each timestamp
+    assert exporter.skipped == 8
+    # Skipped events don't hold the bookmark back
+    assert current_cache.get('piwik_export:bookmark') == \
+        u'2018-01-01T14:30:00'
@@ -26,12 +26,16 @@ from datetime import datetime, timedelta
 
 from flask import url_for
 from invenio_indexer.api import RecordIndexer
-from invenio_search import current_search
+from invenio_search import current_search, current_search_client
+from invenio_search.utils import build_alias_name
 from invenio_stats.tasks import aggregate_events, process_events
-from stats_helpers import create_stats_fixtures
+from mock import patch
+from stats_helpers import _create_records, create_stats_fixtures
 
+from zenodo.modules.records.indexer import ZenodoRecordIndexer
 from zenodo.modules.stats.tasks import update_record_statistics
-from zenodo.modules.stats.utils import get_record_stats
+from zenodo.modules.stats.utils import build_record_stats, \
+    build_records_stats, get_record_stats, iter_concepts_children
 
 
 def test_update_record_statistics(app, db, es, locations, event_queues,
@@ -110,3 +114,78 @@ def test_update_record_statistics(app, db, es, locations, event_queues,
     for recid, _, _ in records[1:]:
         stats = get_record_stats(recid.object_uuid)
         assert stats == expected_stats
+
+    # Stats are updated in place, keeping the rest of the indexed document
+    # and its version, so that the record can still be fully reindexed.
+    doc = current_search_client.get(
+        index=build_alias_name('records'), id=str(recid_v1.object_uuid))
+    assert doc['_version'] == record_v1.revision_id
+    assert doc['_source']['title'] == record_v1['title']
+    RecordIndexer().index(record_v1)
+
+
+def test_build_records_stats(app, db, es, locations, event_queues,
+                             minimal_record):
+    """Test batch building of record statistics."""
+    records = create_stats_fixtures(
+        metadata=minimal_record, n_records=2, n_versions=3, n_files=2,
+        event_data={'user_id': '1'},
+        start_date=datetime(2018, 1, 1, 13),
+        end_date=datetime(2018, 1, 1, 15),
+        interval=timedelta(minutes=30),
+        do_update_record_statistics=True)
+
+    pairs = [(r['recid'], r['conceptrecid']) for _, r, _ in records]
+    # A record without any events gets zero stats
+    pairs.append((123456, None))
+    stats = build_records_stats(pairs)
+    assert len(stats) == len(pairs)
+    for recid, conceptrecid in pairs[:-1]:
+        assert stats[str(recid)] == build_record_stats(recid, conceptrecid)
+    assert stats['123456'] == {
+        'views': 0.0, 'unique_views': 0.0, 'downloads': 0.0,
+        'unique_downloads': 0.0, 'volume': 0.0}
+
+    # Bulk indexing uses the batch stats
+    ZenodoRecordIndexer().bulk_index([r.id for _, r, _ in records])
+    ZenodoRecordIndexer().process_bulk_queue()
+    current_search.flush_and_refresh(index='records')
+    for recid, record, _ in records:
+        assert get_record_stats(recid.object_uuid) == \
+            stats[str(record['recid'])]
+
+
+def test_batch_stats_published_records(app, db, es, locations, event_queues,
+                                       minimal_record):
+    """Test that published records, which have a deposit, use batch stats."""
+    records = _create_records(minimal_record, total=2, versions=2, files=0)
+    for i, (_, record, _) in enumerate(records):
+        record['_deposit'] = {
+            'id': str(100 + i), 'pid': {'type': 'recid', 'value': '1'},
+            'status': 'published', 'owners': [1]}
+        record.commit()
+    db.session.commit()
+
+    with patch('zenodo.modules.records.indexer.build_record_stats') as m:
+        ZenodoRecordIndexer().bulk_index([r.id for _, r, _ in records])
+        ZenodoRecordIndexer().process_bulk_queue()
+        assert not m.called
+    current_search.flush_and_refresh(index='records')
+    for recid, _, _ in records:
+        assert get_record_stats(recid.object_uuid)['views'] == 0
+
+
+def test_iter_concepts_children(app, db, minimal_record):
+    """Test resolution of the versions of many concepts."""
+    records = _create_records(minimal_record, total=3, versions=2, files=0)
+    conceptrecids = [r['conceptrecid'] for _, r, _ in records]
+
+    # Duplicate and unknown concepts are ignored
+    uuids = list(iter_concepts_children(
+        conceptrecids + conceptrecids[:1] + ['999999'], chunk_size=2))
+    assert len(uuids) == len(set(uuids)) == 6
+    assert set(uuids) == {str(r.id) for _, r, _ in records}
+
+    uuids = list(iter_concepts_children(conceptrecids[:1]))
+    assert set(uuids) == {str(r.id) for _, r, _ in records[:2]}
+    assert list(iter_concepts_children([])) == []
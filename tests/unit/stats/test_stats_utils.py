@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Zenodo.
+# Copyright (C) 2018 CERN.
+#
+# Zenodo is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Zenodo is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Zenodo. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Unit tests for statistics utilities."""
+
+from __future__ import absolute_import, print_function
+
+import uuid
+
+import pytest
+from invenio_cache import current_cache
+from invenio_pidstore.models import PersistentIdentifier, PIDStatus
+
+from zenodo.modules.records.api import ZenodoRecord
+from zenodo.modules.stats import utils
+from zenodo.modules.stats.proxies import current_stats_record_cache
+from zenodo.modules.stats.utils import cache_records_stats, fetch_record, \
+    fetch_record_file, fetch_records, get_record_stats, \
+    record_stats_cache_key
+
+
+def test_record_stats_cache(app, monkeypatch):
+    """Test the record statistics cache."""
+    fetched = []
+
+    def _fetch(recordid):
+        fetched.append(recordid)
+        return {'views': float(len(fetched))}
+    monkeypatch.setattr(utils, '_fetch_record_stats', _fetch)
+
+    recordid = str(uuid.uuid4())
+    key = record_stats_cache_key(recordid)
+
+    # A miss fetches and caches the stats
+    assert get_record_stats(recordid) == {'views': 1.0}
+    assert get_record_stats(recordid) == {'views': 1.0}
+    assert fetched == [recordid]
+
+    # Stats populated by the stats pipeline are served as they are
+    cache_records_stats({recordid: {'views': 10.0}})
+    assert get_record_stats(recordid) == {'views': 10.0}
+    assert len(fetched) == 1
+
+    # Expired stats are served while another client refreshes them...
+    current_cache.set(key, (0, {'views': 10.0}))
+    current_cache.set(key + ':lock', 1)
+    assert get_record_stats(recordid) == {'views': 10.0}
+    assert len(fetched) == 1
+
+    # ...or are refreshed
+    current_cache.delete(key + ':lock')
+    assert get_record_stats(recordid) == {'views': 2.0}
+    assert current_cache.get(key + ':lock') is None
+
+    # Missing stats are fetched, if another client doesn't fetch them soon
+    current_cache.delete(key)
+    current_cache.set(key + ':lock', 1)
+    assert get_record_stats(recordid) == {'views': 3.0}
+    assert current_cache.get(key) is None
+    current_cache.delete(key + ':lock')
+
+
+def test_record_resolution_cache(app, db, minimal_record):
+    """Test the record resolution cache."""
+    record = ZenodoRecord.create(dict(minimal_record, _files=[
+        {'key': 'test.pdf', 'bucket': '1', 'file_id': '2', 'size': 10,
+         'version_id': '3', 'checksum': 'md5:1', 'type': 'pdf'}]))
+    PersistentIdentifier.create(
+        'recid', str(record['recid']), object_type='rec',
+        object_uuid=record.id, status=PIDStatus.REGISTERED)
+    db.session.commit()
+    recid = str(record['recid'])
+
+    cache = current_stats_record_cache
+    counters = cache.counters
+    cached = fetch_record(recid)
+    assert cached.id == str(record.id)
+    assert cached['title'] == record['title']
+    assert fetch_record_file(recid, 'test.pdf').size == 10
+    with pytest.raises(KeyError):
+        fetch_record_file(recid, 'missing.pdf')
+    assert fetch_records([recid, '999999']) == {recid: cached}
+
+    # A process with an empty in-process cache uses the shared cache
+    cache.local.clear()
+    assert fetch_record(recid) == cached
+    assert cache.counters == dict(
+        local_hits=counters['local_hits'] + 3,
+        shared_hits=counters['shared_hits'] + 1,
+        misses=counters['misses'] + 2)
+
+    # Updating the record invalidates it
+    record['title'] = 'New title'
+    record.commit()
+    db.session.commit()
+    assert fetch_record(recid)['title'] == 'New title'
@@ -173,7 +173,11 @@ CELERY_TASK_ROUTES = {
     'zenodo.modules.sipstore.tasks.archive_sip': {'queue': 'low'},
     'zenodo_migrator.tasks.migrate_concept_recid_sips': {'queue': 'low'},
     'invenio_openaire.tasks.register_grant': {'queue': 'low'},
-    'invenio_indexer.tasks.process_bulk_queue': {'queue': 'celery-indexer'}
+    'invenio_indexer.tasks.process_bulk_queue': {'queue': 'celery-indexer'},
+    'zenodo.modules.records.tasks.process_bulk_queue': {
+        'queue': 'celery-indexer'},
+    'zenodo.modules.records.tasks.update_records_relations': {
+        'queue': 'celery-indexer'},
 }
 #: Beat schedule
 CELERY_BEAT_SCHEDULE = {
@@ -182,12 +186,24 @@ CELERY_BEAT_SCHEDULE = {
         'schedule': crontab(minute=2, hour=0),
     },
     'indexer': {
-        'task': 'invenio_indexer.tasks.process_bulk_queue',
+        'task': 'zenodo.modules.records.tasks.process_bulk_queue',
         'schedule': timedelta(minutes=5),
         'kwargs': {
             'es_bulk_kwargs': {'raise_on_error': False},
+            'lane': 'bulk',
         },
     },
+    'indexer-interactive': {
+        'task': 'zenodo.modules.records.tasks.process_bulk_queue',
+        'schedule': timedelta(seconds=30),
+        'kwargs': {
+            'es_bulk_kwargs': {'raise_on_error': False},
+            'lane': 'interactive',
+        },
+        # Consumed by a separate worker, not waiting behind bulk indexing
+        # (see INSTALL.rst and docker-compose.full.yml)
+        'options': {'queue': 'celery-indexer-interactive'},
+    },
     'openaire-updater': {
         'task': 'zenodo.modules.utils.tasks.update_search_pattern_sets',
         'schedule': timedelta(hours=12),
@@ -251,6 +267,7 @@ CELERY_BEAT_SCHEDULE = {
         'schedule': crontab(minute=0, hour=4, day_of_month=1),
         'kwargs': {
             'job_id': 'records',
+            'retry': True,
         }
     },
     # Stats
@@ -797,6 +814,12 @@ RECORDS_UI_ENDPOINTS = dict(
         view_imp='zenodo.modules.records.views.record_extra_formats',
         record_class='zenodo.modules.records.api:ZenodoRecord',
     ),
+    recid_citations=dict(
+        pid_type='recid',
+        route='/record/<pid_value>/citations',
+        view_imp='zenodo.modules.records.views.record_citations',
+        record_class='zenodo.modules.records.api:ZenodoRecord',
+    ),
 )
 RECORDS_UI_ENDPOINTS.update(ACCESSREQUESTS_RECORDS_UI_ENDPOINTS)
 
@@ -1338,6 +1361,7 @@ STATS_EVENTS = {
             'invenio_stats.contrib.event_builders.file_download_event_builder',
             'zenodo.modules.stats.event_builders:skip_deposit',
             'zenodo.modules.stats.event_builders:add_record_metadata',
+            'zenodo.modules.stats.event_builders:buffer_file_download_event',
         ],
         'cls': EventsIndexer,
         'params': {
@@ -1362,6 +1386,7 @@ STATS_EVENTS = {
             'invenio_stats.contrib.event_builders.record_view_event_builder',
             'zenodo.modules.stats.event_builders:skip_deposit',
             'zenodo.modules.stats.event_builders:add_record_metadata',
+            'zenodo.modules.stats.event_builders:buffer_record_view_event',
         ],
         'cls': EventsIndexer,
         'params': {
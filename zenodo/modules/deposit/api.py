@@ -37,7 +37,7 @@ from invenio_deposit.api import Deposit, index, preserve
 from invenio_deposit.utils import mark_as_action
 from invenio_files_rest.models import Bucket, MultipartObject, ObjectVersion, \
     Part
-from invenio_pidrelations.contrib.records import RecordDraft, index_siblings
+from invenio_pidrelations.contrib.records import RecordDraft
 from invenio_pidrelations.contrib.versioning import PIDVersioning
 from invenio_pidstore.errors import PIDInvalidAction
 from invenio_pidstore.models import PersistentIdentifier, PIDStatus
@@ -50,6 +50,7 @@ from invenio_sipstore.models import RecordSIP as RecordSIPModel
 from zenodo.modules.communities.api import ZenodoCommunity
 from zenodo.modules.records.api import ZenodoFileObject, ZenodoFilesIterator, \
     ZenodoFilesMixin, ZenodoRecord
+from zenodo.modules.records.indexer import index_siblings_relations
 from zenodo.modules.records.minters import doi_generator, is_local_doi, \
     zenodo_concept_doi_minter, zenodo_doi_updater
 from zenodo.modules.records.utils import is_doi_locally_managed, \
@@ -425,7 +426,7 @@ class ZenodoDeposit(Deposit, ZenodoFilesMixin):
         # Update the concept recid redirection
         pv.update_redirect()
         RecordDraft.unlink(record.pid, self.pid)
-        index_siblings(record.pid, neighbors_eager=True, with_deposits=True)
+        index_siblings_relations(record.pid)
 
         return record
 
@@ -603,11 +604,9 @@ class ZenodoDeposit(Deposit, ZenodoFilesMixin):
                     self.pid == versioning.draft_child_deposit:
                 versioning.remove_draft_child()
             if versioning.last_child:
-                index_siblings(versioning.last_child,
-                               children=versioning.children.all(),
-                               include_pid=True,
-                               neighbors_eager=True,
-                               with_deposits=True)
+                index_siblings_relations(versioning.last_child,
+                                         children=versioning.children.all(),
+                                         include_pid=True)
 
         if recid.status == PIDStatus.RESERVED:
             db.session.delete(recid)
@@ -706,8 +705,7 @@ class ZenodoDeposit(Deposit, ZenodoFilesMixin):
                 deposit['doi'] = doi_generator(recid.pid_value)
 
                 pv = PIDVersioning(child=pid)
-                index_siblings(pv.draft_child, neighbors_eager=True,
-                               with_deposits=True)
+                index_siblings_relations(pv.draft_child)
 
                 with db.session.begin_nested():
                     # Create snapshot from the record's bucket and update data
@@ -29,11 +29,12 @@ from __future__ import absolute_import, print_function
 import copy
 
 from flask import current_app
-from invenio_pidrelations.contrib.records import index_siblings
 from invenio_pidrelations.contrib.versioning import PIDVersioning
 from invenio_pidrelations.serializers.utils import serialize_relations
 from invenio_pidstore.models import PersistentIdentifier
 
+from zenodo.modules.records.indexer import build_deposit_relations, \
+    index_siblings_relations
 from zenodo.modules.records.utils import build_record_custom_fields
 
 from .api import ZenodoDeposit
@@ -87,13 +88,9 @@ def indexer_receiver(sender, json=None, record=None, index=None,
     if recid:
         pid = PersistentIdentifier.get('recid', recid)
         pv = PIDVersioning(child=pid)
-        relations = serialize_relations(pid)
         if pv.exists:
-            if pv.draft_child_deposit:
-                is_last = (pv.draft_child_deposit.pid_value
-                           == record['_deposit']['id'])
-                relations['version'][0]['is_last'] = is_last
-                relations['version'][0]['count'] += 1
+            relations = build_deposit_relations(
+                serialize_relations(pid), record['_deposit']['id'])
         else:
             relations = {'version': [{'is_last': True, 'index': 0}, ]}
         if relations:
@@ -116,4 +113,4 @@ def index_versioned_record_siblings(sender, action=None, pid=None,
     if action == "publish" and first_publish:
         recid_pid, _ = deposit.fetch_published()
         current_app.logger.info(u'indexing siblings of {}', recid_pid)
-        index_siblings(recid_pid, neighbors_eager=True)
+        index_siblings_relations(recid_pid, with_deposits=False)
@@ -27,5 +27,8 @@
 from __future__ import absolute_import, print_function
 
 from .api import Exporter
-from .streams import BZip2ResultStream, ResultStream
-from .writers import BucketWriter, filename_factory
+from .formats import ColumnarResultStream, FlatRecordSerializer, \
+    NDJSONSerializer
+from .streams import BZip2ResultStream, CompressedResultStream, ResultStream
+from .writers import BucketWriter, filename_factory, manifest_filename, \
+    part_filename
@@ -26,12 +26,27 @@
 
 from __future__ import absolute_import, print_function
 
+import json
+from collections import OrderedDict
+
 from elasticsearch_dsl import Q
 from flask import current_app
+from invenio_pidstore.models import PersistentIdentifier, PIDStatus
 from invenio_search.api import RecordsSearch
+from six import BytesIO, itervalues
+
+from .errors import ExportChecksumError, FailedExportJobError
+from .progress import ProgressStream
+from .streams import LINE_FORMATS, ChecksumStream, HitsSearch, \
+    IterableStream, ResultStream, codec_for_key, compress_chunks, \
+    format_for_key, iter_chunks, iter_decompressed, iter_lines
+from .utils import open_object
+from .writers import chunk_filename, delta_filename, tombstones_filename
+
 
-from .errors import FailedExportJobError
-from .streams import ResultStream
+def _pid_value(line):
+    """Get the PID value of a serialized record."""
+    return str(json.loads(line.decode('utf8'))['id'])
 
 
 class Exporter(object):
@@ -43,8 +58,25 @@ class Exporter(object):
 
     def __init__(self, index='records', pid_fetcher=None, query=None,
                  resultstream_cls=ResultStream, search_cls=RecordsSearch,
-                 serializer=None, writer=None, ):
-        """Initialize exporter."""
+                 serializer=None, writer=None, slices=None, pid_type='recid',
+                 chunk_size=None, sort=('_id', )):
+        """Initialize exporter.
+
+        :param slices: Number of sliced scrolls to split the search into. If
+            greater than one, the export job is run in parallel with one
+            subtask per slice (see :py:func:`run_slice`).
+        :param pid_type: Type of the persistent identifiers listed as
+            tombstones in delta exports (see :py:func:`run_delta`).
+        :param chunk_size: Number of records per chunk of checkpointed exports
+            (see :py:func:`run_checkpointed`).
+        :param sort: Fields that uniquely sort the search results, used for
+            resuming checkpointed exports.
+        :raises ValueError: If both ``slices`` and ``chunk_size`` are set, as
+            checkpointed exports are not sliced.
+        """
+        if slices and slices > 1 and chunk_size:
+            raise ValueError(
+                'Checkpointed exports (chunk_size) can not be sliced.')
         self._index = index
         self._pid_fetcher = pid_fetcher
         self._query = query
@@ -52,22 +84,283 @@ class Exporter(object):
         self._search_cls = search_cls
         self._serializer = serializer
         self._writer = writer
+        self.slices = slices or 1
+        self._pid_type = pid_type
+        self.chunk_size = chunk_size
+        self._sort = sort
 
     @property
     def search(self):
         """Get Elasticsearch search instance."""
-        s = self._search_cls(index=self._index)
+        # Include the document version (i.e. the record revision)
+        s = self._search_cls(index=self._index).extra(version=True)
         if self._query:
             s = s.query(Q('query_string', query=self._query))
         return s
 
-    def run(self, progress_updater=None):
-        """Run export job."""
-        fp = self._writer.open()
+    @property
+    def writer(self):
+        """Get the export writer."""
+        return self._writer
+
+    def sliced_search(self, slice_id, max_slices):
+        """Get Elasticsearch search instance for one slice of a scroll."""
+        return self.search.extra(slice={'id': slice_id, 'max': max_slices})
+
+    def iter_sorted_hits(self, after=None, size=1000):
+        """Iterate over the sorted search results following a sort key.
+
+        Unlike a scroll, ``search_after`` pagination can be resumed at any time
+        from the sort key (``hit.meta.sort``) of the last processed hit.
+        """
+        search = self.search.sort(*self._sort).extra(size=size)
+        while True:
+            s = search.extra(search_after=after) if after else search
+            hits = s.execute().hits
+            if not hits:
+                return
+            for hit in hits:
+                yield hit
+            after = list(hits[-1].meta.sort)
+
+    def delta_search(self, since, until):
+        """Get Elasticsearch search instance for records indexed in a range.
+
+        The documents' ``_indexed`` timestamp is set on every write to the
+        index, including the partial updates of their stats and relations,
+        which don't change the records' ``_updated``.
+
+        :param since: Exclusive lower bound of the documents' ``_indexed``.
+        :param until: Inclusive upper bound of the documents' ``_indexed``.
+        """
+        return self.search.filter('range', _indexed={
+            'gt': since.isoformat(), 'lte': until.isoformat()})
+
+    def deleted_pids(self, since, until):
+        """Get the values of the PIDs deleted in a time range."""
+        pids = PersistentIdentifier.query.filter(
+            PersistentIdentifier.pid_type == self._pid_type,
+            PersistentIdentifier.status == PIDStatus.DELETED,
+            PersistentIdentifier.updated > since,
+            PersistentIdentifier.updated <= until,
+        ).order_by(PersistentIdentifier.updated)
+        return [p.pid_value for p in pids]
+
+    def write_json(self, key, data):
+        """Write a JSON object next to the exported data."""
+        writer = self._writer.part(key).open()
         try:
-            fp.write(self._resultstream_cls(
-                self.search, self._pid_fetcher, self._serializer))
+            writer.write(BytesIO(json.dumps(data, indent=2).encode('utf8')))
+        finally:
+            writer.close()
+
+    def read_json(self, key):
+        """Read a JSON object written with :py:func:`write_json`."""
+        with open_object(self._writer.bucket_id, key) as fp:
+            return json.loads(fp.read().decode('utf8'))
+
+    def _read_lines(self, key):
+        """Iterate over the serialized records of an exported object."""
+        with open_object(self._writer.bucket_id, key) as fp:
+            for line in iter_lines(iter_decompressed(fp, codec_for_key(key))):
+                yield line
+
+    def _results(self, search, progress=None):
+        """Get the result stream of a search."""
+        results = self._resultstream_cls(
+            search, self._pid_fetcher, self._serializer)
+        results.progress = progress
+        return results
+
+    def _write(self, writer, search, progress=None):
+        """Write serialized search results and return the result stream."""
+        if progress is not None and progress.total is None:
+            progress.total = search.count()
+        return self._write_stream(
+            writer, self._results(search, progress), progress)
+
+    def _write_stream(self, writer, stream, progress=None):
+        """Write a stream and return it."""
+        fp = writer.open()
+        try:
+            fp.write(ProgressStream(stream, progress) if progress else stream)
         except FailedExportJobError as e:
             current_app.logger.exception(e.message)
         finally:
             fp.close()
+        return stream
+
+    def run(self, progress_updater=None):
+        """Run export job.
+
+        :param progress_updater: Progress of the job to update (see
+            :py:class:`~zenodo.modules.exporter.progress.ExportProgress`).
+        :returns: Key of the written object.
+        """
+        self._write(self._writer, self.search, progress_updater)
+        return self._writer.info().get('key')
+
+    def run_checkpointed(self, checkpoint=None, save=None,
+                         progress_updater=None):
+        """Run export job in chunks, that can be resumed after a failure.
+
+        Every ``chunk_size`` records are written to a separate chunk object.
+        After each chunk is committed, the checkpoint (i.e. the sort key of its
+        last record, the written chunks and the rolling CRC32 of the output)
+        is passed to ``save``. Once all records are exported, the chunks are
+        concatenated into the final object.
+
+        The records of each chunk are streamed from the sorted search results,
+        so that only one page of results is held in memory.
+
+        :param checkpoint: Checkpoint of a previous run to resume from.
+        :param save: Function called with the checkpoint after each chunk.
+        :param progress_updater: Progress of the job to update.
+        :returns: Key of the written object.
+        :raises FailedExportJobError: If some records failed to serialize,
+            after the object with all other records is written.
+        """
+        checkpoint = checkpoint or dict(
+            key=self._writer.filename(), after=None, chunks=[], records=0,
+            failed=[], crc32=0)
+        progress = progress_updater
+        if progress is not None:
+            progress.total = self.search.count()
+            progress.records = checkpoint['records']
+            progress.failed = len(checkpoint['failed'])
+        hits = self.iter_sorted_hits(after=checkpoint['after'])
+        for chunk_hits in iter_chunks(hits, self.chunk_size):
+            key = chunk_filename(checkpoint['key'], len(checkpoint['chunks']))
+            writer = self._writer.part(key)
+            search = HitsSearch(chunk_hits)
+            results = self._results(search, progress)
+            # Failed records are reported once the whole export is finished
+            results.raise_failed = False
+            stream = ChecksumStream(results, crc32=checkpoint['crc32'])
+            self._write_stream(writer, stream, progress)
+            checkpoint = dict(
+                checkpoint,
+                after=list(search.last.meta.sort),
+                chunks=checkpoint['chunks'] + [writer.info()],
+                records=checkpoint['records'] + results.count,
+                failed=checkpoint['failed'] + results.failed_record_ids,
+                crc32=stream.crc32,
+            )
+            if save:
+                save(checkpoint)
+
+        writer = self._writer.part(checkpoint['key'])
+        if not checkpoint['chunks']:
+            # No records, write the (valid) empty output of the result stream
+            self._write_stream(writer, self._results(HitsSearch([])))
+            return checkpoint['key']
+        stream = ChecksumStream(IterableStream(
+            data for c in checkpoint['chunks']
+            for data in self._read_chunks(c['key'])))
+        self._write_stream(writer, stream)
+        if stream.crc32 != checkpoint['crc32']:
+            raise ExportChecksumError(checkpoint['key'])
+        for c in checkpoint['chunks']:
+            self._writer.delete(c['key'])
+        if checkpoint['failed']:
+            raise FailedExportJobError(record_ids=checkpoint['failed'])
+        return checkpoint['key']
+
+    def _read_chunks(self, key, chunk_size=1024 * 1024):
+        """Iterate over the raw data of an exported object."""
+        with open_object(self._writer.bucket_id, key) as fp:
+            for chunk in iter(lambda: fp.read(chunk_size), b''):
+                yield chunk
+
+    def run_delta(self, since, until, progress_updater=None):
+        """Run the export job only for records changed in a time range.
+
+        Records created or modified in the time range are exported to a delta
+        object, while the PIDs of records deleted in the same range are
+        written to a tombstones JSON object.
+
+        :param since: Exclusive lower bound of the time range.
+        :param until: Inclusive upper bound of the time range.
+        :param progress_updater: Progress of the job to update.
+        :returns: Key of the delta object.
+        """
+        key = delta_filename(self._writer.filename())
+        self._write(self._writer.part(key), self.delta_search(since, until),
+                    progress_updater)
+        self.write_json(tombstones_filename(key), dict(
+            since=since.isoformat(),
+            until=until.isoformat(),
+            deleted=self.deleted_pids(since, until),
+        ))
+        return key
+
+    def compact(self, chain):
+        """Replay a full export and a chain of delta exports.
+
+        The result is written to a new full export, identical to the one that
+        would have been produced at the time of the last delta export (up to
+        the order of the records). Only exports with one record per line
+        (see :py:data:`~zenodo.modules.exporter.streams.LINE_FORMATS`) can be
+        compacted.
+
+        :param chain: Keys of the full export followed by the delta exports,
+            in the order they were produced.
+        :returns: Key of the new full export.
+        :raises ValueError: If the exports are not in a line-based format.
+        """
+        if format_for_key(chain[0]) not in LINE_FORMATS:
+            raise ValueError(
+                'Only line-based exports can be compacted: {0}'.format(
+                    chain[0]))
+        updates, deleted = OrderedDict(), set()
+        for key in chain[1:]:
+            tombstones = self.read_json(tombstones_filename(key))
+            for pid_value in tombstones['deleted']:
+                updates.pop(pid_value, None)
+                deleted.add(pid_value)
+            for line in self._read_lines(key):
+                pid_value = _pid_value(line)
+                updates[pid_value] = line
+                deleted.discard(pid_value)
+
+        def snapshot():
+            for line in self._read_lines(chain[0]):
+                pid_value = _pid_value(line)
+                if pid_value not in deleted:
+                    yield updates.pop(pid_value, line)
+            for line in itervalues(updates):
+                yield line
+
+        writer = self._writer.part(self._writer.filename()).open()
+        try:
+            codec = codec_for_key(chain[0])
+            writer.write(IterableStream(
+                compress_chunks(snapshot(), codec) if codec else snapshot()))
+        finally:
+            writer.close()
+        return writer.info().get('key')
+
+    def run_slice(self, slice_id, key, progress_updater=None):
+        """Run the export job for a single slice of the search.
+
+        The serialized records of the slice are written to a separate part
+        object with the given key.
+
+        :param slice_id: Index of the slice in ``range(self.slices)``.
+        :param key: Key of the part object.
+        :param progress_updater: Progress of the slice to update.
+        :returns: Dictionary describing the written part.
+        """
+        if progress_updater is not None:
+            # Slices have approximately the same number of records
+            progress_updater.total = self.search.count() // self.slices
+        writer = self._writer.part(key)
+        stream = self._write(
+            writer, self.sliced_search(slice_id, self.slices),
+            progress_updater)
+        return dict(
+            slice=slice_id,
+            records=stream.count,
+            failed=len(stream.failed_record_ids),
+            **writer.info()
+        )
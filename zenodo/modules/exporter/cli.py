@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Zenodo.
+# Copyright (C) 2018 CERN.
+#
+# Zenodo is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Zenodo is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Zenodo; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""CLI for export jobs."""
+
+from __future__ import absolute_import, print_function
+
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from .progress import get_progress
+from .streams import LINE_FORMATS, format_for_key
+from .tasks import compact_job, export_job
+from .utils import get_bookmark, get_checkpoint
+
+
+@click.group()
+def exporter():
+    """Zenodo exporter CLI."""
+
+
+@exporter.command('run')
+@click.argument('job_id', type=str)
+@click.option('--delta', '-d', is_flag=True,
+              help='Export only the records changed since the last export.')
+@click.option('--eager', '-e', is_flag=True)
+@with_appcontext
+def run(job_id, delta, eager):
+    """Run an export job."""
+    if eager:
+        export_job.apply(kwargs=dict(job_id=job_id, delta=delta), throw=True)
+    else:
+        export_job.delay(job_id=job_id, delta=delta)
+        click.secho('Export job task sent...', fg='yellow')
+
+
+@exporter.command('compact')
+@click.argument('job_id', type=str)
+@click.option('--eager', '-e', is_flag=True)
+@with_appcontext
+def compact(job_id, eager):
+    """Compact the full export and the following delta exports of a job."""
+    bookmark = get_bookmark(job_id)
+    if not bookmark or len(bookmark['chain']) < 2:
+        click.secho('No delta exports to compact.', fg='yellow')
+        return
+    if format_for_key(bookmark['chain'][0]) not in LINE_FORMATS:
+        click.secho('Only line-based exports can be compacted.', fg='red')
+        return
+    click.echo('Compacting:')
+    for key in bookmark['chain']:
+        click.echo('  {0}'.format(key))
+    if eager:
+        compact_job.apply(kwargs=dict(job_id=job_id), throw=True)
+        click.secho('Compacted to: {0}'.format(
+            get_bookmark(job_id)['chain'][0]), fg='green')
+    else:
+        compact_job.delay(job_id=job_id)
+        click.secho('Compaction task sent...', fg='yellow')
+
+
+def _echo_progress(progress):
+    """Print the progress of an export job (or part)."""
+    if progress['finished']:
+        state = click.style('finished', fg='green')
+    else:
+        state = click.style('running', fg='yellow')
+    click.echo(u'  state: {0}'.format(state))
+    click.echo(u'  started: {0}Z'.format(
+        datetime.utcfromtimestamp(progress['started']).isoformat()))
+    click.echo(u'  records: {0} / {1} ({2} failed)'.format(
+        progress['records'], progress['total'], progress['failed']))
+    click.echo(u'  throughput: {0:.1f} records/s'.format(
+        progress['records_per_second']))
+    click.echo(u'  bytes: {0} uncompressed, {1} compressed'.format(
+        progress['uncompressed_bytes'], progress['compressed_bytes']))
+    if progress['eta'] is not None:
+        click.echo(u'  ETA: {0}'.format(
+            timedelta(seconds=int(progress['eta']))))
+    click.echo(u'  timings: {0}'.format(', '.join(
+        u'{0}={1:.1f}s'.format(stage, elapsed)
+        for stage, elapsed in sorted(progress['timings'].items()))))
+
+
+@exporter.command('status')
+@click.argument('job_id', type=str)
+@with_appcontext
+def status(job_id):
+    """Show the progress of the last run of an export job."""
+    job = current_app.extensions['invenio-exporter'].job(job_id)
+    if job is None:
+        raise click.BadParameter('Unknown job: {0}'.format(job_id))
+    progress = get_progress(job_id)
+    if progress:
+        click.echo(u'Job "{0}":'.format(job_id))
+        _echo_progress(progress)
+    for part in range(job.get('slices') or 1):
+        part_progress = get_progress(job_id, part)
+        if part_progress:
+            click.echo(u'Slice {0}:'.format(part))
+            _echo_progress(part_progress)
+    checkpoint = get_checkpoint(job_id)
+    if checkpoint:
+        click.echo(u'Checkpoint: {0} chunks, {1} records'.format(
+            len(checkpoint['chunks']), checkpoint['records']))
+    if not progress and not checkpoint:
+        click.secho('No progress information.', fg='yellow')
@@ -26,10 +26,15 @@
 
 from __future__ import absolute_import, print_function
 
+from functools import partial
+
 from zenodo.modules.records.fetchers import zenodo_record_fetcher
 from zenodo.modules.records.serializers import json_v1
+from zenodo.modules.records.serializers.cache import CachedExportSerializer
 
-from .streams import BZip2ResultStream
+from .formats import ColumnarResultStream, FlatRecordSerializer, \
+    NDJSONSerializer
+from .streams import CompressedResultStream
 from .writers import BucketWriter, filename_factory
 
 EXPORTER_BUCKET_UUID = '00000000-0000-0000-0000-000000000001'
@@ -37,14 +42,58 @@ EXPORTER_BUCKET_UUID = '00000000-0000-0000-0000-000000000001'
 EXPORTER_JOBS = {
     'records': {
         'index': 'records',
-        'serializer': json_v1,
+        'serializer': CachedExportSerializer(json_v1, 'json_v1'),
         'writer': BucketWriter(
             bucket_id=EXPORTER_BUCKET_UUID,
             key=filename_factory(name='records', format='json.bz2'),
         ),
-        'resultstream_cls': BZip2ResultStream,
+        # Multi-stream bzip2 output, compressed in parallel blocks.
+        'resultstream_cls': partial(CompressedResultStream, codec='bzip2'),
+        'pid_fetcher': zenodo_record_fetcher,
+        'query': "+_exists_:recid +_missing_:removal_reason",
+        # Number of sliced scrolls exported in parallel to part objects.
+        'slices': 1,
+        # Checkpoint the export every 100k records, to be able to resume it.
+        'chunk_size': 100000,
+        'sort': ('recid', ),
+    },
+    'records-ndjson': {
+        'index': 'records',
+        'serializer': CachedExportSerializer(
+            NDJSONSerializer(json_v1), 'ndjson_flat'),
+        'writer': BucketWriter(
+            bucket_id=EXPORTER_BUCKET_UUID,
+            key=filename_factory(name='records-flat', format='ndjson.gz'),
+        ),
+        'resultstream_cls': partial(CompressedResultStream, codec='gzip'),
         'pid_fetcher': zenodo_record_fetcher,
-        'query': "+_exists_:recid +_missing_:removal_reason"
-    }
+        'query': "+_exists_:recid +_missing_:removal_reason",
+    },
+    'records-parquet': {
+        'index': 'records',
+        'serializer': FlatRecordSerializer(json_v1),
+        'writer': BucketWriter(
+            bucket_id=EXPORTER_BUCKET_UUID,
+            key=filename_factory(name='records-flat', format='parquet'),
+        ),
+        # Requires the "columnar" extra (i.e. pyarrow)
+        'resultstream_cls': partial(
+            ColumnarResultStream, format='parquet', row_group_size=50000),
+        'pid_fetcher': zenodo_record_fetcher,
+        'query': "+_exists_:recid +_missing_:removal_reason",
+    },
 }
 """Export jobs definitions."""
+
+EXPORTER_DELTA_MARGIN = 300
+"""Seconds subtracted from the end of the time range of each export.
+
+Records indexed shortly before an export starts might not be searchable yet,
+so they are exported (again) by the next delta export.
+"""
+
+EXPORTER_PROGRESS_INTERVAL = 10
+"""Interval in seconds between saving the progress of running export jobs."""
+
+EXPORTER_PROGRESS_STATSD = False
+"""Push the progress of export jobs as StatsD gauges (see ``STATSD_HOST``)."""
@@ -33,3 +33,12 @@ class FailedExportJobError(Exception):
         msg = "Serialization failed for the following records: {}"\
             .format(', '.join(record_ids))
         super(FailedExportJobError, self).__init__(msg)
+
+
+class ExportChecksumError(Exception):
+    """Error for an exported object not matching its chunks' checksum."""
+
+    def __init__(self, key=None):
+        """Initialize the error with the key of the exported object."""
+        msg = "Checksum mismatch for exported object: {}".format(key)
+        super(ExportChecksumError, self).__init__(msg)
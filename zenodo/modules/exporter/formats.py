@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Zenodo.
+# Copyright (C) 2018 CERN.
+#
+# Zenodo is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Zenodo is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Zenodo; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Flat record formats for analytics exports."""
+
+from __future__ import absolute_import, print_function
+
+import json
+from time import time
+
+from dateutil import tz
+from dateutil.parser import parse as dateutil_parse
+
+from .streams import ResultStream
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+RECORD_COLUMNS = [
+    ('recid', 'int64'),
+    ('conceptrecid', 'string'),
+    ('doi', 'string'),
+    ('conceptdoi', 'string'),
+    ('title', 'string'),
+    ('resource_type', 'string'),
+    ('resource_subtype', 'string'),
+    ('access_right', 'string'),
+    ('license', 'string'),
+    ('communities', 'list<string>'),
+    ('publication_date', 'date'),
+    ('created', 'timestamp'),
+    ('updated', 'timestamp'),
+    ('files_count', 'int64'),
+    ('files_size', 'int64'),
+    ('file_sizes', 'list<int64>'),
+]
+"""Columns (and their types) of a flattened record."""
+
+
+def flatten_record(data):
+    """Flatten a record serialized with ``RecordSchemaV1``.
+
+    Only the stable fields listed in :py:data:`RECORD_COLUMNS` are kept.
+    Dates are kept as ISO formatted strings.
+    """
+    metadata = data.get('metadata', {})
+    resource_type = metadata.get('resource_type') or {}
+    files = data.get('files') or []
+    file_sizes = [f.get('size') or 0 for f in files]
+    return dict(
+        recid=data.get('id'),
+        conceptrecid=data.get('conceptrecid'),
+        doi=data.get('doi'),
+        conceptdoi=data.get('conceptdoi'),
+        title=metadata.get('title'),
+        resource_type=resource_type.get('type'),
+        resource_subtype=resource_type.get('subtype'),
+        access_right=metadata.get('access_right'),
+        license=(metadata.get('license') or {}).get('id'),
+        communities=[c['id'] for c in metadata.get('communities') or []],
+        publication_date=metadata.get('publication_date'),
+        created=data.get('created'),
+        updated=data.get('updated'),
+        files_count=len(files),
+        files_size=sum(file_sizes),
+        file_sizes=file_sizes,
+    )
+
+
+class FlatRecordSerializer(object):
+    """Export serializer of flattened records (as dictionaries).
+
+    :param serializer: Record serializer with ``transform_search_hit()``
+        (e.g. ``json_v1``).
+    """
+
+    def __init__(self, serializer):
+        """Initialize serializer."""
+        self.serializer = serializer
+
+    def serialize_exporter(self, pid, record):
+        """Serialize a single record for the exporter."""
+        return flatten_record(
+            self.serializer.transform_search_hit(pid, record))
+
+
+class NDJSONSerializer(FlatRecordSerializer):
+    """Export serializer of flattened records as newline-delimited JSON."""
+
+    def serialize_exporter(self, pid, record):
+        """Serialize a single record for the exporter."""
+        return json.dumps(
+            super(NDJSONSerializer, self).serialize_exporter(pid, record),
+            sort_keys=True,
+        ).encode('utf8') + b'\n'
+
+
+def _date(value):
+    """Convert an ISO formatted date."""
+    return dateutil_parse(value).date() if value else None
+
+
+def _timestamp(value):
+    """Convert an ISO formatted timestamp to a naive UTC datetime."""
+    if not value:
+        return None
+    value = dateutil_parse(value)
+    if value.tzinfo:
+        value = value.astimezone(tz.tzutc()).replace(tzinfo=None)
+    return value
+
+
+CONVERTERS = {
+    'date': _date,
+    'timestamp': _timestamp,
+}
+"""Converters of JSON values to the column types."""
+
+
+def arrow_schema(columns=None):
+    """Get the Arrow schema for flattened records."""
+    types = {
+        'int64': pyarrow.int64(),
+        'string': pyarrow.string(),
+        'date': pyarrow.date32(),
+        'timestamp': pyarrow.timestamp('us'),
+        'list<string>': pyarrow.list_(pyarrow.string()),
+        'list<int64>': pyarrow.list_(pyarrow.int64()),
+    }
+    return pyarrow.schema([
+        (name, types[type_]) for name, type_ in columns or RECORD_COLUMNS])
+
+
+class _BufferSink(object):
+    """Write-only file-like object, which buffers data until popped."""
+
+    closed = False
+
+    def __init__(self):
+        """Initialize sink."""
+        self._chunks = []
+        self._pos = 0
+
+    def write(self, data):
+        """Buffer data."""
+        data = bytes(data)
+        self._chunks.append(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self):
+        """Get the number of bytes written."""
+        return self._pos
+
+    def flush(self):
+        """Do nothing."""
+
+    def close(self):
+        """Mark sink as closed."""
+        self.closed = True
+
+    def pop(self):
+        """Get and clear the buffered data."""
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class ColumnarResultStream(ResultStream):
+    """Stream of flattened records in a columnar format for a search.
+
+    Works like :py:data:`ResultStream`, but requires a serializer that
+    returns flattened records (see :py:class:`FlatRecordSerializer`). Every
+    ``row_group_size`` records are converted to typed columns and written as
+    one Parquet row group (or Arrow IPC record batch).
+
+    :param format: Either ``parquet`` or ``arrow``.
+    :param row_group_size: Number of records per row group.
+    :param compression: Parquet compression codec.
+    """
+
+    def __init__(self, search, pid_fetcher, serializer, format='parquet',
+                 row_group_size=10000, compression='snappy', columns=None):
+        """Initialize result stream."""
+        if pyarrow is None:
+            raise RuntimeError('Columnar exports require the pyarrow package.')
+        if format not in ('parquet', 'arrow'):
+            raise ValueError('Unknown columnar format: {}'.format(format))
+        super(ColumnarResultStream, self).__init__(
+            search, pid_fetcher, serializer)
+        self.format = format
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self.columns = columns or RECORD_COLUMNS
+        self.schema = arrow_schema(self.columns)
+        self._sink = _BufferSink()
+        self._writer = None
+
+    def _open(self):
+        """Open the columnar writer."""
+        if self.format == 'parquet':
+            return pyarrow.parquet.ParquetWriter(
+                self._sink, self.schema, compression=self.compression)
+        return pyarrow.RecordBatchFileWriter(self._sink, self.schema)
+
+    def _table(self, rows):
+        """Convert flattened records to a table."""
+        data = {}
+        for name, type_ in self.columns:
+            convert = CONVERTERS.get(type_)
+            values = [row.get(name) for row in rows]
+            data[name] = [convert(v) for v in values] if convert else values
+        return pyarrow.Table.from_pydict(data, schema=self.schema)
+
+    def _read_rows(self):
+        """Read the flattened records of the next row group."""
+        rows = []
+        while len(rows) < self.row_group_size:
+            try:
+                row = super(ColumnarResultStream, self).__next__()
+            except StopIteration:
+                break
+            # Failed records are serialized to an empty string
+            if row:
+                rows.append(row)
+        return rows
+
+    def __next__(self):
+        """Fetch next row group of records."""
+        if self._writer is None:
+            self._writer = self._open()
+        while not self._sink.closed:
+            rows = self._read_rows()
+            if rows:
+                start = time()
+                self._writer.write_table(self._table(rows))
+                if self.progress:
+                    self.progress.add_time('compress', time() - start)
+            else:
+                # Once all records are written, write the footer.
+                self._writer.close()
+                self._sink.close()
+            data = self._sink.pop()
+            if data:
+                return data
+        raise StopIteration
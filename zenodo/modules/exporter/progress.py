@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Zenodo.
+# Copyright (C) 2018 CERN.
+#
+# Zenodo is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Zenodo is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Zenodo; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Progress and throughput instrumentation of export jobs."""
+
+from __future__ import absolute_import, print_function
+
+from time import time
+
+from flask import current_app
+from invenio_cache import current_cache
+from statsd import StatsClient
+
+STAGES = ('fetch', 'serialize', 'compress', 'write')
+"""Stages of an export job with separate timings."""
+
+
+def progress_key(job_id, part=None):
+    """Get the cache key of the progress of an export job (or part)."""
+    key = 'exporter:{0}:progress'.format(job_id)
+    return key if part is None else '{0}:{1}'.format(key, part)
+
+
+def get_progress(job_id, part=None):
+    """Get the last saved progress of an export job (or part)."""
+    return current_cache.get(progress_key(job_id, part))
+
+
+class ExportProgress(object):
+    """Progress of a running export job.
+
+    The progress is saved in the cache (and optionally pushed to StatsD) at
+    most every ``EXPORTER_PROGRESS_INTERVAL`` seconds.
+
+    :param job_id: Export job identifier.
+    :param part: Part (e.g. slice) of the export job.
+    :param total: Expected number of records.
+    """
+
+    def __init__(self, job_id, part=None, total=None):
+        """Initialize progress."""
+        self.job_id = job_id
+        self.part = part
+        self.total = total
+        self.started = time()
+        self.finished = None
+        self.records = 0
+        self.failed = 0
+        self.uncompressed_bytes = 0
+        self.compressed_bytes = 0
+        self.timings = dict((stage, 0.0) for stage in STAGES)
+        self._saved = 0
+
+    def add_time(self, stage, elapsed):
+        """Add time spent in a stage."""
+        self.timings[stage] += elapsed
+
+    def add_record(self, size):
+        """Count a serialized record of the given size."""
+        self.records += 1
+        self.uncompressed_bytes += size
+
+    def add_failed(self):
+        """Count a record which failed to serialize."""
+        self.failed += 1
+
+    def add_output(self, size):
+        """Count written (i.e. compressed) bytes."""
+        self.compressed_bytes += size
+        self.update()
+
+    def to_dict(self):
+        """Get the progress and throughput metrics."""
+        elapsed = (self.finished or time()) - self.started
+        rate = self.records / elapsed if elapsed else 0.0
+        eta = None
+        if self.total is not None and rate and not self.finished:
+            eta = max(self.total - self.records - self.failed, 0) / rate
+        return dict(
+            job_id=self.job_id,
+            part=self.part,
+            started=self.started,
+            finished=self.finished,
+            elapsed=elapsed,
+            total=self.total,
+            records=self.records,
+            failed=self.failed,
+            records_per_second=rate,
+            uncompressed_bytes=self.uncompressed_bytes,
+            compressed_bytes=self.compressed_bytes,
+            eta=eta,
+            timings=dict(self.timings),
+        )
+
+    def update(self, force=False):
+        """Save (and push) the progress if the update interval has passed."""
+        now = time()
+        interval = current_app.config['EXPORTER_PROGRESS_INTERVAL']
+        if force or now - self._saved >= interval:
+            self._saved = now
+            data = self.to_dict()
+            current_cache.set(
+                progress_key(self.job_id, self.part), data, timeout=-1)
+            if current_app.config['EXPORTER_PROGRESS_STATSD']:
+                self.push(data)
+
+    def push(self, data):
+        """Push the progress metrics as StatsD gauges."""
+        client = StatsClient(
+            host=current_app.config['STATSD_HOST'],
+            port=current_app.config['STATSD_PORT'],
+            prefix=current_app.config['STATSD_PREFIX'],
+        )
+        prefix = 'exporter.{0}'.format(self.job_id)
+        if self.part is not None:
+            prefix = '{0}.{1}'.format(prefix, self.part)
+        with client.pipeline() as pipe:
+            for metric in ('records', 'failed', 'records_per_second',
+                           'uncompressed_bytes', 'compressed_bytes'):
+                pipe.gauge('{0}.{1}'.format(prefix, metric), data[metric])
+            for stage, elapsed in data['timings'].items():
+                pipe.gauge('{0}.timings.{1}'.format(prefix, stage), elapsed)
+
+    def finish(self):
+        """Mark the export job as finished."""
+        self.finished = time()
+        self.update(force=True)
+
+
+class ProgressStream(object):
+    """Stream wrapper reporting written bytes and write time to a progress.
+
+    The time spent between two reads (i.e. by the writer) is accounted to
+    the ``write`` stage.
+    """
+
+    def __init__(self, stream, progress):
+        """Initialize stream."""
+        self.stream = stream
+        self.progress = progress
+        self._last_read = None
+
+    def read(self, *args):
+        """Read from the wrapped stream."""
+        if self._last_read is not None:
+            self.progress.add_time('write', time() - self._last_read)
+        data = self.stream.read(*args)
+        self.progress.add_output(len(data))
+        self._last_read = time()
+        return data
@@ -27,9 +27,28 @@
 from __future__ import absolute_import, print_function
 
 import bz2
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import chain, islice
+from multiprocessing import cpu_count
+from time import time
 
 from .errors import FailedExportJobError
 
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 
 class ResultStream(object):
     """Stream of serialized records for a search.
@@ -47,6 +66,12 @@ class ResultStream(object):
         must have implement the API ``serialize_exporter(pid, record)``).
     """
 
+    raise_failed = True
+    """Raise :py:class:`FailedExportJobError` once all records are read."""
+
+    progress = None
+    """Progress of the export job (see :py:class:`ExportProgress`)."""
+
     def __init__(self, search, pid_fetcher, serializer):
         """Initialize result stream."""
         self.pid_fetcher = pid_fetcher
@@ -54,6 +79,7 @@ class ResultStream(object):
         self.serializer = serializer
         self._iter = None
         self.failed_record_ids = []
+        self.count = 0
 
     def __next__(self):
         """Fetch next serialized record."""
@@ -62,17 +88,29 @@ class ResultStream(object):
         if self._iter is None:
             self._iter = self.search.scan()
         # Fetch next hit.
+        start = time()
         hit = next(self._iter)
+        fetched = time()
         # Serialize and return hit.
         result = ''
         try:
             result = self.serializer.serialize_exporter(
                 self.pid_fetcher(hit.meta.id, hit),
-                dict(_source=hit._d_, _version=0),
+                dict(_id=hit.meta.id, _source=hit._d_,
+                     _version=getattr(hit.meta, 'version', 0)),
             )
+            self.count += 1
         except Exception as e:
             self.failed_record_ids.append(hit.meta.id)
 
+        if self.progress:
+            self.progress.add_time('fetch', fetched - start)
+            self.progress.add_time('serialize', time() - fetched)
+            if result:
+                self.progress.add_record(
+                    len(result) if isinstance(result, bytes) else 0)
+            else:
+                self.progress.add_failed()
         return result
 
     def __iter__(self):
@@ -92,7 +130,7 @@ class ResultStream(object):
         try:
             return next(self)
         except StopIteration:
-            if self.failed_record_ids:
+            if self.failed_record_ids and self.raise_failed:
                 # raise an exception with the list of not serialized records
                 raise FailedExportJobError(record_ids=self.failed_record_ids)
             return b''
@@ -115,9 +153,11 @@ class BZip2ResultStream(ResultStream):
         try:
             data = None
             while not data:
-                data = self.compressor.compress(
-                    super(BZip2ResultStream, self).__next__()
-                )
+                record = super(BZip2ResultStream, self).__next__()
+                start = time()
+                data = self.compressor.compress(record)
+                if self.progress:
+                    self.progress.add_time('compress', time() - start)
             return data
         except StopIteration:
             # Once we have read all records, make sure we flush the data left
@@ -126,3 +166,281 @@ class BZip2ResultStream(ResultStream):
                 return self.compressor.flush()
             except ValueError:
                 raise StopIteration
+
+
+def _gzip_compress(data, level):
+    """Compress data into a single gzip member."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _bzip2_compress(data, level):
+    """Compress data into a single bzip2 stream."""
+    return bz2.compress(data, level)
+
+
+def _xz_compress(data, level):
+    """Compress data into a single xz stream."""
+    return lzma.compress(data, format=lzma.FORMAT_XZ, preset=level)
+
+
+def _zstd_compress(data, level):
+    """Compress data into a single zstd frame."""
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+
+CODECS = {
+    'gzip': (_gzip_compress, 6),
+    'bzip2': (_bzip2_compress, 9),
+    'xz': (_xz_compress, 6),
+    'zstd': (_zstd_compress, 3),
+}
+"""Available compression codecs and their default compression level."""
+
+
+def _compress(codec, level, data):
+    """Compress a block of data (picklable entry point for process pools)."""
+    return CODECS[codec][0](data, level)
+
+
+def _timed_compress(codec, level, data):
+    """Compress a block of data and measure the time spent."""
+    start = time()
+    data = _compress(codec, level, data)
+    return time() - start, data
+
+
+DECOMPRESSORS = {
+    'gzip': lambda: zlib.decompressobj(16 + zlib.MAX_WBITS),
+    'bzip2': bz2.BZ2Decompressor,
+    'xz': lambda: lzma.LZMADecompressor(format=lzma.FORMAT_XZ),
+    'zstd': lambda: zstandard.ZstdDecompressor().decompressobj(),
+}
+"""Factories of decompressor objects for each codec."""
+
+EXTENSIONS = {
+    'gz': 'gzip',
+    'bz2': 'bzip2',
+    'xz': 'xz',
+    'zst': 'zstd',
+}
+"""Mapping of file extensions to codecs."""
+
+
+def codec_for_key(key):
+    """Get the compression codec of an exported object from its key."""
+    return EXTENSIONS.get(key.rsplit('.', 1)[-1])
+
+
+LINE_FORMATS = ('json', 'ndjson')
+"""Formats of exported objects with one serialized record per line."""
+
+
+def format_for_key(key):
+    """Get the format of an exported object from its key."""
+    if codec_for_key(key):
+        key = key.rsplit('.', 1)[0]
+    return key.rsplit('.', 1)[-1]
+
+
+def iter_decompressed(fp, codec, chunk_size=1024 * 1024):
+    """Iterate over the decompressed data of a file.
+
+    Handles concatenated gzip members, bzip2/xz streams and zstd frames, as
+    written by :py:class:`CompressedResultStream`.
+    """
+    if codec is None:
+        for chunk in iter(lambda: fp.read(chunk_size), b''):
+            yield chunk
+        return
+    decompressor = DECOMPRESSORS[codec]()
+    data = fp.read(chunk_size)
+    while data:
+        try:
+            out = decompressor.decompress(data)
+        except EOFError:
+            # Previous member ended exactly at the end of the last chunk
+            decompressor = DECOMPRESSORS[codec]()
+            continue
+        if out:
+            yield out
+        unused = getattr(decompressor, 'unused_data', b'')
+        if unused:
+            # Start of the next member
+            decompressor = DECOMPRESSORS[codec]()
+            data = unused
+        else:
+            data = fp.read(chunk_size)
+
+
+def iter_lines(chunks):
+    """Split an iterable of data chunks into lines (ending with newline)."""
+    rest = b''
+    for chunk in chunks:
+        lines = (rest + chunk).split(b'\n')
+        rest = lines.pop()
+        for line in lines:
+            yield line + b'\n'
+    if rest:
+        yield rest
+
+
+def compress_chunks(chunks, codec, level=None, block_size=900 * 1024):
+    """Compress an iterable of data chunks into independent blocks."""
+    level = CODECS[codec][1] if level is None else level
+    block, size = [], 0
+    for chunk in chunks:
+        block.append(chunk)
+        size += len(chunk)
+        if size >= block_size:
+            yield _compress(codec, level, b''.join(block))
+            block, size = [], 0
+    yield _compress(codec, level, b''.join(block))
+
+
+def iter_chunks(iterable, size):
+    """Split an iterable into consecutive iterators of up to ``size`` items.
+
+    The items are not collected in memory, so each chunk has to be consumed
+    before moving on to the next one.
+    """
+    iterator = iter(iterable)
+    for first in iterator:
+        yield chain([first], islice(iterator, size - 1))
+
+
+class HitsSearch(object):
+    """Search-like object (i.e. with ``scan()``) over an iterable of hits.
+
+    The last iterated hit is kept in ``last``.
+    """
+
+    def __init__(self, hits):
+        """Initialize search."""
+        self.hits = hits
+        self.last = None
+
+    def scan(self):
+        """Iterate over the hits."""
+        for hit in self.hits:
+            self.last = hit
+            yield hit
+
+
+class ChecksumStream(object):
+    """Stream wrapper computing the rolling CRC32 checksum of the data read.
+
+    :param stream: Stream to read from.
+    :param crc32: Initial checksum value, e.g. the checksum of previously
+        written data that this stream continues.
+    """
+
+    def __init__(self, stream, crc32=0):
+        """Initialize stream."""
+        self.stream = stream
+        self.crc32 = crc32
+
+    def read(self, *args):
+        """Read from the wrapped stream and update the checksum."""
+        data = self.stream.read(*args)
+        self.crc32 = zlib.crc32(data, self.crc32) & 0xffffffff
+        return data
+
+
+class IterableStream(object):
+    """Stream API (i.e. ``read()``) over an iterable of data chunks."""
+
+    def __init__(self, iterable):
+        """Initialize stream."""
+        self._iter = iter(iterable)
+
+    def read(self, *args):
+        """Read next chunk of data."""
+        return next(self._iter, b'')
+
+
+class CompressedResultStream(ResultStream):
+    """Block-parallel compressed stream of serialized records for a search.
+
+    Works like :py:data:`ResultStream`, except that serialized records are
+    grouped in blocks of ``block_size`` bytes which are compressed
+    independently on a pool of workers. Each block is a complete gzip member,
+    bzip2/xz stream or zstd frame, so that the concatenated output can be
+    read by the standard tools (i.e. like ``pigz`` and ``pbzip2`` output).
+
+    :param codec: One of ``gzip``, ``bzip2``, ``xz`` and ``zstd``.
+    :param level: Compression level (defaults to the codec's default).
+    :param block_size: Uncompressed size of a block in bytes.
+    :param workers: Number of compression workers (defaults to the number of
+        CPUs).
+    :param executor: Either ``thread`` or ``process``. The standard library
+        compressors release the GIL, so threads are usually enough.
+    """
+
+    executors = {
+        'thread': ThreadPoolExecutor,
+        'process': ProcessPoolExecutor,
+    }
+
+    def __init__(self, search, pid_fetcher, serializer, codec='bzip2',
+                 level=None, block_size=900 * 1024, workers=None,
+                 executor='thread'):
+        """Initialize result stream."""
+        super(CompressedResultStream, self).__init__(
+            search, pid_fetcher, serializer)
+        if codec not in CODECS:
+            raise ValueError('Unknown compression codec: {}'.format(codec))
+        if codec == 'xz' and lzma is None:
+            raise RuntimeError('The "xz" codec requires the lzma module.')
+        if codec == 'zstd' and zstandard is None:
+            raise RuntimeError(
+                'The "zstd" codec requires the zstandard package.')
+        self.codec = codec
+        self.level = CODECS[codec][1] if level is None else level
+        self.block_size = block_size
+        self.workers = workers or cpu_count()
+        self.executor_cls = self.executors[executor]
+        self._executor = None
+        self._pending = deque()
+        self._exhausted = False
+        self._blocks = 0
+
+    def _read_block(self):
+        """Read serialized records until a block is filled."""
+        chunks, size = [], 0
+        while size < self.block_size:
+            try:
+                data = super(CompressedResultStream, self).__next__()
+            except StopIteration:
+                self._exhausted = True
+                break
+            chunks.append(data)
+            size += len(data)
+        return b''.join(chunks)
+
+    def _submit(self, block):
+        """Submit a block for compression."""
+        self._pending.append(self._executor.submit(
+            _timed_compress, self.codec, self.level, block))
+        self._blocks += 1
+
+    def __next__(self):
+        """Fetch next compressed block of records."""
+        if self._executor is None:
+            self._executor = self.executor_cls(max_workers=self.workers)
+        # Keep the workers busy, while bounding the number of blocks in memory
+        while not self._exhausted and len(self._pending) < 2 * self.workers:
+            block = self._read_block()
+            if block:
+                self._submit(block)
+        # Always output a valid (empty) compressed file
+        if self._exhausted and self._blocks == 0:
+            self._submit(b'')
+        if not self._pending:
+            self._executor.shutdown()
+            raise StopIteration
+        elapsed, data = self._pending.popleft().result()
+        if self.progress:
+            # Total time spent by the compression workers
+            self.progress.add_time('compress', elapsed)
+        return data
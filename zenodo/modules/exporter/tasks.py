@@ -26,14 +26,121 @@
 
 from __future__ import absolute_import, print_function
 
-from celery import shared_task
+from datetime import datetime, timedelta
+
+from celery import chord, shared_task
+from dateutil.parser import parse as dateutil_parse
 from flask import current_app
 
 from .api import Exporter
+from .errors import FailedExportJobError
+from .progress import ExportProgress
+from .utils import clear_checkpoint, get_bookmark, get_checkpoint, \
+    set_bookmark, set_checkpoint
+from .writers import manifest_filename, part_filename
 
 
-@shared_task
-def export_job(job_id=None):
-    """Export job."""
+def _exporter(job_id):
+    """Get the exporter for an export job."""
     job_definition = current_app.extensions['invenio-exporter'].job(job_id)
-    Exporter(**job_definition).run()
+    return Exporter(**job_definition)
+
+
+@shared_task(max_retries=3, default_retry_delay=10 * 60)
+def export_job(job_id=None, delta=False, retry=False):
+    """Export job.
+
+    If the job defines more than one slice, the search is split in sliced
+    scrolls, each one exported to a part object by a separate subtask, and a
+    manifest object listing all parts is written once all of them finish.
+
+    If ``delta`` is set, only the records (re)indexed since the last export of
+    the job are exported. The first delta export of a job (i.e. when there
+    is no bookmark) is a full export.
+
+    If the job defines a ``chunk_size``, full exports are checkpointed after
+    every chunk and a failed (or retried) job resumes from the last chunk.
+    """
+    exporter = _exporter(job_id)
+    bookmark = get_bookmark(job_id) if delta else None
+    until = datetime.utcnow() - timedelta(
+        seconds=current_app.config['EXPORTER_DELTA_MARGIN'])
+    progress = ExportProgress(job_id)
+    if exporter.chunk_size and not bookmark:
+        checkpoint = get_checkpoint(job_id)
+        if checkpoint:
+            until = dateutil_parse(checkpoint['until'])
+
+        def save(data):
+            set_checkpoint(job_id, dict(data, until=until.isoformat()))
+
+        def finish(key):
+            clear_checkpoint(job_id)
+            set_bookmark(job_id, until, [key])
+            progress.finish()
+
+        try:
+            key = exporter.run_checkpointed(
+                checkpoint=checkpoint, save=save, progress_updater=progress)
+        except FailedExportJobError:
+            # The export is written, only without the failed records
+            finish(get_checkpoint(job_id)['key'])
+            raise
+        except Exception as exc:
+            if retry:
+                export_job.retry(exc=exc)
+            raise
+        finish(key)
+    elif bookmark:
+        key = exporter.run_delta(dateutil_parse(bookmark['updated']), until,
+                                 progress_updater=progress)
+        set_bookmark(job_id, until, bookmark['chain'] + [key])
+        progress.finish()
+    elif exporter.slices > 1 and not delta:
+        key = exporter.writer.filename()
+        chord(
+            export_job_slice.s(job_id, slice_id, part_filename(key, slice_id))
+            for slice_id in range(exporter.slices)
+        )(export_job_manifest.s(job_id, manifest_filename(key)))
+    else:
+        set_bookmark(
+            job_id, until, [exporter.run(progress_updater=progress)])
+        progress.finish()
+
+
+@shared_task
+def export_job_slice(job_id, slice_id, key):
+    """Export a single slice of an export job to a part object."""
+    progress = ExportProgress(job_id, part=slice_id)
+    part = _exporter(job_id).run_slice(
+        slice_id, key, progress_updater=progress)
+    progress.finish()
+    return part
+
+
+@shared_task
+def export_job_manifest(parts, job_id, key):
+    """Write the manifest of a parallel export job."""
+    parts = sorted(parts, key=lambda p: p['slice'])
+    manifest = dict(
+        job_id=job_id,
+        created=datetime.utcnow().isoformat(),
+        records=sum(p['records'] for p in parts),
+        failed=sum(p['failed'] for p in parts),
+        parts=parts,
+    )
+    _exporter(job_id).write_json(key, manifest)
+    return manifest
+
+
+@shared_task
+def compact_job(job_id=None):
+    """Compact the full export and delta exports of a job.
+
+    The resulting full export becomes the start of a new chain of delta
+    exports.
+    """
+    bookmark = get_bookmark(job_id)
+    if bookmark and len(bookmark['chain']) > 1:
+        key = _exporter(job_id).compact(bookmark['chain'])
+        set_bookmark(job_id, dateutil_parse(bookmark['updated']), [key])
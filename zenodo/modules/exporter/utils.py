@@ -25,12 +25,17 @@
 
 from __future__ import absolute_import, print_function
 
+import json
 from uuid import UUID
 
 from flask import current_app
+from invenio_cache import current_cache
 from invenio_db import db
 from invenio_files_rest.errors import FilesException
-from invenio_files_rest.models import Bucket, Location
+from invenio_files_rest.models import Bucket, Location, ObjectVersion
+from six import BytesIO
+
+from .writers import bookmark_filename
 
 
 def initialize_exporter_bucket():
@@ -51,3 +56,54 @@ def initialize_exporter_bucket():
                         default_storage_class=storage_class)
         db.session.add(bucket)
         db.session.commit()
+
+
+def open_object(bucket_id, key):
+    """Open the head version of an object for reading."""
+    return ObjectVersion.get(bucket_id, key).file.storage().open()
+
+
+def _job_bucket_id(job_id):
+    """Get the bucket where an export job writes to."""
+    job = current_app.extensions['invenio-exporter'].job(job_id)
+    return job['writer'].bucket_id
+
+
+def get_bookmark(job_id):
+    """Get the delta export bookmark of an export job.
+
+    The bookmark is a dictionary with the ``updated`` timestamp of the last
+    export and the ``chain`` of keys of the full export and all the delta
+    exports following it. It is stored next to the exports in the bucket.
+    """
+    bucket_id = _job_bucket_id(job_id)
+    key = bookmark_filename(job_id)
+    if ObjectVersion.get(bucket_id, key) is None:
+        return None
+    with open_object(bucket_id, key) as fp:
+        return json.loads(fp.read().decode('utf8'))
+
+
+def set_bookmark(job_id, updated, chain):
+    """Set the delta export bookmark of an export job."""
+    data = json.dumps(dict(updated=updated.isoformat(), chain=chain),
+                      indent=2).encode('utf8')
+    ObjectVersion.create(_job_bucket_id(job_id), bookmark_filename(job_id),
+                         stream=BytesIO(data))
+    db.session.commit()
+
+
+def get_checkpoint(job_id):
+    """Get the checkpoint of an interrupted export job."""
+    return current_cache.get('exporter:{0}:checkpoint'.format(job_id))
+
+
+def set_checkpoint(job_id, checkpoint):
+    """Set the checkpoint of a running export job."""
+    current_cache.set('exporter:{0}:checkpoint'.format(job_id), checkpoint,
+                      timeout=-1)
+
+
+def clear_checkpoint(job_id):
+    """Clear the checkpoint of a finished export job."""
+    current_cache.delete('exporter:{0}:checkpoint'.format(job_id))
@@ -43,13 +43,31 @@ class BucketWriter(object):
 
     def open(self):
         """Open the bucket for writing."""
-        self.obj = ObjectVersion.create(
-            self.bucket_id,
-            self.key() if callable(self.key) else self.key
-        )
+        self.obj = ObjectVersion.create(self.bucket_id, self.filename())
         db.session.commit()
         return self
 
+    def filename(self):
+        """Get the key of the object to write to."""
+        return self.key() if callable(self.key) else self.key
+
+    def part(self, key):
+        """Get a writer for a part object in the same bucket."""
+        return self.__class__(bucket_id=self.bucket_id, key=key)
+
+    def delete(self, key):
+        """Delete an object from the bucket."""
+        ObjectVersion.delete(self.bucket_id, key)
+        db.session.commit()
+
+    def info(self):
+        """Get key, size and checksum of the written object."""
+        return dict(
+            key=self.obj.key,
+            size=self.obj.file.size if self.obj.file else 0,
+            checksum=self.obj.file.checksum if self.obj.file else None,
+        )
+
     def write(self, stream):
         """Write the data stream to the object."""
         self.obj.set_contents(stream)
@@ -75,6 +93,20 @@ class NullWriter(object):
     def close(self):
         """Dummy close."""
 
+    def filename(self):
+        """Dummy filename."""
+
+    def part(self, key):
+        """Dummy part writer."""
+        return self
+
+    def delete(self, key):
+        """Dummy delete."""
+
+    def info(self):
+        """Dummy info."""
+        return {}
+
 
 def filename_factory(**kwargs):
     """Get a function which generates a filename with a timestamp."""
@@ -82,3 +114,43 @@ def filename_factory(**kwargs):
         timestamp=datetime.utcnow().replace(microsecond=0).isoformat(),
         **kwargs
     )
+
+
+def part_filename(key, part):
+    """Get the key of a part object of a parallel export.
+
+    The part number is inserted before the file extension, e.g.
+    ``records-<timestamp>.json.bz2`` becomes
+    ``records-<timestamp>-part0001.json.bz2``.
+    """
+    name, sep, ext = key.partition('.')
+    return '{name}-part{part:04d}{sep}{ext}'.format(
+        name=name, part=part, sep=sep, ext=ext)
+
+
+def chunk_filename(key, chunk):
+    """Get the key of a chunk object of a checkpointed export."""
+    name, sep, ext = key.partition('.')
+    return '{name}-chunk{chunk:05d}{sep}{ext}'.format(
+        name=name, chunk=chunk, sep=sep, ext=ext)
+
+
+def delta_filename(key):
+    """Get the key of a delta export."""
+    name, sep, ext = key.partition('.')
+    return '{name}-delta{sep}{ext}'.format(name=name, sep=sep, ext=ext)
+
+
+def tombstones_filename(key):
+    """Get the key of the tombstones object of a delta export."""
+    return '{0}-tombstones.json'.format(key.partition('.')[0])
+
+
+def bookmark_filename(job_id):
+    """Get the key of the delta export bookmark of an export job."""
+    return '{0}-bookmark.json'.format(job_id)
+
+
+def manifest_filename(key):
+    """Get the key of the manifest object of a parallel export."""
+    return '{0}-manifest.json'.format(key.partition('.')[0])
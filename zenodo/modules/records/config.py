@@ -36,6 +36,54 @@ ZENODO_RECORDS_UI_CITATIONS_ENDPOINT = 'https://zenodo-broker-qa.web.cern.ch/api
 
 ZENODO_RECORDS_UI_CITATIONS_ENABLE = False
 
+ZENODO_RECORDS_CITATIONS_MAX_STYLES = 20
+"""Maximum number of styles of a record's citations rendered together."""
+
+ZENODO_RECORDS_SCHEMAORG_PRECOMPUTE = False
+"""Store the schema.org JSON-LD of records in the index when indexing them.
+
+Landing pages and JSON-LD responses then read it from the index, instead of
+serializing the record.
+"""
+
+ZENODO_RECORDS_SERIALIZATION_CACHE_SHARED = False
+"""Share the cached serializations of records between processes.
+
+By default they are only kept in the size-bounded in-process cache of each
+worker. Export jobs always use the shared cache.
+"""
+
+ZENODO_RECORDS_SERIALIZATION_CACHE_REDIS_URL = 'redis://localhost:6379/3'
+"""Redis database of the shared cache of serialized records.
+
+It is kept apart from the application cache, and should be configured with
+a ``maxmemory`` limit and the ``allkeys-lru`` eviction policy.
+"""
+
+ZENODO_RECORDS_INDEXER_BATCH_SIZE = 500
+"""Number of queued records indexed (and prefetched) together."""
+
+ZENODO_RECORDS_INDEXER_LOCK_TIMEOUT = 60
+"""Seconds after which the lock of a document being written expires.
+
+Documents are locked while they are partially updated or bulk indexed.
+"""
+
+ZENODO_RECORDS_INDEXER_LANES = {
+    'interactive': 'indexer-interactive',
+    'bulk': 'indexer',
+}
+"""Queue names of the bulk indexing lanes, consumed separately."""
+
+ZENODO_RECORDS_INDEXER_DEFAULT_LANE = 'bulk'
+"""Lane used when queuing records for bulk indexing."""
+
+ZENODO_RECORDS_INDEXER_COALESCE_WINDOW = 600
+"""Seconds during which queuing again an already pending record is skipped.
+
+Set to ``0`` to disable coalescing.
+"""
+
 ZENODO_RELATION_RULES = {
     'f1000research': [{
         'prefix': '10.12688/f1000research',
@@ -0,0 +1,18 @@
+<?xml version="1.0" encoding="UTF-8"?>
+<!--
+  Transforms a container of DataCite resources with datacite-to-dcat-ap.xsl,
+  in a single pass. Each resource is copied to its own document, so that the
+  document-wide selections of the imported stylesheet only see that resource.
+-->
+<xsl:transform xmlns:xsl="http://www.w3.org/1999/XSL/Transform" xmlns:exsl="http://exslt.org/common" xmlns:locn="http://www.w3.org/ns/locn#" extension-element-prefixes="exsl" exclude-result-prefixes="locn" version="1.0">
+  <xsl:import href="datacite-to-dcat-ap.xsl"/>
+  <xsl:output method="xml" indent="yes" encoding="utf-8" cdata-section-elements="locn:geometry" />
+  <xsl:template match="/">
+    <records>
+      <xsl:for-each select="/*/*">
+        <xsl:variable name="resource"><xsl:copy-of select="."/></xsl:variable>
+        <record><xsl:apply-templates select="exsl:node-set($resource)/*"/></record>
+      </xsl:for-each>
+    </records>
+  </xsl:template>
+</xsl:transform>
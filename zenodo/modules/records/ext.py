@@ -28,8 +28,11 @@ from __future__ import absolute_import, print_function
 
 import collections
 
+from flask import current_app
+from flask_caching.backends import RedisCache
 from invenio_indexer.signals import before_record_index
 from invenio_pidrelations.contrib.versioning import versioning_blueprint
+from redis import StrictRedis
 from six import itervalues
 from werkzeug.utils import cached_property
 
@@ -73,6 +76,19 @@ class ZenodoRecords(object):
         resource_list.sort(key=lambda x: x['title'])
         return resource_list
 
+    @cached_property
+    def serialization_cache_redis(self):
+        """Dedicated Redis cache of serialized records."""
+        return RedisCache(host=StrictRedis.from_url(current_app.config[
+            'ZENODO_RECORDS_SERIALIZATION_CACHE_REDIS_URL']))
+
+    @property
+    def serialization_cache_backend(self):
+        """Shared cache of serialized records, if enabled."""
+        if not current_app.config['ZENODO_RECORDS_SERIALIZATION_CACHE_SHARED']:
+            return None
+        return self.serialization_cache_redis
+
     def init_app(self, app):
         """Flask application initialization."""
         self.init_config(app)
@@ -26,15 +26,476 @@
 
 from __future__ import absolute_import, print_function
 
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from functools import partial
+from threading import local
+from uuid import uuid4
+
+from celery import current_app as current_celery_app
+from elasticsearch.helpers import bulk
+from flask import current_app
+from invenio_cache import current_cache
+from invenio_db import db
+from invenio_indexer.api import RecordIndexer
 from invenio_pidrelations.contrib.versioning import PIDVersioning
 from invenio_pidrelations.proxies import current_pidrelations
 from invenio_pidrelations.serializers.utils import serialize_relations
 from invenio_pidstore.models import PersistentIdentifier
+from invenio_records.api import Record
+from invenio_search import current_search_client
+from invenio_search.utils import build_alias_name
+from kombu import Queue
+from kombu.compat import Consumer
+from sqlalchemy import event
 
+from zenodo.modules.records.serializers import schemaorg_jsonld_v1, \
+    serialization_cache
 from zenodo.modules.records.serializers.pidrelations import \
-    serialize_related_identifiers
-from zenodo.modules.records.utils import build_record_custom_fields
-from zenodo.modules.stats.utils import build_record_stats
+    build_records_relations, serialize_related_identifiers
+from zenodo.modules.records.utils import build_record_custom_fields, \
+    is_record
+from zenodo.modules.stats.utils import build_record_stats, \
+    build_records_stats, cache_records_stats, chunkify
+
+_batch = local()
+"""Data prefetched for the records of the current bulk indexing batch."""
+
+
+@contextmanager
+def indexing_batch(record_ids):
+    """Prefetch the data needed for indexing a batch of records.
+
+    The records, their relations and related identifiers (see
+    :py:func:`build_records_relations`) and their stats are resolved with a
+    few queries for the whole batch. While the context is active,
+    :py:func:`indexer_receiver` uses the prefetched data instead of querying
+    it record by record.
+    """
+    _batch.records = {}
+    _batch.relations = {}
+    _batch.stats = {}
+    try:
+        _batch.records = dict(
+            (str(r.id), r) for r in Record.get_records(record_ids))
+        records = [r for r in _batch.records.values()
+                   if r.get('recid') and is_record(r)]
+        _batch.relations = build_records_relations(records)
+        _batch.stats = build_records_stats(
+            (r['recid'], r.get('conceptrecid')) for r in records)
+        cache_records_stats(dict(
+            (str(r.id), _batch.stats[str(r['recid'])]) for r in records))
+    except Exception:
+        current_app.logger.warning(
+            'Failed to prefetch indexing batch.', exc_info=True)
+    try:
+        yield
+    finally:
+        del _batch.records, _batch.relations, _batch.stats
+
+
+def _get_batch_data(name, key):
+    """Get prefetched data of the current batch."""
+    return getattr(_batch, name, {}).get(str(key))
+
+
+def get_batch_record_stats(recid):
+    """Get the prefetched stats of a record, if it's part of the batch."""
+    return _get_batch_data('stats', recid)
+
+
+class ZenodoRecordIndexer(RecordIndexer):
+    """Record indexer with priority lanes and coalescing of queued records.
+
+    Each lane (see ``ZENODO_RECORDS_INDEXER_LANES``) has its own queue, which
+    is consumed separately. Queuing a record which is already pending in the
+    lane is skipped, and the bulk queue is processed in batches of prefetched
+    records.
+    """
+
+    def __init__(self, lane=None, **kwargs):
+        """Initialize indexer.
+
+        :param lane: Name of the lane to queue records to and consume from.
+            (Default: ``ZENODO_RECORDS_INDEXER_DEFAULT_LANE``)
+        """
+        super(ZenodoRecordIndexer, self).__init__(**kwargs)
+        self.lane = lane or \
+            current_app.config['ZENODO_RECORDS_INDEXER_DEFAULT_LANE']
+
+    @property
+    def mq_queue(self):
+        """Message Queue queue of the lane."""
+        if self._queue:
+            return self._queue
+        name = current_app.config['ZENODO_RECORDS_INDEXER_LANES'][self.lane]
+        return Queue(name, exchange=self.mq_exchange, routing_key=name)
+
+    @property
+    def mq_routing_key(self):
+        """Message Queue routing key of the lane."""
+        return self._routing_key or self.mq_queue.routing_key
+
+    def _pending_key(self, record_id):
+        """Cache key of the last operation queued for a pending record."""
+        return 'indexer:pending:{0}:{1}'.format(self.lane, record_id)
+
+    def queue_stats(self):
+        """Get the depth and lag of the lane's queue.
+
+        :returns: Dictionary with the number of queued messages (``depth``),
+            and for how long (in seconds) the last processed messages were
+            queued (``lag``) and when this was measured (``measured``).
+        """
+        with current_celery_app.pool.acquire(block=True) as conn:
+            queue = self.mq_queue(conn.default_channel)
+            depth = queue.queue_declare().message_count
+        lag = current_cache.get('indexer:lag:{0}'.format(self.lane)) or {}
+        return dict(depth=depth, lag=lag.get('lag'),
+                    measured=lag.get('measured'))
+
+    def _bulk_op(self, record_id_iterator, op_type, index=None, doc_type=None):
+        """Queue records, skipping the ones pending with the same operation.
+
+        An operation following a different pending one (e.g. indexing a
+        record whose deletion is queued) is always queued.
+        """
+        window = current_app.config['ZENODO_RECORDS_INDEXER_COALESCE_WINDOW']
+        now = time.time()
+        with self.create_producer() as producer:
+            producer.maybe_declare(self.mq_queue)
+            for rec in record_id_iterator:
+                if window:
+                    key = self._pending_key(rec)
+                    if not current_cache.add(key, op_type, timeout=window):
+                        if current_cache.get(key) == op_type:
+                            continue
+                        current_cache.set(key, op_type, timeout=window)
+                producer.publish(dict(
+                    id=str(rec),
+                    op=op_type,
+                    index=index,
+                    doc_type=doc_type,
+                    timestamp=now,
+                ))
+
+    def process_bulk_queue(self, es_bulk_kwargs=None):
+        """Process the lane's queue in batches of prefetched records.
+
+        The documents of each batch are locked from before the records are
+        read until they are written (see :py:func:`lock_documents`).
+        """
+        batch_size = current_app.config['ZENODO_RECORDS_INDEXER_BATCH_SIZE']
+        req_timeout = current_app.config['INDEXER_BULK_REQUEST_TIMEOUT']
+        es_bulk_kwargs = es_bulk_kwargs or {}
+        success = failed = 0
+        with current_celery_app.pool.acquire(block=True) as conn:
+            consumer = Consumer(
+                connection=conn,
+                queue=self.mq_queue.name,
+                exchange=self.mq_exchange.name,
+                routing_key=self.mq_routing_key,
+            )
+            for messages in chunkify(consumer.iterqueue(), batch_size):
+                payloads = [m.decode() for m in messages]
+                with lock_documents([p['id'] for p in payloads]):
+                    done, errors = bulk(
+                        self.client, self._actionsiter(messages),
+                        stats_only=True, request_timeout=req_timeout,
+                        **es_bulk_kwargs)
+                success += done
+                failed += errors
+            consumer.close()
+        return success, failed
+
+    def _actionsiter(self, messages):
+        """Iterate the bulk actions of a batch of prefetched records."""
+        payloads = [m.decode() for m in messages]
+        # Unmark the records before reading them, so that any later change
+        # queues them again.
+        current_cache.delete_many(*[
+            self._pending_key(p['id']) for p in payloads])
+        now = time.time()
+        timestamps = [p['timestamp'] for p in payloads if p.get('timestamp')]
+        if timestamps:
+            current_cache.set('indexer:lag:{0}'.format(self.lane), dict(
+                lag=now - min(timestamps), measured=now), timeout=0)
+
+        record_ids = [p['id'] for p in payloads if p.get('op') != 'delete']
+        with indexing_batch(record_ids):
+            for action in super(ZenodoRecordIndexer, self)._actionsiter(
+                    messages):
+                yield action
+
+    def _index_action(self, payload):
+        """Bulk index action, using the prefetched record if available."""
+        record = _get_batch_data('records', payload['id'])
+        if record is None:
+            return super(ZenodoRecordIndexer, self)._index_action(payload)
+
+        index, doc_type = self.record_to_index(record)
+        arguments = {}
+        body = self._prepare_record(record, index, doc_type, arguments)
+        index, doc_type = self._prepare_index(index, doc_type)
+
+        action = {
+            '_op_type': 'index',
+            '_index': index,
+            '_type': doc_type,
+            '_id': str(record.id),
+            '_version': record.revision_id,
+            '_version_type': self._version_type,
+            '_source': body
+        }
+        action.update(arguments)
+        return action
+
+
+def _lock_key(record_uuid):
+    """Cache key locking an indexed document while it is written."""
+    return 'indexer:lock:{0}'.format(record_uuid)
+
+
+@contextmanager
+def lock_documents(record_uuids):
+    """Lock indexed documents which are about to be fully indexed.
+
+    The locks are taken over from partial updates in progress, which then
+    leave the documents to the full indexing.
+    """
+    token = uuid4().hex
+    keys = [_lock_key(uuid) for uuid in record_uuids]
+    if keys:
+        current_cache.set_many(
+            dict((key, token) for key in keys), timeout=current_app.config[
+                'ZENODO_RECORDS_INDEXER_LOCK_TIMEOUT'])
+    try:
+        yield
+    finally:
+        _unlock_documents(keys, token)
+
+
+def _unlock_documents(keys, token):
+    """Release the locks of documents which are still held with a token."""
+    if keys:
+        held = [key for key, value in zip(keys, current_cache.get_many(*keys))
+                if value == token]
+        if held:
+            current_cache.delete_many(*held)
+
+
+def _partial_index(client, index, fields):
+    """Update some fields of indexed documents which are not locked.
+
+    :returns: Tuple of the number of updated documents, the IDs of the
+        documents to fully index instead and the number of errors.
+    """
+    token = uuid4().hex
+    timeout = current_app.config['ZENODO_RECORDS_INDEXER_LOCK_TIMEOUT']
+    locked, requeued = [], []
+    for uuid in fields:
+        # Documents which are being written by someone else are skipped
+        if current_cache.add(_lock_key(uuid), token, timeout=timeout):
+            locked.append(uuid)
+        else:
+            requeued.append(uuid)
+    if not locked:
+        return 0, requeued, 0
+    keys = [_lock_key(uuid) for uuid in locked]
+    try:
+        docs = client.mget(
+            index=build_alias_name(index), body={'ids': locked})['docs']
+        # Locks taken over by a full indexing since the documents were read
+        held = set(uuid for uuid, value in zip(
+            locked, current_cache.get_many(*keys)) if value == token)
+        indexed = datetime.utcnow().isoformat()
+        actions = []
+        for doc in docs:
+            if not doc.get('found') or doc['_id'] not in held:
+                requeued.append(doc['_id'])
+                continue
+            source = doc['_source']
+            source.update(fields[doc['_id']])
+            if index == 'records':
+                source['_indexed'] = indexed
+            actions.append({
+                '_op_type': 'index',
+                '_index': doc['_index'],
+                '_id': doc['_id'],
+                '_version': doc['_version'],
+                '_version_type': 'external_gte',
+                '_source': source,
+            })
+        updated, errors = bulk(client, actions, raise_on_error=False,
+                               chunk_size=len(actions) or 1)
+    finally:
+        _unlock_documents(keys, token)
+    # Documents which were fully indexed with a new revision meanwhile
+    conflicts = [
+        e['index']['_id'] for e in errors if e['index'].get('status') == 409]
+    return updated, requeued + conflicts, len(errors) - len(conflicts)
+
+
+def bulk_partial_index(updates, chunk_size=500, index='records',
+                       lane=None):
+    """Update some top-level fields of indexed records.
+
+    The indexed documents are fetched and re-indexed with the updated fields
+    at their current version, so that the rest of the document stays as is
+    and subsequent (externally versioned) full indexing is not rejected.
+    Updated documents of the records index get a new ``_indexed`` timestamp,
+    like fully indexed ones.
+
+    Each document is locked from before it is fetched until it is written,
+    by partial updates and by the bulk indexing of the same document (see
+    :py:func:`lock_documents`). Documents which are locked, changed in the
+    meantime or not indexed yet are queued for full indexing instead.
+
+    :param updates: Iterable of ``(record_uuid, fields)`` tuples.
+    :param chunk_size: Number of documents fetched and updated at a time.
+    :param index: Alias of the indexes where the documents are.
+    :param lane: Indexing lane where the records to fully index are queued.
+        (Default: ``ZENODO_RECORDS_INDEXER_DEFAULT_LANE``)
+    :returns: Tuple of the numbers of updated documents and errors.
+    """
+    client = current_search_client
+    requeued = []
+    updated = errors = 0
+    for chunk in chunkify(updates, chunk_size):
+        done, pending, failed = _partial_index(
+            client, index, OrderedDict((str(uuid), f) for uuid, f in chunk))
+        updated += done
+        errors += failed
+        requeued.extend(pending)
+
+    if requeued:
+        ZenodoRecordIndexer(lane=lane).bulk_index(requeued)
+    return updated, errors
+
+
+def build_deposit_relations(relations, depid_value):
+    """Adapt the relations of a record for its deposit.
+
+    A deposit of the draft of a new version is counted as the last version.
+
+    :param relations: Relations of the deposit's record.
+    :param depid_value: PID value of the deposit.
+    """
+    draft = relations['version'][0].get('draft_child_deposit')
+    if draft:
+        version = dict(relations['version'][0])
+        version['is_last'] = draft['pid_value'] == depid_value
+        version['count'] += 1
+        relations = dict(relations, version=[version])
+    return relations
+
+
+def index_records_relations(record_uuids, with_deposits=True, lane=None):
+    """Update the relations of indexed records.
+
+    :param record_uuids: UUIDs of the records to update.
+    :param with_deposits: Update also the corresponding records' deposits.
+    :param lane: Indexing lane of the records that are not indexed yet.
+    """
+    records = Record.get_records(record_uuids)
+    relations = build_records_relations(records)
+    serialization_cache.invalidate(relations)
+    bulk_partial_index(
+        ((uuid, {'relations': rels}) for uuid, (rels, _) in relations.items()),
+        lane=lane)
+
+    if with_deposits:
+        depids = dict(
+            (str(r['_deposit']['id']), str(r.id)) for r in records
+            if str(r.id) in relations and r.get('_deposit', {}).get('id'))
+        deposits = PersistentIdentifier.query.filter(
+            PersistentIdentifier.pid_type == 'depid',
+            PersistentIdentifier.pid_value.in_(list(depids)),
+        ) if depids else []
+        bulk_partial_index((
+            (str(depid.object_uuid), {'relations': build_deposit_relations(
+                relations[depids[depid.pid_value]][0], depid.pid_value)})
+            for depid in deposits
+        ), index='deposits', lane=lane)
+
+
+def index_siblings_relations(pid, children=None, include_pid=False,
+                             with_deposits=True):
+    """Update the relations of the indexed siblings of a record.
+
+    Works like ``invenio_pidrelations.contrib.records.index_siblings``, but
+    only the ``relations`` of the siblings' documents are recomputed and
+    updated in place, instead of fully reindexing each sibling.
+
+    Only the versions next to the record are updated right away. The other
+    siblings are updated by a task, sent once the current transaction is
+    committed. Siblings that are not indexed yet are queued in the
+    interactive lane.
+
+    :param pid: PID (recid) of whose siblings are to be updated.
+    :param children: Overrides children with a fixed list of PIDs.
+    :param include_pid: If True, updates also the provided PID.
+    :param with_deposits: Update also the corresponding records' deposits.
+    """
+    from zenodo.modules.records.tasks import update_records_relations
+
+    if children is None:
+        children = PIDVersioning(child=pid).children.all()
+    ids = [p.id for p in children]
+    # A draft version is not a child yet, it comes after the last one.
+    position = ids.index(pid.id) if pid.id in ids else len(ids)
+    neighbors = ids[max(position - 1, 0):position + 2]
+    uuids, others = [], []
+    for p in children:
+        if include_pid or p.id != pid.id:
+            (uuids if p.id in neighbors else others).append(
+                str(p.object_uuid))
+
+    if uuids:
+        index_records_relations(
+            uuids, with_deposits=with_deposits, lane='interactive')
+    if others:
+        call_after_commit(
+            update_records_relations.apply_async,
+            args=(others, ),
+            kwargs=dict(with_deposits=with_deposits, lane='interactive'))
+
+
+_AFTER_COMMIT = 'zenodo_after_commit'
+_COMMITTED = 'zenodo_committed'
+
+
+def call_after_commit(func, *args, **kwargs):
+    """Call a function once the current transaction is committed.
+
+    The call is dropped if the transaction is rolled back instead.
+    """
+    session = db.session()
+    if _AFTER_COMMIT not in session.info:
+        session.info[_AFTER_COMMIT] = []
+        event.listen(session, 'after_commit', _mark_committed)
+        event.listen(session, 'after_transaction_end', _run_after_commit)
+    session.info[_AFTER_COMMIT].append(partial(func, *args, **kwargs))
+
+
+def _mark_committed(session):
+    """Mark the commit of an outermost transaction (i.e. not a savepoint)."""
+    transaction = session.transaction
+    if transaction is not None and transaction.parent is None:
+        session.info[_COMMITTED] = True
+
+
+def _run_after_commit(session, transaction):
+    """Run the calls waiting for a committed outermost transaction."""
+    if transaction.parent is not None:
+        return
+    calls = session.info[_AFTER_COMMIT]
+    session.info[_AFTER_COMMIT] = []
+    if session.info.pop(_COMMITTED, False):
+        for call in calls:
+            call()
 
 
 def indexer_receiver(sender, json=None, record=None, index=None,
@@ -52,11 +513,19 @@ def indexer_receiver(sender, json=None, record=None, index=None,
         json['filecount'] = len(files)
         json['size'] = sum([f.get('size', 0) for f in files])
 
-    pid = PersistentIdentifier.query.filter(
-        PersistentIdentifier.pid_value == str(record['recid']),
-        PersistentIdentifier.pid_type == 'recid',
-        PersistentIdentifier.object_uuid == record.id,
-    ).one_or_none()
+    prefetched = _get_batch_data('relations', record.id)
+    if prefetched is not None:
+        relations, rels = prefetched
+        json['relations'] = relations
+        if rels:
+            json.setdefault('related_identifiers', []).extend(rels)
+        pid = None
+    else:
+        pid = PersistentIdentifier.query.filter(
+            PersistentIdentifier.pid_value == str(record['recid']),
+            PersistentIdentifier.pid_type == 'recid',
+            PersistentIdentifier.object_uuid == record.id,
+        ).one_or_none()
     if pid:
         pv = PIDVersioning(child=pid)
         if pv.exists:
@@ -78,9 +547,26 @@ def indexer_receiver(sender, json=None, record=None, index=None,
     if '_internal' in json:
         del json['_internal']
 
-    json['_stats'] = build_record_stats(record['recid'],
-                                        record.get('conceptrecid'))
+    # Time of the last write to the index (see the exporter's delta exports)
+    json['_indexed'] = datetime.utcnow().isoformat()
+
+    stats = get_batch_record_stats(record['recid'])
+    if stats is None:
+        stats = build_record_stats(record['recid'], record.get('conceptrecid'))
+        cache_records_stats({str(record.id): stats})
+    json['_stats'] = stats
 
     custom_es_fields = build_record_custom_fields(json)
     for es_field, es_value in custom_es_fields.items():
         json[es_field] = es_value
+
+    if current_app.config['ZENODO_RECORDS_SCHEMAORG_PRECOMPUTE']:
+        # Landing pages fall back to serializing the record if missing.
+        try:
+            json[schemaorg_jsonld_v1.index_field] = \
+                schemaorg_jsonld_v1.dump_indexed(
+                    pid, json, record.revision_id)
+        except Exception:
+            current_app.logger.exception(
+                u'Schema.org serialization of record {0} failed.'
+                .format(str(record.id)))
@@ -27,7 +27,6 @@
 from __future__ import absolute_import, print_function
 
 from dojson.contrib.to_marc21 import to_marc21
-from invenio_records_rest.serializers.citeproc import CiteprocSerializer
 from invenio_records_rest.serializers.datacite import OAIDataCiteSerializer
 from invenio_records_rest.serializers.response import record_responsify, \
     search_responsify
@@ -39,12 +38,15 @@ from zenodo.modules.records.serializers.dc import ZenodoDublinCoreSerializer
 from zenodo.modules.records.serializers.marc21 import ZenodoMARCXMLSerializer
 
 from .bibtex import BibTeXSerializer
+from .cache import CachedSerializer, SerializationCache, json_format_context
+from .citeproc import ZenodoCiteprocSerializer
 from .dcat import DCATSerializer
 from .extra_formats import ExtraFormatsSerializer
 from .files import files_responsify
 from .geojson import ZenodoGeoJSONSerializer as GeoJSONSerializer
 from .json import ZenodoJSONSerializer as JSONSerializer
 from .legacyjson import DepositLegacyJSONSerializer, LegacyJSONSerializer
+from .response import streaming_search_responsify
 from .schemaorg import ZenodoSchemaOrgSerializer
 from .schemas.csl import RecordSchemaCSLJSON
 from .schemas.datacite import DataCiteSchemaV1, DataCiteSchemaV4
@@ -56,6 +58,10 @@ from .schemas.marc21 import RecordSchemaMARC21
 
 # Serializers
 # ===========
+#: Cache of serialized record revisions, shared by the serializers whose
+#: output does not depend on the current user.
+serialization_cache = SerializationCache(prefix='records-serialization')
+
 #: Zenodo JSON serializer version 1.0.0
 json_v1 = JSONSerializer(RecordSchemaV1, replace_refs=True)
 #: Zenodo Deposit JSON serializer version 1.0.0
@@ -73,15 +79,22 @@ deposit_formjson_v1 = LegacyJSONSerializer(
 deposit_legacyjson_v1 = DepositLegacyJSONSerializer(
     LegacyRecordSchemaV1, replace_refs=True)
 #: MARCXML serializer version 1.0.0
-marcxml_v1 = ZenodoMARCXMLSerializer(
-    to_marc21, schema_class=RecordSchemaMARC21, replace_refs=True)
+marcxml_v1 = CachedSerializer(ZenodoMARCXMLSerializer(
+    to_marc21, schema_class=RecordSchemaMARC21, replace_refs=True),
+    'marcxml_v1', cache=serialization_cache)
 #: BibTeX serializer version 1.0.0
-bibtex_v1 = BibTeXSerializer()
+bibtex_v1 = CachedSerializer(
+    BibTeXSerializer(), 'bibtex_v1', cache=serialization_cache)
 #: DataCite serializers
-datacite_v31 = ZenodoDataCite31Serializer(DataCiteSchemaV1, replace_refs=True)
-datacite_v41 = ZenodoDataCite41Serializer(DataCiteSchemaV4, replace_refs=True)
+datacite_v31 = CachedSerializer(
+    ZenodoDataCite31Serializer(DataCiteSchemaV1, replace_refs=True),
+    'datacite_v31', cache=serialization_cache)
+datacite_v41 = CachedSerializer(
+    ZenodoDataCite41Serializer(DataCiteSchemaV4, replace_refs=True),
+    'datacite_v41', cache=serialization_cache)
 #: DCAT serializer
-dcat_v1 = DCATSerializer(datacite_v41)
+dcat_v1 = CachedSerializer(
+    DCATSerializer(datacite_v41), 'dcat_v1', cache=serialization_cache)
 #: OAI DataCite serializer
 oai_datacite = OAIDataCiteSerializer(
     serializer=datacite_v31,
@@ -93,13 +106,21 @@ oai_datacite_v41 = OAIDataCiteSerializer(
     datacentre='CERN.ZENODO',
 )
 #: Dublin Core serializer
-dc_v1 = ZenodoDublinCoreSerializer(DublinCoreV1, replace_refs=True)
+dc_v1 = CachedSerializer(
+    ZenodoDublinCoreSerializer(DublinCoreV1, replace_refs=True),
+    'dc_v1', cache=serialization_cache)
 #: CSL-JSON serializer
-csl_v1 = JSONSerializer(RecordSchemaCSLJSON, replace_refs=True)
+csl_v1 = CachedSerializer(
+    JSONSerializer(RecordSchemaCSLJSON, replace_refs=True), 'csl_v1',
+    context=json_format_context, cache=serialization_cache)
 #: CSL Citation Formatter serializer
-citeproc_v1 = CiteprocSerializer(csl_v1)
+citeproc_v1 = ZenodoCiteprocSerializer(
+    csl_v1, 'citeproc_v1', cache=serialization_cache)
 #: OpenAIRE JSON serializer
-openaire_json_v1 = JSONSerializer(RecordSchemaOpenAIREJSON, replace_refs=True)
+openaire_json_v1 = CachedSerializer(
+    JSONSerializer(RecordSchemaOpenAIREJSON, replace_refs=True),
+    'openaire_json_v1', context=json_format_context,
+    cache=serialization_cache)
 #: JSON-LD serializer
 schemaorg_jsonld_v1 = ZenodoSchemaOrgSerializer(replace_refs=True)
 #: Extra formats serializer
@@ -145,9 +166,11 @@ json_v1_search = search_responsify(json_v1, 'application/json')
 #: JSON record legacy serializer for search results.
 legacyjson_v1_search = search_responsify(legacyjson_v1, 'application/json')
 #: MARCXML record serializer for search records.
-marcxml_v1_search = search_responsify(marcxml_v1, 'application/marcxml+xml')
+marcxml_v1_search = streaming_search_responsify(
+    marcxml_v1, 'application/marcxml+xml')
 #: BibTeX serializer for search records.
-bibtex_v1_search = search_responsify(bibtex_v1, 'application/x-bibtex')
+bibtex_v1_search = streaming_search_responsify(
+    bibtex_v1, 'application/x-bibtex')
 #: DataCite v3.1 record serializer for search records.
 datacite_v31_search = search_responsify(
     datacite_v31, 'application/x-datacite+xml')
@@ -54,11 +54,20 @@ class BibTeXSerializer(object):
         :param search_result: Elasticsearch search result.
         :param links: Dictionary of links to add to response.
         """
-        records = []
-        for hit in search_result['hits']['hits']:
-            records.append(Bibtex(record=hit['_source']).format())
+        return "".join(self.iter_search(pid_fetcher, search_result))
 
-        return "\n".join(records)
+    # pylint: disable=W0613
+    def iter_search(self, pid_fetcher, search_result, links=None,
+                    item_links_factory=None):
+        """Serialize a search result, record by record.
+
+        :param pid_fetcher: Persistent identifier fetcher.
+        :param search_result: Elasticsearch search result.
+        :returns: Generator of the parts of the serialized search result.
+        """
+        for i, hit in enumerate(search_result['hits']['hits']):
+            record = Bibtex(record=hit['_source']).format()
+            yield "\n" + record if i else record
 
 
 class MissingRequiredFieldError(Exception):
@@ -0,0 +1,319 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Zenodo.
+# Copyright (C) 2016-2018 CERN.
+#
+# Zenodo is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Zenodo is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Zenodo; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Cache of serialized records keyed by record revision."""
+
+from __future__ import absolute_import, print_function
+
+import hashlib
+import json
+from collections import OrderedDict
+from threading import Lock
+from uuid import uuid4
+
+from flask import has_request_context, request
+from invenio_cache import current_cache
+
+from zenodo.modules.records.proxies import current_zenodo_records
+
+
+class LRUCache(object):
+    """Thread-safe, size-bounded, least recently used in-process cache.
+
+    :param max_entries: Maximum number of entries.
+    :param max_size: Maximum total size (i.e. ``len()``) of the values.
+    """
+
+    def __init__(self, max_entries=1024, max_size=None):
+        """Initialize cache."""
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self):
+        """Number of entries."""
+        return len(self._entries)
+
+    def get(self, key):
+        """Get a value and mark it as recently used."""
+        with self._lock:
+            value = self._entries.pop(key, None)
+            if value is not None:
+                self._entries[key] = value
+            return value
+
+    def set(self, key, value):
+        """Set a value, evicting the least recently used ones if needed."""
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self._entries[key] = value
+            self.size += len(value)
+            while self._entries and (
+                    len(self._entries) > self.max_entries or
+                    (self.max_size and self.size > self.max_size)):
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def delete(self, key):
+        """Delete a value."""
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+
+    def clear(self):
+        """Delete all values."""
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+class SerializationCache(object):
+    """Cache of serialized records, keyed by record revision.
+
+    Entries are kept in a size-bounded in-process LRU cache. If enabled (see
+    ``ZENODO_RECORDS_SERIALIZATION_CACHE_SHARED``), they are also shared
+    between processes in a dedicated Redis database, where they expire after
+    ``timeout`` seconds. Since the keys include the record's revision,
+    serialized output of an older revision is never returned.
+
+    Some fields of indexed records (e.g. ``_stats`` or ``relations``) change
+    without a new revision. A ``fingerprint`` of such fields can be stored
+    along with an entry, in which case an entry with a different fingerprint
+    is treated as a miss.
+
+    :param prefix: Prefix of the keys in the shared cache.
+    :param max_entries: Maximum number of entries of the in-process cache.
+    :param max_size: Maximum size in bytes of the in-process cache.
+    :param max_entry_size: Values bigger than this are not cached.
+    :param timeout: Timeout of the entries in the shared cache.
+    :param backend: Shared cache (defaults to the configured one). The
+        generations of the records are kept in it too, or else in the
+        application cache.
+    :param shared: Use (``True``) or not (``False``) the shared cache,
+        whatever ``ZENODO_RECORDS_SERIALIZATION_CACHE_SHARED`` says.
+    """
+
+    def __init__(self, prefix='serialization', max_entries=10000,
+                 max_size=64 * 1024 * 1024, max_entry_size=1024 * 1024,
+                 timeout=40 * 24 * 60 * 60, backend=None, shared=None):
+        """Initialize cache."""
+        self.prefix = prefix
+        self.max_entry_size = max_entry_size
+        self.timeout = timeout
+        self.local = LRUCache(max_entries=max_entries, max_size=max_size)
+        self._backend = backend
+        self.shared = shared
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def backend(self):
+        """Get the shared cache, or ``None`` if it's disabled."""
+        if self._backend is not None:
+            return self._backend
+        if self.shared is None:
+            return current_zenodo_records.serialization_cache_backend
+        if self.shared:
+            return current_zenodo_records.serialization_cache_redis
+
+    @property
+    def generations(self):
+        """Get the cache of the records' generations."""
+        return current_cache if self._backend is None else self._backend
+
+    def key(self, serializer_id, record_uuid, revision_id, *context):
+        """Build the key of a serialized record revision."""
+        return ':'.join([self.prefix, serializer_id, str(record_uuid),
+                         str(revision_id)] + [str(c) for c in context])
+
+    @staticmethod
+    def fingerprint(data, fields):
+        """Compute the fingerprint of some fields of a dictionary."""
+        return hashlib.md5(json.dumps(
+            [data.get(f) for f in fields], sort_keys=True
+        ).encode('utf8')).hexdigest()
+
+    def get(self, key, fingerprint=None):
+        """Get a cached serialization."""
+        entry = self.local.get(key)
+        backend = self.backend
+        if entry is None and backend is not None:
+            entry = backend.get(key)
+            if entry is not None:
+                self.local.set(key, _Entry(*entry))
+        if entry is not None and entry[0] == fingerprint:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+
+    def set(self, key, value, fingerprint=None):
+        """Cache a serialization."""
+        if self.max_entry_size and len(value) > self.max_entry_size:
+            return
+        entry = _Entry(fingerprint, value)
+        self.local.set(key, entry)
+        backend = self.backend
+        if backend is not None:
+            backend.set(key, tuple(entry), timeout=self.timeout)
+
+    def delete(self, key):
+        """Delete a cached serialization."""
+        self.local.delete(key)
+        backend = self.backend
+        if backend is not None:
+            backend.delete(key)
+
+    def generation(self, record_uuid):
+        """Get the generation of the cached serializations of a record."""
+        return self.generations.get(self._generation_key(record_uuid)) or 0
+
+    def invalidate(self, record_uuids):
+        """Invalidate the cached serializations of some records.
+
+        Used when the serialization of records changes without a new
+        revision (e.g. relations with new versions).
+        """
+        self.generations.set_many(dict(
+            (self._generation_key(uuid), uuid4().hex)
+            for uuid in record_uuids), timeout=self.timeout)
+
+    def _generation_key(self, record_uuid):
+        """Build the key of the generation of a record."""
+        return '{0}:generation:{1}'.format(self.prefix, record_uuid)
+
+    def get_or_set(self, key, func, fingerprint=None):
+        """Get a cached serialization or compute and cache it."""
+        value = self.get(key, fingerprint=fingerprint)
+        if value is None:
+            value = func()
+            if value:
+                self.set(key, value, fingerprint=fingerprint)
+        return value
+
+
+class _Entry(tuple):
+    """Cache entry of a fingerprint and a value, sized by its value."""
+
+    def __new__(cls, fingerprint, value):
+        """Create the entry."""
+        return super(_Entry, cls).__new__(cls, (fingerprint, value))
+
+    def __len__(self):
+        """Size of the value."""
+        return len(self[1])
+
+
+class CachedExportSerializer(object):
+    """Exporter serializer caching the output of another serializer.
+
+    The cache is keyed by the record UUID and revision (i.e. the
+    Elasticsearch document ``_id`` and ``_version``), so that re-exporting
+    an unchanged index only serializes the updated records. By default,
+    serializations are kept in the shared cache (even if it is disabled for
+    the rest of the application), since an export job rarely runs twice in
+    the same worker.
+
+    :param serializer: Serializer with ``serialize_exporter(pid, record)``.
+    :param serializer_id: Unique name of the serializer in the cache.
+    :param volatile_fields: Indexed fields that can change without a new
+        record revision.
+    :param cache: Serialization cache to use.
+    """
+
+    def __init__(self, serializer, serializer_id, volatile_fields=(
+            '_stats', 'relations', 'related_identifiers'), cache=None):
+        """Initialize serializer."""
+        self.serializer = serializer
+        self.serializer_id = serializer_id
+        self.volatile_fields = volatile_fields
+        self.cache = cache or SerializationCache(
+            max_entries=1000, shared=True)
+
+    def serialize_exporter(self, pid, record):
+        """Serialize a single record for the exporter."""
+        if not record.get('_id') or not record.get('_version'):
+            return self.serializer.serialize_exporter(pid, record)
+        return self.cache.get_or_set(
+            self.cache.key(
+                self.serializer_id, record['_id'], record['_version']),
+            lambda: self.serializer.serialize_exporter(pid, record),
+            fingerprint=self.cache.fingerprint(
+                record['_source'], self.volatile_fields),
+        )
+
+
+class CachedSerializer(object):
+    """Serializer caching the output of another serializer.
+
+    Single record serializations are cached by record UUID and revision,
+    persistent identifier and, optionally, some request context (e.g. the
+    citation style). Everything else is delegated to the wrapped serializer.
+
+    Only serializers whose output does not depend on the current user or on
+    the record's links should be wrapped.
+
+    :param serializer: Serializer to wrap.
+    :param serializer_id: Unique name of the serializer in the cache.
+    :param context: Function returning a list of values the output depends
+        on, besides the record and PID.
+    :param cache: Serialization cache to use.
+    """
+
+    def __init__(self, serializer, serializer_id, context=None, cache=None):
+        """Initialize serializer."""
+        self.serializer = serializer
+        self.serializer_id = serializer_id
+        self.context = context
+        self.cache = cache or SerializationCache()
+
+    def __getattr__(self, name):
+        """Get attributes of the wrapped serializer."""
+        if name == 'serializer':
+            raise AttributeError(name)
+        return getattr(self.serializer, name)
+
+    def serialize(self, pid, record, links_factory=None, **kwargs):
+        """Serialize a single record, or get its cached serialization."""
+        revision_id = getattr(record, 'revision_id', None)
+        if revision_id is None or kwargs:
+            return self.serializer.serialize(
+                pid, record, links_factory=links_factory, **kwargs)
+        context = self.context() if self.context else []
+        key = self.cache.key(
+            self.serializer_id, record.id, revision_id,
+            self.cache.generation(record.id), pid.pid_type, pid.pid_value,
+            *context)
+        return self.cache.get_or_set(key, lambda: self.serializer.serialize(
+            pid, record, links_factory=links_factory))
+
+
+def json_format_context():
+    """Context of JSON serializations, i.e. if they are pretty printed."""
+    return [bool(has_request_context() and request.args.get('prettyprint'))]
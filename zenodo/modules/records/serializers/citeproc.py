@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Zenodo.
+# Copyright (C) 2018 CERN.
+#
+# Zenodo is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Zenodo is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Zenodo; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""CSL citation formatter serializer."""
+
+from __future__ import absolute_import, print_function
+
+from collections import OrderedDict
+from os.path import basename
+from threading import local
+
+from citeproc import LOCALES, Citation, CitationItem, \
+    CitationStylesBibliography, CitationStylesStyle, formatter
+from citeproc_styles import get_style_filepath
+from citeproc_styles.errors import StyleNotFoundError
+from invenio_records_rest.serializers.citeproc import CiteprocSerializer
+
+from .cache import SerializationCache
+
+_LOCALES = dict((locale.lower(), locale) for locale in LOCALES)
+
+
+def normalize_locale(locale, default='en-US'):
+    """Get the available CSL locale closest to a locale.
+
+    A language without a known region is mapped to a locale of the same
+    language (e.g. ``de`` to ``de-DE``), any other locale to the default one.
+
+    :param locale: Requested locale (e.g. ``en``, ``fr_FR`` or ``de-AT``).
+    :param default: Locale used when there is no match.
+    """
+    locale = (locale or '').replace('_', '-').lower()
+    if locale in _LOCALES:
+        return _LOCALES[locale]
+    language = locale.split('-')[0]
+    if not language:
+        return default
+    if default.lower().split('-')[0] == language:
+        return default
+    main = '{0}-{0}'.format(language)
+    if main in _LOCALES:
+        return _LOCALES[main]
+    matches = sorted(
+        name for key, name in _LOCALES.items()
+        if key.split('-')[0] == language)
+    return matches[0] if matches else default
+
+
+class ZenodoCiteprocSerializer(CiteprocSerializer):
+    """CSL citation formatter reusing parsed styles and caching citations.
+
+    Parsed styles keep state while rendering, so they are reused per thread.
+    Formatted citations are cached by record revision, style and locale.
+
+    :param serializer: CSL-JSON serializer.
+    :param serializer_id: Unique name of the serializer in the cache.
+    :param max_styles: Maximum number of parsed styles kept per thread.
+    :param cache: Serialization cache to use.
+    """
+
+    def __init__(self, serializer, serializer_id, max_styles=50, cache=None,
+                 **kwargs):
+        """Initialize serializer."""
+        super(ZenodoCiteprocSerializer, self).__init__(serializer, **kwargs)
+        self.serializer_id = serializer_id
+        self.max_styles = max_styles
+        self.cache = cache or SerializationCache()
+        self._local = local()
+
+    def get_style(self, style, locale):
+        """Get a parsed style of the current thread.
+
+        :param style: Path of the CSL style file.
+        :param locale: Locale of the style.
+        """
+        styles = getattr(self._local, 'styles', None)
+        if styles is None:
+            styles = self._local.styles = OrderedDict()
+        csl_style = styles.pop((style, locale), None)
+        if csl_style is None:
+            csl_style = CitationStylesStyle(
+                style, locale=locale, validate=False)
+            while len(styles) >= self.max_styles:
+                styles.popitem(last=False)
+        styles[(style, locale)] = csl_style
+        return csl_style
+
+    def render(self, pid, data, style, locale):
+        """Format the citation of a serialized record.
+
+        :param pid: Persistent identifier instance.
+        :param data: Record serialized by the inner serializer.
+        :param style: Path of the CSL style file.
+        :param locale: Locale of the citation.
+        """
+        bib = CitationStylesBibliography(
+            self.get_style(style, locale), self._get_source(data),
+            formatter.plain)
+        citation = Citation([CitationItem(pid.pid_value)])
+        bib.register(citation)
+        return self._clean_result(''.join(bib.bibliography()[0]))
+
+    def _citations(self, pid, record, styles, locale, links_factory=None):
+        """Get the cached citations of a record or render them."""
+        data = []
+
+        def render(style):
+            if not data:
+                data.append(self.serializer.serialize(
+                    pid, record, links_factory))
+            return self.render(pid, data[0], style, locale)
+
+        revision_id = getattr(record, 'revision_id', None)
+        if revision_id is None:
+            return [render(style) for style in styles]
+        generation = self.cache.generation(record.id)
+        return [
+            self.cache.get_or_set(
+                self.cache.key(
+                    self.serializer_id, record.id, revision_id, generation,
+                    pid.pid_type, pid.pid_value, basename(style), locale),
+                lambda: render(style))
+            for style in styles
+        ]
+
+    @classmethod
+    def _get_args(cls, **kwargs):
+        """Parse style and locale, normalizing the locale."""
+        args = super(ZenodoCiteprocSerializer, cls)._get_args(**kwargs)
+        args['locale'] = normalize_locale(args['locale'], cls._default_locale)
+        return args
+
+    def serialize(self, pid, record, links_factory=None, **kwargs):
+        """Serialize a single record.
+
+        :param pid: Persistent identifier instance.
+        :param record: Record instance.
+        :param links_factory: Factory function for record links.
+        """
+        args = self._get_args(**kwargs)
+        return self._citations(
+            pid, record, [args['style']], args['locale'],
+            links_factory=links_factory)[0]
+
+    def serialize_styles(self, pid, record, styles, locale=None,
+                         links_factory=None):
+        """Serialize a single record in many citation styles.
+
+        The record is serialized by the inner serializer at most once.
+
+        :param pid: Persistent identifier instance.
+        :param record: Record instance.
+        :param styles: Names of the citation styles.
+        :param locale: Locale of the citations.
+        :param links_factory: Factory function for record links.
+        :returns: Dictionary of the citation in each style, ``None`` for the
+            unknown styles.
+        """
+        paths = OrderedDict()
+        for style in styles:
+            try:
+                paths[style] = get_style_filepath(style.lower())
+            except StyleNotFoundError:
+                paths[style] = None
+        known = [s for s, path in paths.items() if path]
+        citations = dict(zip(known, self._citations(
+            pid, record, [paths[s] for s in known],
+            normalize_locale(locale, self._default_locale),
+            links_factory=links_factory)))
+        return dict((s, citations.get(s)) for s in paths)
@@ -31,10 +31,11 @@ from invenio_records_rest.serializers.datacite import DataCite31Serializer, \
     DataCite41Serializer
 
 from .pidrelations import preprocess_related_identifiers
+from .plans import DumpPlanMixin
 from .schemas.common import ui_link_for
 
 
-class ZenodoDataCite31Serializer(DataCite31Serializer):
+class ZenodoDataCite31Serializer(DumpPlanMixin, DataCite31Serializer):
     """Marshmallow based DataCite serializer for records.
 
     Note: This serializer is not suitable for serializing large number of
@@ -58,7 +59,7 @@ class ZenodoDataCite31Serializer(DataCite31Serializer):
         return result
 
 
-class ZenodoDataCite41Serializer(DataCite41Serializer):
+class ZenodoDataCite41Serializer(DumpPlanMixin, DataCite41Serializer):
     """Marshmallow based DataCite serializer for records.
 
     Note: This serializer is not suitable for serializing large number of
@@ -29,9 +29,10 @@ from __future__ import absolute_import, print_function
 from invenio_records_rest.serializers.dc import DublinCoreSerializer
 
 from .pidrelations import preprocess_related_identifiers
+from .plans import DumpPlanMixin
 
 
-class ZenodoDublinCoreSerializer(DublinCoreSerializer):
+class ZenodoDublinCoreSerializer(DumpPlanMixin, DublinCoreSerializer):
     """Zenodo Dublin Core serializer for records.
 
     Note: This serializer is not suitable for serializing large number of
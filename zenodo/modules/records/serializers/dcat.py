@@ -26,9 +26,14 @@
 
 from __future__ import absolute_import, print_function
 
+from collections import OrderedDict
+from threading import local
+
 from lxml import etree as ET
-from pkg_resources import resource_stream
-from werkzeug.utils import cached_property
+from pkg_resources import resource_filename
+
+RDF_NS = 'http://www.w3.org/1999/02/22-rdf-syntax-ns#'
+"""RDF namespace."""
 
 
 class DCATSerializer(object):
@@ -37,18 +42,53 @@ class DCATSerializer(object):
     def __init__(self, datacite_serializer):
         """."""
         self.datacite_serializer = datacite_serializer
+        self._local = local()
 
-    @cached_property
+    def _load_xslt(self, name):
+        """Load and compile an XSLT, once per thread.
+
+        XSLT objects of lxml can't be shared between threads.
+        """
+        xslt = getattr(self._local, name, None)
+        if xslt is None:
+            xslt = ET.XSLT(ET.parse(resource_filename(
+                'zenodo.modules.records', 'data/{0}.xsl'.format(name))))
+            setattr(self._local, name, xslt)
+        return xslt
+
+    @property
     def xslt_transform_func(self):
         """Return the DCAT XSLT transformation function."""
-        with resource_stream('zenodo.modules.records',
-                             'data/datacite-to-dcat-ap.xsl') as f:
-            xsl = ET.XML(f.read())
-        transform = ET.XSLT(xsl)
-        return transform
+        return self._load_xslt('datacite-to-dcat-ap')
 
-    def transform_with_xslt(self, pid, record, search_hit=False, **kwargs):
-        """Transform record with XSLT."""
+    @property
+    def batch_xslt_transform_func(self):
+        """Return the DCAT XSLT transformation function for many records.
+
+        It transforms a container of DataCite resources to a container of
+        the DCAT elements of each resource.
+        """
+        return self._load_xslt('datacite-to-dcat-ap-batch')
+
+    @property
+    def rdf_nsmap(self):
+        """Namespaces declared on the root of the transformed records."""
+        nsmap = getattr(self._local, 'rdf_nsmap', None)
+        if nsmap is None:
+            xsl = ET.parse(resource_filename(
+                'zenodo.modules.records', 'data/datacite-to-dcat-ap.xsl'
+            )).getroot()
+            excluded = set(
+                xsl.get('exclude-result-prefixes', '').split() + ['xsl'])
+            nsmap = OrderedDict([('rdf', RDF_NS)] + [
+                (prefix, uri) for prefix, uri in xsl.nsmap.items()
+                if prefix not in excluded and prefix != 'rdf'
+            ])
+            self._local.rdf_nsmap = nsmap
+        return nsmap
+
+    def _datacite_etree(self, pid, record, search_hit=False, **kwargs):
+        """Transform record to a DataCite resource element."""
         if search_hit:
             record = self.datacite_serializer.transform_search_hit(
                 pid, record, **kwargs)
@@ -58,9 +98,35 @@ class DCATSerializer(object):
         dc_etree = self.datacite_serializer.schema.dump_etree(record)
         dc_namespace = self.datacite_serializer.schema.ns[None]
         dc_etree.tag = '{{{0}}}resource'.format(dc_namespace)
+        return dc_etree
+
+    def transform_with_xslt(self, pid, record, search_hit=False, **kwargs):
+        """Transform record with XSLT."""
+        dc_etree = self._datacite_etree(
+            pid, record, search_hit=search_hit, **kwargs)
         dcat_etree = self.xslt_transform_func(dc_etree)
         return dcat_etree
 
+    def transform_search_with_xslt(self, pid_fetcher, hits, **kwargs):
+        """Transform search hits with a single XSLT pass.
+
+        :param pid_fetcher: Persistent identifier fetcher.
+        :param hits: Elasticsearch search hits.
+        :returns: Generator of the transformed records, in the same form as
+            :py:meth:`transform_with_xslt` produces them.
+        """
+        container = ET.Element('resources')
+        for hit in hits:
+            pid = pid_fetcher(hit['_id'], hit['_source'])
+            container.append(self._datacite_etree(
+                pid, hit, search_hit=True, **kwargs))
+        records = self.batch_xslt_transform_func(container).getroot()
+        for record in records:
+            root = ET.Element('{{{0}}}RDF'.format(RDF_NS),
+                              nsmap=self.rdf_nsmap)
+            root.extend(list(record))
+            yield root
+
     def _etree_tostring(self, root):
         return ET.tostring(
             root,
@@ -85,14 +151,22 @@ class DCATSerializer(object):
         :param search_result: Elasticsearch search result.
         :param links: Dictionary of links to add to response.
         """
-        records = []
-        for hit in search_result['hits']['hits']:
-            pid = pid_fetcher(hit['_id'], hit['_source'])
-            dcat_etree = self.transform_with_xslt(
-                pid, hit, search_hit=True, **kwargs)
-            records.append(self._etree_tostring(dcat_etree))
+        return ''.join(self.iter_search(pid_fetcher, search_result, **kwargs))
+
+    def iter_search(self, pid_fetcher, search_result, **kwargs):
+        """Serialize a search result, record by record.
+
+        All the records of the page are transformed with a single XSLT pass.
 
-        return '\n'.join(records)
+        :param pid_fetcher: Persistent identifier fetcher.
+        :param search_result: Elasticsearch search result.
+        :returns: Generator of the parts of the serialized search result.
+        """
+        records = self.transform_search_with_xslt(
+            pid_fetcher, search_result['hits']['hits'], **kwargs)
+        for i, root in enumerate(records):
+            record = self._etree_tostring(root)
+            yield '\n' + record if i else record
 
     def serialize_oaipmh(self, pid, record):
         """Serialize a single record for OAI-PMH."""
@@ -31,6 +31,7 @@ from zenodo.modules.records.serializers.schemas.geojson import \
     FeatureCollection
 
 from .json import ZenodoJSONSerializer
+from .plans import dump_plan
 
 
 class ZenodoGeoJSONSerializer(ZenodoJSONSerializer):
@@ -38,4 +39,4 @@ class ZenodoGeoJSONSerializer(ZenodoJSONSerializer):
 
     def dump(self, obj, context=None):
         """Serialize object with schema."""
-        return FeatureCollection(context=context).dump(obj).data
+        return dump_plan(FeatureCollection, context).dump(obj, context)
@@ -38,6 +38,7 @@ from zenodo.modules.records.serializers.pidrelations import \
     serialize_related_identifiers
 
 from ..permissions import has_read_files_permission
+from .plans import dump_plan
 
 
 class ZenodoJSONSerializer(JSONSerializer):
@@ -87,7 +88,7 @@ class ZenodoJSONSerializer(JSONSerializer):
 
     def dump(self, obj, context=None):
         """Serialize object with schema."""
-        return self.schema_class(context=context).dump(obj).data
+        return dump_plan(self.schema_class, context).dump(obj, context)
 
     def transform_record(self, pid, record, links_factory=None):
         """Transform record into an intermediate representation."""
@@ -26,9 +26,12 @@
 
 from __future__ import absolute_import, print_function
 
+from dojson.contrib.to_marc21.utils import dumps, dumps_etree
 from invenio_marc21.serializers.marcxml import MARCXMLSerializer
+from lxml import etree
 
 from .pidrelations import preprocess_related_identifiers
+from .plans import dump_plan
 
 
 class ZenodoMARCXMLSerializer(MARCXMLSerializer):
@@ -45,3 +48,47 @@ class ZenodoMARCXMLSerializer(MARCXMLSerializer):
         )
         result = preprocess_related_identifiers(pid, record, result)
         return result
+
+    def dump(self, obj):
+        """Serialize object with schema."""
+        if self.schema_class:
+            obj = dump_plan(self.schema_class).dump(obj)
+        else:
+            obj = obj['metadata']
+        return super(MARCXMLSerializer, self).dump(obj)
+
+    def iter_search(self, pid_fetcher, search_result, item_links_factory=None,
+                    **kwargs):
+        """Serialize a search result, record by record.
+
+        Yields the same document as ``serialize_search``, without building
+        the whole collection in memory.
+
+        :param pid_fetcher: Persistent identifier fetcher.
+        :param search_result: Elasticsearch search result.
+        :param item_links_factory: Factory function for the items in result.
+        :returns: Generator of the parts of the serialized search result.
+        """
+        hits = search_result['hits']['hits']
+        if not hits or self.dumps_kwargs:
+            yield self.serialize_search(
+                pid_fetcher, search_result,
+                item_links_factory=item_links_factory, **kwargs)
+            return
+
+        header, footer = None, None
+        for hit in hits:
+            obj = self.transform_search_hit(
+                pid_fetcher(hit['_id'], hit['_source']), hit,
+                links_factory=item_links_factory)
+            # A collection of a single record, split into the collection's
+            # opening tag, the (indented) record and the closing tag.
+            lines = etree.tostring(
+                dumps_etree([obj]), pretty_print=True, encoding='UTF-8'
+            ).splitlines(True)
+            if header is None:
+                header = dumps([]).splitlines(True)[0] + lines[0]
+                footer = lines[-1]
+                yield header
+            yield b''.join(lines[1:-1])
+        yield footer
@@ -26,8 +26,13 @@
 
 from __future__ import absolute_import, print_function
 
+from collections import defaultdict
+
+from invenio_db import db
 from invenio_pidrelations.contrib.versioning import PIDVersioning
-from invenio_pidstore.models import PersistentIdentifier
+from invenio_pidrelations.models import PIDRelation
+from invenio_pidrelations.utils import resolve_relation_type_config
+from invenio_pidstore.models import PersistentIdentifier, PIDStatus
 
 from zenodo.modules.records.api import ZenodoRecord
 
@@ -111,3 +116,136 @@ def preprocess_related_identifiers(pid, record, result):
             result['metadata'].setdefault(
                 'related_identifiers', []).extend(rels)
     return result
+
+
+def _dump_pid(pid):
+    """Dump a PID like the relation schemas."""
+    if pid is not None:
+        return {'pid_type': pid.pid_type, 'pid_value': pid.pid_value}
+
+
+def build_records_relations(records):
+    """Build the relations and related identifiers of many records.
+
+    Works like ``serialize_relations`` and
+    :py:func:`serialize_related_identifiers` for the ``recid`` of each
+    record, but resolves the PIDs, version relations, siblings and draft
+    deposits of all the records with a few queries.
+
+    :param records: Iterable of records.
+    :returns: Dictionary of record UUID to a ``(relations,
+        related_identifiers)`` tuple. Records without a ``recid`` PID are
+        left out.
+    """
+    records = dict((str(r.id), r) for r in records if r.get('recid'))
+    if not records:
+        return {}
+    version_type = resolve_relation_type_config('version').id
+    draft_type = resolve_relation_type_config('record_draft').id
+
+    pids = dict(
+        (str(pid.object_uuid), pid)
+        for pid in PersistentIdentifier.query.filter(
+            PersistentIdentifier.pid_type == 'recid',
+            PersistentIdentifier.object_uuid.in_(list(records)),
+        ) if pid.pid_value == str(records[str(pid.object_uuid)]['recid'])
+    )
+    if not pids:
+        return {}
+
+    # Version relation of each record and all versions of their concepts
+    relations = dict(
+        (rel.child_id, rel) for rel in PIDRelation.query.filter(
+            PIDRelation.child_id.in_([p.id for p in pids.values()]),
+            PIDRelation.relation_type == version_type,
+        )
+    )
+    parent_ids = set(rel.parent_id for rel in relations.values())
+    parents = dict(
+        (pid.id, pid) for pid in PersistentIdentifier.query.filter(
+            PersistentIdentifier.id.in_(parent_ids))
+    ) if parent_ids else {}
+    siblings = defaultdict(list)
+    if parent_ids:
+        rows = db.session.query(PIDRelation, PersistentIdentifier).join(
+            PersistentIdentifier,
+            PIDRelation.child_id == PersistentIdentifier.id
+        ).filter(
+            PIDRelation.parent_id.in_(parent_ids),
+            PIDRelation.relation_type == version_type,
+        )
+        for rel, child in rows:
+            siblings[rel.parent_id].append((rel.index, child))
+
+    concepts = {}
+    for parent_id, children in siblings.items():
+        # Ordered like the database does, i.e. with NULL indices last
+        registered = [
+            (index, child) for index, child in sorted(
+                children, key=lambda c: (c[0] is None, c[0]))
+            if child.status == PIDStatus.REGISTERED
+        ]
+        indexed = [c for c in registered if c[0] is not None]
+        drafts = [c for c in children if c[0] is not None and
+                  c[1].status == PIDStatus.RESERVED]
+        concepts[parent_id] = dict(
+            registered=[child for _, child in registered],
+            last_child=max(indexed, key=lambda c: c[0])[1]
+            if indexed else None,
+            draft_child=max(drafts, key=lambda c: c[0])[1]
+            if drafts else None,
+        )
+
+    # Deposits of the draft versions
+    draft_ids = [c['draft_child'].id for c in concepts.values()
+                 if c['draft_child'] is not None]
+    draft_deposits = {}
+    if draft_ids:
+        rows = db.session.query(PIDRelation, PersistentIdentifier).join(
+            PersistentIdentifier,
+            PIDRelation.child_id == PersistentIdentifier.id
+        ).filter(
+            PIDRelation.parent_id.in_(draft_ids),
+            PIDRelation.relation_type == draft_type,
+        )
+        draft_deposits = dict((rel.parent_id, pid) for rel, pid in rows)
+
+    result = {}
+    for uuid, pid in pids.items():
+        record = records[uuid]
+        relation = relations.get(pid.id)
+        if relation is None:
+            result[uuid] = (
+                {'version': [{'is_last': True, 'index': 0}, ]}, [])
+            continue
+
+        concept = concepts[relation.parent_id]
+        registered = concept['registered']
+        draft_child = concept['draft_child']
+        if registered:
+            is_last = registered[-1].id == pid.id
+        elif draft_child is not None:
+            is_last = draft_child.id == pid.id
+        else:
+            is_last = True
+        version = {
+            'parent': _dump_pid(parents.get(relation.parent_id)),
+            'is_last': is_last,
+            'index': relation.index,
+            'last_child': _dump_pid(concept['last_child']),
+            'count': len(registered),
+            'draft_child_deposit': _dump_pid(
+                draft_deposits.get(draft_child.id)
+                if draft_child is not None else None),
+        }
+
+        # External DOI records don't have Concept DOI
+        related_identifiers = []
+        if 'conceptdoi' in record:
+            related_identifiers.append({
+                'scheme': 'doi',
+                'relation': 'isVersionOf',
+                'identifier': record['conceptdoi']
+            })
+        result[uuid] = ({'version': [version]}, related_identifiers)
+    return result
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Zenodo.
+# Copyright (C) 2018 CERN.
+#
+# Zenodo is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Zenodo is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Zenodo; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Reusable marshmallow schema instances for dumping records."""
+
+from __future__ import absolute_import, print_function
+
+from threading import local
+
+_plans = local()
+
+
+class DumpPlan(object):
+    """Schema instance prepared once and reused for dumping objects.
+
+    Instantiating a schema deep-copies its declared fields, and each dump of
+    a fresh instance builds again its nested schemas and binds their fields.
+    A plan pays this once per thread and only swaps the context of each dump,
+    in place, so that the nested schemas share it.
+
+    A plan is not thread-safe, see :func:`dump_plan`.
+    """
+
+    def __init__(self, schema_class):
+        """Initialize the plan."""
+        self.schema_class = schema_class
+        self.schema = schema_class()
+        self.context = self.schema.context
+        self.running = False
+
+    def dump(self, obj, context=None):
+        """Serialize object with the schema."""
+        if self.running:
+            # Reentrant dump (e.g. from a schema method), use a new instance.
+            return self.schema_class(context=context).dump(obj).data
+        self.running = True
+        self.context.update(context or {})
+        try:
+            return self.schema.dump(obj).data
+        finally:
+            self.context.clear()
+            self.running = False
+
+
+def dump_plan(schema_class, context=None):
+    """Get the dump plan of a schema class for the current thread.
+
+    Nested schemas only share the context of their parent if it was not
+    empty when they got created, hence dumps with and without a context use
+    different plans.
+
+    :param schema_class: Marshmallow schema class.
+    :param context: Context of the dump.
+    """
+    plans = getattr(_plans, 'plans', None)
+    if plans is None:
+        plans = _plans.plans = {}
+    key = (schema_class, bool(context))
+    if key not in plans:
+        plans[key] = DumpPlan(schema_class)
+    return plans[key]
+
+
+class DumpPlanMixin(object):
+    """Serializer mixin dumping objects with the schema dump plans."""
+
+    def dump(self, obj, context=None):
+        """Serialize object with schema."""
+        return dump_plan(self.schema_class, context).dump(obj, context)
@@ -26,10 +26,18 @@
 
 from __future__ import absolute_import, print_function
 
+from copy import deepcopy
+
+from elasticsearch.exceptions import NotFoundError
+from flask import current_app
+from invenio_search import current_search_client
+from invenio_search.utils import build_alias_name
+
 from zenodo.modules.records.models import ObjectType
 from zenodo.modules.records.serializers.schemas import schemaorg as schemas
 
 from .json import ZenodoJSONSerializer
+from .plans import dump_plan
 
 
 class ZenodoSchemaOrgSerializer(ZenodoJSONSerializer):
@@ -37,8 +45,16 @@ class ZenodoSchemaOrgSerializer(ZenodoJSONSerializer):
 
     Serializes the record using the appropriate marshmallow schema based on
     its schema.org type.
+
+    If ``ZENODO_RECORDS_SCHEMAORG_PRECOMPUTE`` is enabled, the JSON-LD of
+    records is computed when indexing them and stored in the ``_jsonld``
+    field of their documents, from where it is read back as long as the
+    document is of the record's current revision.
     """
 
+    index_field = '_jsonld'
+    """Field of the indexed records where the JSON-LD is stored."""
+
     @classmethod
     def _get_schema_class(self, obj):
         data = obj['metadata']
@@ -50,4 +66,51 @@ class ZenodoSchemaOrgSerializer(ZenodoJSONSerializer):
         # Resolve string "https://schema.org/ScholarlyArticle"
         # to schemas.ScholarlyArticle class (etc.)
         schema_cls = self._get_schema_class(obj)
-        return schema_cls(context=context).dump(obj).data
+        return dump_plan(schema_cls, context).dump(obj, context)
+
+    @staticmethod
+    def _precomputed(stored, revision_id):
+        """Get the stored JSON-LD of a record, unless it is stale."""
+        if stored and revision_id is not None and \
+                stored.get('revision') == revision_id:
+            return stored['data']
+
+    def dump_indexed(self, pid, json, revision_id):
+        """Compute the JSON-LD to store in the index document of a record.
+
+        :param pid: Persistent identifier instance.
+        :param json: Index document of the record.
+        :param revision_id: Revision of the record.
+        """
+        data = super(ZenodoSchemaOrgSerializer, self).transform_search_hit(
+            pid, {'_source': deepcopy(json), '_version': revision_id})
+        return {'revision': revision_id, 'data': data}
+
+    def transform_record(self, pid, record, links_factory=None):
+        """Transform record into an intermediate representation."""
+        if current_app.config['ZENODO_RECORDS_SCHEMAORG_PRECOMPUTE'] and \
+                getattr(record, 'revision_id', None) is not None:
+            try:
+                doc = current_search_client.get(
+                    index=build_alias_name('records'),
+                    id=str(record.id),
+                    params={'_source_includes': self.index_field},
+                )
+                data = self._precomputed(
+                    doc['_source'].get(self.index_field), record.revision_id)
+                if data is not None:
+                    return data
+            except NotFoundError:
+                pass
+        return super(ZenodoSchemaOrgSerializer, self).transform_record(
+            pid, record, links_factory=links_factory)
+
+    def transform_search_hit(self, pid, record_hit, links_factory=None):
+        """Transform search result hit into an intermediate representation."""
+        data = self._precomputed(
+            record_hit['_source'].get(self.index_field),
+            record_hit.get('_version'))
+        if data is not None:
+            return data
+        return super(ZenodoSchemaOrgSerializer, self).transform_search_hit(
+            pid, record_hit, links_factory=links_factory)
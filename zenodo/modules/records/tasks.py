@@ -38,9 +38,11 @@ from invenio_pidstore.providers.datacite import DataCiteProvider
 from invenio_records import Record
 from lxml import etree
 
+from zenodo.modules.records.indexer import ZenodoRecordIndexer, \
+    index_records_relations
 from zenodo.modules.records.models import AccessRight
 from zenodo.modules.records.serializers import datacite_v41
-from zenodo.modules.records.utils import find_registered_doi_pids, xsd41
+from zenodo.modules.records.utils import datacite_xsd, find_registered_doi_pids
 
 
 @shared_task(ignore_result=True)
@@ -52,11 +54,19 @@ def update_expired_embargos():
         record.commit()
     db.session.commit()
 
-    indexer = RecordIndexer()
+    indexer = ZenodoRecordIndexer()
     indexer.bulk_index(record_ids)
     indexer.process_bulk_queue()
 
 
+@shared_task(ignore_result=True)
+def process_bulk_queue(version_type=None, es_bulk_kwargs=None, lane=None):
+    """Process the bulk indexing queue of a lane."""
+    ZenodoRecordIndexer(
+        lane=lane, version_type=version_type).process_bulk_queue(
+            es_bulk_kwargs=es_bulk_kwargs)
+
+
 @shared_task(ignore_result=True, rate_limit='1000/h')
 def update_datacite_metadata(doi, object_uuid, job_id):
     """Update DataCite metadata of a single PersistentIdentifier.
@@ -82,8 +92,7 @@ def update_datacite_metadata(doi, object_uuid, job_id):
 
     doc = datacite_v41.serialize(dcp.pid, record)
 
-    for validator in xsd41():
-        validator.assertValid(etree.XML(doc.encode('utf8')))
+    datacite_xsd('4.1').assertValid(etree.XML(doc.encode('utf8')))
 
     url = None
     if doi == record.get('doi'):
@@ -129,3 +138,10 @@ def schedule_update_datacite_metadata(max_count):
         update_datacite_metadata.delay(doi_pid.pid_value,
                                        str(doi_pid.object_uuid),
                                        task_details['job_id'])
+
+
+@shared_task(ignore_result=True)
+def update_records_relations(record_uuids, with_deposits=True, lane=None):
+    """Update the relations of indexed records (and of their deposits)."""
+    index_records_relations(
+        record_uuids, with_deposits=with_deposits, lane=lane)
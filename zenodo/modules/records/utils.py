@@ -28,6 +28,7 @@
 from __future__ import absolute_import, print_function
 
 from os.path import dirname, join
+from threading import local
 
 from flask import current_app
 from invenio_db import db
@@ -36,6 +37,7 @@ from invenio_pidstore.models import PersistentIdentifier, PIDStatus
 from invenio_records.api import Record
 from invenio_search import current_search
 from lxml import etree
+from six import string_types, text_type
 from sqlalchemy import or_
 from werkzeug.utils import import_string
 
@@ -137,25 +139,65 @@ def find_registered_doi_pids(from_date, until_date, prefixes):
     return query
 
 
-def xsd41():
-    """Load DataCite v4.1 full example as an etree."""
-    from zenodo.modules.records.httpretty_mock import httpretty
+DATACITE_XSD = {
+    '4.1': 'metadata41.xsd',
+}
+"""Bundled DataCite XML schemas, by metadata version."""
 
-    # Ensure the schema validator doesn't make any http requests.
-    with open(join(dirname(__file__), 'data', 'xml.xsd')) as fp:
-        xmlxsd = fp.read()
+_xsd_local = local()
 
-    httpretty.enable()
-    httpretty.register_uri(
-        httpretty.GET,
-        'https://www.w3.org/2009/01/xml.xsd',
-        body=xmlxsd)
 
-    yield etree.XMLSchema(
-        file='file://' + join(dirname(__file__), 'data', 'metadata41.xsd')
+class LocalXSDResolver(etree.Resolver):
+    """Resolve the imported W3C XML schema to the bundled copy."""
+
+    urls = (
+        'http://www.w3.org/2009/01/xml.xsd',
+        'https://www.w3.org/2009/01/xml.xsd',
     )
 
-    httpretty.disable()
+    def resolve(self, url, pubid, context):
+        """Resolve the XML schema URL to the file in the data folder."""
+        if url in self.urls:
+            return self.resolve_filename(
+                join(dirname(__file__), 'data', 'xml.xsd'), context)
+
+
+def datacite_xsd(version='4.1'):
+    """Get the DataCite XML schema validator of the current thread.
+
+    The schema is compiled once per thread from the bundled files, without
+    any network access, since validators can't be shared between threads.
+    """
+    validators = getattr(_xsd_local, 'validators', None)
+    if validators is None:
+        validators = _xsd_local.validators = {}
+    if version not in validators:
+        parser = etree.XMLParser(no_network=True)
+        parser.resolvers.add(LocalXSDResolver())
+        validators[version] = etree.XMLSchema(etree.parse(
+            join(dirname(__file__), 'data', DATACITE_XSD[version]), parser))
+    return validators[version]
+
+
+def validate_datacite(docs, version='4.1'):
+    """Validate many DataCite XML documents.
+
+    :param docs: DataCite XML documents, as strings or element trees.
+    :param version: DataCite metadata version.
+    :returns: The list of the validation errors of each document, empty for
+        the valid ones.
+    """
+    validator = datacite_xsd(version)
+    errors = []
+    for doc in docs:
+        if isinstance(doc, string_types):
+            doc = etree.XML(doc.encode('utf8') if isinstance(doc, text_type)
+                            else doc)
+        if validator.validate(doc):
+            errors.append([])
+        else:
+            errors.append(list(validator.error_log))
+    return errors
 
 
 def build_record_custom_fields(record):
@@ -33,7 +33,8 @@ from operator import itemgetter
 
 import idutils
 import six
-from flask import Blueprint, abort, current_app, render_template, request
+from flask import Blueprint, abort, current_app, jsonify, render_template, \
+    request
 from flask_iiif.restful import IIIFImageAPI
 from flask_principal import ActionNeed
 from flask_security import current_user
@@ -377,8 +378,9 @@ def records_ui_export(pid, record, template=None, **kwargs):
             'zenodo_records/records_export_unsupported.html'), 410
     else:
         serializer = import_string(formats[fmt]['serializer'])
-        # Pretty print if JSON
-        if isinstance(serializer, ZenodoJSONSerializer):
+        # Pretty print if JSON (possibly wrapped by a cached serializer)
+        if isinstance(getattr(serializer, 'serializer', serializer),
+                      ZenodoJSONSerializer):
             json_data = serializer.transform_record(pid, record)
             data = json.dumps(json_data, indent=2, separators=(', ', ': '))
         else:
@@ -483,6 +485,22 @@ def record_thumbnail(pid, record, thumbnail_size, **kwargs):
         abort(404, 'This record has no thumbnails')
 
 
+def record_citations(pid, record, **kwargs):
+    """Render the citation of a record in many styles.
+
+    The styles are given with repeated ``style`` query arguments, e.g.
+    ``?style=apa&style=science&locale=en-US``.
+    """
+    styles = request.args.getlist('style')
+    max_styles = current_app.config['ZENODO_RECORDS_CITATIONS_MAX_STYLES']
+    if not styles or len(styles) > max_styles:
+        abort(400, 'Between 1 and {0} citation styles can be requested.'
+              .format(max_styles))
+    locale = request.args.get('locale') or current_i18n.language
+    return jsonify(citeproc_v1.serialize_styles(
+        pid, record, styles, locale=locale))
+
+
 @pass_extra_formats_mimetype(from_query_string=True, from_accept=True)
 def record_extra_formats(pid, record, mimetype=None, **kwargs):
     """Get extra format."""
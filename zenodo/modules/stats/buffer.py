@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Zenodo.
+# Copyright (C) 2018 CERN.
+#
+# Zenodo is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Zenodo is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Zenodo; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Pre-aggregation of statistics events before queueing."""
+
+from __future__ import absolute_import, print_function
+
+import atexit
+import json
+import threading
+import weakref
+from calendar import timegm
+from collections import OrderedDict
+
+from dateutil.parser import parse as dateutil_parse
+from flask import current_app
+from invenio_stats.proxies import current_stats
+
+
+class EventBuffer(object):
+    """Per-process buffer of statistics events.
+
+    Events of the same type that differ only by their timestamp, inside the
+    same "double-click" window of the event type, are collapsed into the
+    latest one. These are events that the events indexer would deduplicate
+    anyway, so the aggregated statistics (including the counts of unique
+    sessions, which are computed when the events are processed) stay the
+    same. The buffered events are published in batches, when the buffer is
+    full or after a timeout.
+    """
+
+    def __init__(self):
+        """Initialize the buffer."""
+        self._lock = threading.Lock()
+        self._events = {}
+        self._size = 0
+        self._timer = None
+
+    def __len__(self):
+        """Number of buffered events."""
+        return self._size
+
+    @staticmethod
+    def event_key(event_type, event):
+        """Key of the events collapsed together."""
+        params = current_stats.events[event_type].params
+        window = max(params.get('double_click_window', 10), 1)
+        timestamp = dateutil_parse(event['timestamp'])
+        fields = dict((k, v) for k, v in event.items() if k != 'timestamp')
+        return (
+            timegm(timestamp.utctimetuple()) // window,
+            json.dumps(fields, sort_keys=True, default=str),
+        )
+
+    def add(self, event_type, event):
+        """Add an event to the buffer."""
+        app = current_app._get_current_object()
+        key = self.event_key(event_type, event)
+        with self._lock:
+            events = self._events.setdefault(event_type, OrderedDict())
+            if key in events:
+                del events[key]
+            else:
+                self._size += 1
+            events[key] = event
+            full = self._size >= app.config['ZENODO_STATS_EVENTS_BUFFER_SIZE']
+            if not full and self._timer is None:
+                self._timer = threading.Timer(
+                    app.config['ZENODO_STATS_EVENTS_BUFFER_TIMEOUT'],
+                    self.flush_app, args=(app, ))
+                self._timer.daemon = True
+                self._timer.start()
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Publish the buffered events."""
+        with self._lock:
+            buffered, self._events, self._size = self._events, {}, 0
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        for event_type, events in buffered.items():
+            if events:
+                current_stats.publish(event_type, list(events.values()))
+
+    def flush_app(self, app):
+        """Publish the buffered events, outside of an application context."""
+        with app.app_context():
+            try:
+                self.flush()
+            except Exception:
+                app.logger.exception(u'Error publishing buffered events')
+
+
+_buffers = weakref.WeakKeyDictionary()
+"""Event buffers of the applications of the process."""
+
+
+def register_event_buffer(app, buffer):
+    """Publish the events left in an application's buffer at exit.
+
+    Applications are referenced weakly, so that they are not kept alive
+    until the process exits.
+    """
+    _buffers[app] = buffer
+
+
+@atexit.register
+def _flush_event_buffers():
+    """Publish the buffered events of the applications of the process."""
+    for app, buffer in list(_buffers.items()):
+        if len(buffer):
+            buffer.flush_app(app)
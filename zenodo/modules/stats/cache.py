@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Zenodo.
+# Copyright (C) 2018 CERN.
+#
+# Zenodo is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Zenodo is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Zenodo; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Cache of records resolved for statistics events."""
+
+from __future__ import absolute_import, print_function
+
+from collections import namedtuple
+from time import time
+
+from invenio_cache import current_cache
+
+from zenodo.modules.records.serializers.cache import LRUCache
+
+from .proxies import current_stats_record_cache
+
+CachedFile = namedtuple(
+    'CachedFile', ['bucket_id', 'file_id', 'key', 'size', 'version_id'])
+"""File of a cached record."""
+
+
+class CachedRecord(dict):
+    """Metadata of a record, as stored in the resolution cache."""
+
+    def __init__(self, data, id=None, revision_id=None):
+        """Initialize the record."""
+        super(CachedRecord, self).__init__(data)
+        self.id = id
+        self.revision_id = revision_id
+
+    def get_file(self, key):
+        """Get a file of the record by its key."""
+        for f in self.get('_files', []):
+            if f.get('key') == key:
+                return CachedFile(
+                    bucket_id=f.get('bucket'), file_id=f.get('file_id'),
+                    key=key, size=f.get('size'),
+                    version_id=f.get('version_id'))
+        raise KeyError(key)
+
+
+class RecordResolutionCache(object):
+    """Two-tier cache of records resolved by their recid.
+
+    Records are kept for ``local_timeout`` seconds in an in-process LRU
+    cache, in front of the shared application cache (i.e. Redis) where they
+    expire after ``timeout`` seconds. Entries are invalidated when records
+    are updated or deleted (see :py:func:`invalidate_record_receiver`).
+
+    :param prefix: Prefix of the keys in the shared cache.
+    :param max_entries: Maximum number of entries of the in-process cache.
+    :param local_timeout: Timeout of the entries in the in-process cache.
+    :param timeout: Timeout of the entries in the shared cache.
+    :param backend: Shared cache (defaults to the application cache).
+    """
+
+    def __init__(self, prefix='stats:recid', max_entries=1024,
+                 local_timeout=60, timeout=24 * 60 * 60, backend=None):
+        """Initialize cache."""
+        self.prefix = prefix
+        self.local_timeout = local_timeout
+        self.timeout = timeout
+        self.local = LRUCache(max_entries=max_entries)
+        self._backend = backend
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    @property
+    def backend(self):
+        """Get the shared cache."""
+        return current_cache if self._backend is None else self._backend
+
+    @property
+    def counters(self):
+        """Hit and miss counters of this process."""
+        return dict(local_hits=self.local_hits,
+                    shared_hits=self.shared_hits, misses=self.misses)
+
+    def key(self, recid):
+        """Build the shared cache key of a record."""
+        return '{0}:{1}'.format(self.prefix, recid)
+
+    def _set_local(self, records):
+        expires = time() + self.local_timeout
+        for recid, record in records.items():
+            self.local.set(recid, (expires, record))
+
+    def get_records(self, recids, loader):
+        """Get many records by their recid.
+
+        :param recids: Iterable of recid values.
+        :param loader: Function loading the records missing from the cache,
+            returning a dictionary of recid to record.
+        :returns: Dictionary of recid (as a string) to cached record.
+        """
+        result = {}
+        missing = []
+        for recid in set(str(r) for r in recids):
+            entry = self.local.get(recid)
+            if entry is not None and entry[0] > time():
+                self.local_hits += 1
+                result[recid] = entry[1]
+            else:
+                missing.append(recid)
+        if not missing:
+            return result
+
+        shared = {}
+        values = self.backend.get_many(*[self.key(r) for r in missing])
+        for recid, value in zip(missing, values):
+            if value is not None:
+                shared[recid] = CachedRecord(
+                    value['json'], id=value['id'],
+                    revision_id=value['revision_id'])
+        self.shared_hits += len(shared)
+        self._set_local(shared)
+        result.update(shared)
+
+        missing = [r for r in missing if r not in shared]
+        if missing:
+            self.misses += len(missing)
+            loaded = dict(
+                (str(recid), CachedRecord(
+                    record.dumps(), id=str(record.id),
+                    revision_id=record.revision_id))
+                for recid, record in loader(missing).items())
+            if loaded:
+                self.backend.set_many(dict(
+                    (self.key(recid), dict(
+                        id=record.id, revision_id=record.revision_id,
+                        json=dict(record)))
+                    for recid, record in loaded.items()),
+                    timeout=self.timeout)
+                self._set_local(loaded)
+                result.update(loaded)
+        return result
+
+    def get_record(self, recid, loader):
+        """Get a record by its recid.
+
+        :param loader: Function loading the record if it's not cached. Errors
+            (e.g. for deleted records) are propagated.
+        """
+        recid = str(recid)
+        return self.get_records(
+            [recid], lambda _: {recid: loader(recid)})[recid]
+
+    def invalidate(self, recid):
+        """Remove a record from the cache."""
+        recid = str(recid)
+        self.local.delete(recid)
+        self.backend.delete(self.key(recid))
+
+
+def invalidate_record_receiver(sender, record=None, **kwargs):
+    """Invalidate the cached record when it's updated or deleted."""
+    if record is not None and record.get('recid'):
+        current_stats_record_cache.invalidate(record['recid'])
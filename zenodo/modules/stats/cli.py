@@ -26,9 +26,13 @@
 
 import csv
 import glob
+import os
 import re
 import sys
+from collections import OrderedDict
 from datetime import datetime as dt
+from multiprocessing import Pool
+from time import time
 
 import click
 from dateutil.parser import parse as dateutil_parse
@@ -38,6 +42,7 @@ from invenio_stats.proxies import current_stats
 from six.moves import filter, map
 from six.moves.urllib.parse import urlparse
 
+from zenodo.modules.stats.proxies import current_stats_record_cache
 from zenodo.modules.stats.tasks import update_record_statistics
 from zenodo.modules.stats.utils import chunkify, \
     extract_event_record_metadata, fetch_record, fetch_record_file
@@ -83,7 +88,7 @@ def build_record_view_event(data):
     try:
         recid, _ = parse_record_url(data['url'])
         assert recid, 'no recid in url'
-        _, record = fetch_record(recid)
+        record = fetch_record(recid)
     except Exception:
         return
 
@@ -95,7 +100,7 @@ def build_file_download_event(data):
     try:
         recid, filename = parse_record_url(data['url'])
         assert recid and filename, 'no recid and filename in url'
-        _, record = fetch_record(recid)
+        record = fetch_record(recid)
         obj = fetch_record_file(recid, filename)
     except Exception:
         return
@@ -104,7 +109,7 @@ def build_file_download_event(data):
         bucket_id=str(obj.bucket_id),
         file_id=str(obj.file_id),
         file_key=obj.key,
-        size=obj.file.size,
+        size=obj.size,
         **build_common_event(record, data)
     )
 
@@ -115,12 +120,82 @@ EVENT_TYPE_BUILDERS = {
 }
 
 
+def _split_csv_file(path, split_size=None):
+    """Split a CSV file in byte ranges of about ``split_size`` bytes."""
+    size = os.path.getsize(path)
+    if not split_size or size <= split_size:
+        return [(0, None)]
+    return [(start, min(start + split_size, size))
+            for start in range(0, size, split_size)]
+
+
+def _iter_csv_range(fp, start, end):
+    """Iterate the lines of a file starting inside a byte range.
+
+    Lines are assigned to the range they start in. Note that rows with
+    quoted line breaks can't be split in ranges.
+    """
+    if start > 0:
+        fp.seek(start - 1)
+        fp.readline()
+    while end is None or fp.tell() < end:
+        line = fp.readline()
+        if not line:
+            return
+        yield line.decode('utf-8') if PY3 else line
+
+
+def _import_csv_range(args):
+    """Import the events of a byte range of a CSV file."""
+    event_type, csv_path, start, end, chunk_size = args
+    summary = dict(path=csv_path, rows=0, events=0, skipped=0, failed=0)
+    counters = current_stats_record_cache.counters
+    begin = time()
+    try:
+        with open(csv_path, 'rb') as fp:
+            header = fp.readline()
+            fieldnames = next(csv.reader(
+                [header.decode('utf-8') if PY3 else header]))
+            rows = csv.DictReader(
+                _iter_csv_range(fp, max(start, len(header)), end),
+                fieldnames=fieldnames, delimiter=',')
+            builder = EVENT_TYPE_BUILDERS[event_type]
+            for row_chunk in chunkify(rows, chunk_size):
+                events = list(filter(None, map(builder, row_chunk)))
+                summary['rows'] += len(row_chunk)
+                summary['skipped'] += len(row_chunk) - len(events)
+                try:
+                    if events:
+                        current_stats.publish(event_type, events)
+                    summary['events'] += len(events)
+                except Exception:
+                    summary['failed'] += len(events)
+    except Exception as exc:
+        summary['error'] = str(exc)
+    summary['time'] = time() - begin
+    summary['cache'] = dict(
+        (k, v - counters[k])
+        for k, v in current_stats_record_cache.counters.items())
+    return summary
+
+
+def _init_import_worker():
+    """Initialize a worker process of the parallel import."""
+    from zenodo.factory import create_app
+    create_app().app_context().push()
+
+
 @stats.command('import')
 @click.argument('event-type', type=click.Choice(EVENT_TYPE_BUILDERS.keys()))
 @click.argument('csv-dir', type=click.Path(file_okay=False, resolve_path=True))
-@click.option('--chunk-size', '-s', type=int, default=100)
+@click.option('--chunk-size', '-s', type=int, default=100,
+              help='Number of events published at once.')
+@click.option('--workers', '-w', type=int, default=1,
+              help='Number of worker processes.')
+@click.option('--split-size', type=int, default=None,
+              help='Split files larger than this (in MB) across workers.')
 @with_appcontext
-def import_events(event_type, csv_dir, chunk_size):
+def import_events(event_type, csv_dir, chunk_size, workers, split_size):
     r"""Import stats events from a directory of CSV files.
 
     Available event types: "file-download", "record-view"
@@ -133,16 +208,57 @@ def import_events(event_type, csv_dir, chunk_size):
     - url ("https://zenodo.org/record/1234/files/article.pdf")
     - timestamp (1388506249)
     - referrer ("Google", "example.com", etc)
+
+    With more than one worker, files (or byte ranges of files larger than
+    the split size) are imported in parallel by a pool of processes, each
+    with its own application and record resolution cache.
     """
-    csv_files = glob.glob(csv_dir + '/*.csv')
-    with click.progressbar(csv_files, len(csv_files)) as csv_files_bar:
-        for csv_path in csv_files_bar:
-            with open(csv_path, 'r' if PY3 else 'rb') as fp:
-                reader = csv.DictReader(fp, delimiter=',')
-                events = filter(
-                    None, map(EVENT_TYPE_BUILDERS[event_type], reader))
-                for event_chunk in chunkify(events, chunk_size):
-                    current_stats.publish(event_type, event_chunk)
+    csv_files = sorted(glob.glob(csv_dir + '/*.csv'))
+    tasks = [
+        (event_type, csv_path, start, end, chunk_size)
+        for csv_path in csv_files
+        for start, end in _split_csv_file(
+            csv_path, split_size and split_size * 1024 * 1024)
+    ]
+
+    summaries = OrderedDict(
+        (csv_path, dict(rows=0, events=0, skipped=0, failed=0, time=0))
+        for csv_path in csv_files)
+    cache_counters = dict(local_hits=0, shared_hits=0, misses=0)
+    begin = time()
+    pool = Pool(workers, _init_import_worker) if workers > 1 else None
+    try:
+        results = pool.imap_unordered(_import_csv_range, tasks) \
+            if pool else map(_import_csv_range, tasks)
+        with click.progressbar(results, len(tasks)) as results_bar:
+            for result in results_bar:
+                summary = summaries[result['path']]
+                for k in ('rows', 'events', 'skipped', 'failed', 'time'):
+                    summary[k] += result[k]
+                for k, v in result['cache'].items():
+                    cache_counters[k] += v
+                if 'error' in result:
+                    summary.setdefault('errors', []).append(result['error'])
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+    elapsed = time() - begin
+
+    for csv_path, summary in summaries.items():
+        click.echo(
+            '{0}: {rows} rows, {events} events, {skipped} skipped, '
+            '{failed} failed ({1:.0f} rows/s)'.format(
+                os.path.basename(csv_path),
+                summary['rows'] / (summary['time'] or 1), **summary))
+        for error in summary.get('errors', []):
+            click.secho('  {0}'.format(error), fg='red')
+    total_rows = sum(s['rows'] for s in summaries.values())
+    click.echo('Total: {0} rows in {1:.1f}s ({2:.0f} rows/s)'.format(
+        total_rows, elapsed, total_rows / (elapsed or 1)))
+    click.echo(
+        'Record cache: {local_hits} local hits, {shared_hits} shared hits, '
+        '{misses} misses'.format(**cache_counters))
     click.secho(
         'Run the "invenio_stats.tasks.process_events" to index the events...',
         fg='yellow')
@@ -28,7 +28,9 @@ ZENODO_STATS_PIWIK_EXPORTER = {
     'id_site': 1,
     'url': 'https://analytics.openaire.eu/piwik.php',
     'token_auth': 'api-token',
-    'chunk_size': 50  # [max piwik payload size = 64k] / [max querystring size = 750]
+    'chunk_size': 50,  # [max piwik payload size = 64k] / [max querystring size = 750]
+    'max_in_flight': 4,  # concurrent chunk uploads
+    'timeout': 60,
 }
 
 ZENODO_STATS_PIWIK_EXPORT_ENABLED = True
@@ -36,3 +38,33 @@ ZENODO_STATS_PIWIK_EXPORT_ENABLED = True
 # Queries performed when processing aggregations might take more time than
 # usual. This is fine though, since this is happening during Celery tasks.
 ZENODO_STATS_ELASTICSEARCH_CLIENT_CONFIG = {'timeout': 60}
+
+#: Number of records enqueued together when updating records' statistics.
+ZENODO_STATS_UPDATE_CHUNK_SIZE = 1000
+
+#: Seconds for which cached record statistics are considered fresh.
+ZENODO_STATS_CACHE_TIMEOUT = 60 * 60
+
+#: Seconds after which a lock for refreshing record statistics expires.
+ZENODO_STATS_CACHE_LOCK_TIMEOUT = 10
+
+#: Times to wait (50ms each) for another client to fetch record statistics.
+ZENODO_STATS_CACHE_WAIT_RETRIES = 4
+
+#: Pre-aggregate statistics events in each process before queueing them.
+ZENODO_STATS_EVENTS_BUFFER_ENABLED = False
+
+#: Number of buffered events after which they are queued.
+ZENODO_STATS_EVENTS_BUFFER_SIZE = 500
+
+#: Seconds after which buffered events are queued.
+ZENODO_STATS_EVENTS_BUFFER_TIMEOUT = 5
+
+#: Number of records cached in each process for statistics events.
+ZENODO_STATS_RECORD_CACHE_SIZE = 1024
+
+#: Seconds for which records are cached in each process.
+ZENODO_STATS_RECORD_CACHE_LOCAL_TIMEOUT = 60
+
+#: Seconds for which records are cached in the shared cache.
+ZENODO_STATS_RECORD_CACHE_TIMEOUT = 24 * 60 * 60
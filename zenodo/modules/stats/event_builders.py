@@ -24,9 +24,15 @@
 
 """Statistics events builders."""
 
+from functools import partial
+
+from flask import current_app
+
 from zenodo.modules.records.utils import is_deposit
 
-from .utils import extract_event_record_metadata, get_record_from_context
+from .proxies import current_stats_event_buffer
+from .utils import extract_event_record_metadata, fetch_record, \
+    get_record_from_context
 
 
 def skip_deposit(event, sender_app, **kwargs):
@@ -39,8 +45,35 @@ def skip_deposit(event, sender_app, **kwargs):
 
 
 def add_record_metadata(event, sender_app, **kwargs):
-    """Add Zenodo-specific record fields to the event."""
+    """Add Zenodo-specific record fields to the event.
+
+    Events of records that can't be resolved are still emitted, with only
+    the fields already known, and the failure is logged.
+    """
     record = get_record_from_context(**kwargs)
+    if record is None and event.get('pid_type') == 'recid':
+        try:
+            record = fetch_record(event['pid_value'])
+        except Exception:
+            current_app.logger.warning(
+                'Could not resolve the record of a stats event.',
+                extra={'pid_value': event['pid_value']}, exc_info=True)
     if record:
         event.update(extract_event_record_metadata(record))
     return event
+
+
+def buffer_event(event_type, event, sender_app, **kwargs):
+    """Buffer the event for pre-aggregation, instead of queueing it.
+
+    Has to be the last builder of an event type, since the event is only
+    passed on if buffering is disabled.
+    """
+    if not current_app.config['ZENODO_STATS_EVENTS_BUFFER_ENABLED']:
+        return event
+    current_stats_event_buffer.add(event_type, event)
+    return None
+
+
+buffer_file_download_event = partial(buffer_event, 'file-download')
+buffer_record_view_event = partial(buffer_event, 'record-view')
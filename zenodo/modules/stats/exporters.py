@@ -25,24 +25,48 @@
 """Zenodo stats exporters."""
 
 import json
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, \
+    ThreadPoolExecutor, wait
 
 import requests
 from dateutil.parser import parse as dateutil_parse
 from elasticsearch_dsl import Search
 from flask import current_app
 from invenio_cache import current_cache
-from invenio_pidstore.errors import PIDDeletedError
 from invenio_search import current_search_client
 from invenio_search.utils import build_alias_name
+from requests.adapters import HTTPAdapter
 from six.moves.urllib.parse import urlencode
 
 from zenodo.modules.records.serializers.schemas.common import ui_link_for
 from zenodo.modules.stats.errors import PiwikExportRequestError
-from zenodo.modules.stats.utils import chunkify, fetch_record
+from zenodo.modules.stats.utils import chunkify, fetch_records
 
 
 class PiwikExporter:
-    """Events exporter."""
+    """Events exporter.
+
+    Chunks of events are uploaded concurrently (up to ``max_in_flight`` at a
+    time), over a pooled HTTP session. The bookmark is only advanced past
+    chunks for which all the previous chunks were acknowledged as well.
+
+    Events of records that can't be resolved (e.g. deleted records) are not
+    exported. They are logged per chunk and counted in ``skipped``.
+    """
+
+    def __init__(self, session=None):
+        """Initialize the exporter."""
+        self._session = session
+        self.skipped = 0
+
+    def session(self, pool_size):
+        """HTTP session for the uploads."""
+        if self._session is None:
+            self._session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            self._session.mount('http://', adapter)
+            self._session.mount('https://', adapter)
+        return self._session
 
     def run(self, start_date=None, end_date=None, update_bookmark=True):
         """Run export job."""
@@ -69,59 +93,120 @@ class PiwikExporter:
             {'timestamp': {'order': 'asc'}}
         ).params(preserve_order=True).scan()
 
-        url = current_app.config['ZENODO_STATS_PIWIK_EXPORTER'].get('url', None)
-        token_auth = current_app.config['ZENODO_STATS_PIWIK_EXPORTER'] \
-            .get('token_auth', None)
-        chunk_size = current_app.config['ZENODO_STATS_PIWIK_EXPORTER']\
-            .get('chunk_size', 0)
-
-        for event_chunk in chunkify(events, chunk_size):
-            query_strings = []
-            for event in event_chunk:
-                if 'recid' not in event:
+        config = current_app.config['ZENODO_STATS_PIWIK_EXPORTER']
+        url = config.get('url', None)
+        token_auth = config.get('token_auth', None)
+        chunk_size = config.get('chunk_size', 0)
+        max_in_flight = config.get('max_in_flight', 1)
+        timeout = config.get('timeout', None)
+        session = self.session(max_in_flight)
+
+        self._update_bookmark = update_bookmark
+        self._in_flight = {}
+        self._acknowledged = {}
+        self._next_chunk = 0
+        self._errors = []
+        self.skipped = 0
+
+        with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+            for index, event_chunk in enumerate(chunkify(events, chunk_size)):
+                query_strings = self._build_query_strings(event_chunk)
+                if not query_strings:
+                    self._acknowledged[index] = event_chunk[-1].timestamp
                     continue
-                try:
-                    query_string = self._build_query_string(event)
-                    query_strings.append(query_string)
-                except PIDDeletedError:
-                    pass
-
-            payload = {
-                'requests': query_strings,
-                'token_auth': token_auth
-            }
 
-            res = requests.post(url, json=payload)
-
-            # Failure: not 200 or not "success"
-            content = res.json() if res.ok else None
-            if res.status_code == 200 and content.get('status') == 'success':
-                if content.get('invalid') != 0:
-                    msg = 'Invalid events in Piwik export request.'
-                    info = {
-                        'begin_event_timestamp': event_chunk[0].timestamp,
-                        'end_event_timestamp': event_chunk[-1].timestamp,
-                        'invalid_events': content.get('invalid')
-                    }
-                    current_app.logger.warning(msg, extra=info)
-                elif update_bookmark is True:
-                    current_cache.set('piwik_export:bookmark',
-                                      event_chunk[-1].timestamp,
-                                      timeout=-1)
-            else:
+                payload = {
+                    'requests': query_strings,
+                    'token_auth': token_auth
+                }
+                future = executor.submit(
+                    session.post, url, json=payload, timeout=timeout)
+                self._in_flight[future] = (index, event_chunk)
+                if len(self._in_flight) >= max_in_flight:
+                    self._collect(FIRST_COMPLETED)
+                if self._errors:
+                    break
+            self._collect(ALL_COMPLETED)
+
+        if self._errors:
+            raise min(self._errors, key=lambda e: e[0])[1]
+
+    def _collect(self, return_when):
+        """Collect finished uploads and advance the bookmark."""
+        finished, _ = wait(list(self._in_flight), return_when=return_when)
+        for future in finished:
+            index, event_chunk = self._in_flight.pop(future)
+            try:
+                self._acknowledged[index] = self._check_response(
+                    future.result(), event_chunk)
+            except Exception as exc:
+                self._errors.append((index, exc))
+
+        bookmark = None
+        while self._next_chunk in self._acknowledged:
+            bookmark = self._acknowledged.pop(self._next_chunk) or bookmark
+            self._next_chunk += 1
+        if bookmark and self._update_bookmark is True:
+            current_cache.set('piwik_export:bookmark', bookmark, timeout=-1)
+
+    def _check_response(self, res, event_chunk):
+        """Check an upload's response.
+
+        :returns: The chunk's bookmark, or ``None`` if it had invalid events.
+        """
+        # Failure: not 200 or not "success"
+        content = res.json() if res.ok else None
+        if res.status_code == 200 and content.get('status') == 'success':
+            if content.get('invalid') != 0:
                 msg = 'Invalid events in Piwik export request.'
                 info = {
                     'begin_event_timestamp': event_chunk[0].timestamp,
                     'end_event_timestamp': event_chunk[-1].timestamp,
+                    'invalid_events': content.get('invalid')
                 }
-                raise PiwikExportRequestError(msg, export_info=info)
+                current_app.logger.warning(msg, extra=info)
+                return None
+            return event_chunk[-1].timestamp
+        else:
+            msg = 'Invalid events in Piwik export request.'
+            info = {
+                'begin_event_timestamp': event_chunk[0].timestamp,
+                'end_event_timestamp': event_chunk[-1].timestamp,
+            }
+            raise PiwikExportRequestError(msg, export_info=info)
+
+    def _build_query_strings(self, event_chunk):
+        """Build the query strings of a chunk of events."""
+        records = fetch_records(
+            event.recid for event in event_chunk if 'recid' in event)
+        query_strings = []
+        skipped = []
+        for event in event_chunk:
+            record = records.get(str(event.recid)) \
+                if 'recid' in event else None
+            # Skip events without or of deleted records
+            if record is not None:
+                query_strings.append(self._build_query_string(event, record))
+            else:
+                skipped.append(event)
+        if skipped:
+            self.skipped += len(skipped)
+            msg = 'Skipped events of unresolved records in Piwik export.'
+            info = {
+                'begin_event_timestamp': event_chunk[0].timestamp,
+                'end_event_timestamp': event_chunk[-1].timestamp,
+                'skipped_events': len(skipped),
+                'recids': sorted(set(
+                    str(e.recid) for e in skipped if 'recid' in e)),
+            }
+            current_app.logger.warning(msg, extra=info)
+        return query_strings
 
-    def _build_query_string(self, event):
+    def _build_query_string(self, event, record):
         id_site = current_app.config['ZENODO_STATS_PIWIK_EXPORTER']\
             .get('id_site', None)
         url = ui_link_for('record_html', id=event.recid)
         visitor_id = event.visitor_id[0:16]
-        _, record = fetch_record(event.recid)
         oai = record.get('_oai', {}).get('id')
         cvar = json.dumps({'1': ['oaipmhID', oai]})
         action_name = record.get('title')[:150]  # max 150 characters
@@ -29,9 +29,12 @@ from __future__ import absolute_import, print_function
 from elasticsearch import Elasticsearch
 from elasticsearch.connection import RequestsHttpConnection
 from flask import current_app
+from invenio_records.signals import after_record_delete, after_record_update
 from werkzeug.utils import cached_property
 
 from . import config
+from .buffer import EventBuffer, register_event_buffer
+from .cache import RecordResolutionCache, invalidate_record_receiver
 
 
 class ZenodoStats(object):
@@ -62,4 +65,13 @@ class ZenodoStats(object):
     def init_app(self, app):
         """Flask application initialization."""
         self.init_config(app)
+        self.event_buffer = EventBuffer()
+        register_event_buffer(app, self.event_buffer)
+        config = app.config
+        self.record_cache = RecordResolutionCache(
+            max_entries=config['ZENODO_STATS_RECORD_CACHE_SIZE'],
+            local_timeout=config['ZENODO_STATS_RECORD_CACHE_LOCAL_TIMEOUT'],
+            timeout=config['ZENODO_STATS_RECORD_CACHE_TIMEOUT'])
+        after_record_update.connect(invalidate_record_receiver, sender=app)
+        after_record_delete.connect(invalidate_record_receiver, sender=app)
         app.extensions['zenodo-stats'] = self
@@ -32,3 +32,11 @@ from werkzeug.local import LocalProxy
 current_stats_search_client = LocalProxy(
     lambda: current_app.extensions['zenodo-stats'].search_client)
 """Proxy to Elasticsearch client used for statistics queries."""
+
+current_stats_event_buffer = LocalProxy(
+    lambda: current_app.extensions['zenodo-stats'].event_buffer)
+"""Proxy to the buffer of statistics events of the current process."""
+
+current_stats_record_cache = LocalProxy(
+    lambda: current_app.extensions['zenodo-stats'].record_cache)
+"""Proxy to the cache of records resolved for statistics."""
@@ -30,12 +30,12 @@ from celery import shared_task
 from dateutil.parser import parse as dateutil_parse
 from elasticsearch_dsl import Index, Search
 from flask import current_app
-from invenio_indexer.api import RecordIndexer
-from invenio_pidrelations.contrib.versioning import PIDVersioning
-from invenio_pidstore.models import PersistentIdentifier
 from invenio_stats import current_stats
 
+from zenodo.modules.records.indexer import bulk_partial_index
 from zenodo.modules.stats.exporters import PiwikExporter
+from zenodo.modules.stats.utils import build_records_stats, \
+    cache_records_stats, chunkify, iter_concepts_children
 
 
 @shared_task(ignore_result=True)
@@ -91,12 +91,23 @@ def update_record_statistics(start_date=None, end_date=None):
         ).source(include='conceptrecid')
         conceptrecids |= {b.conceptrecid for b in query.scan()}
 
-    indexer = RecordIndexer()
-    for concpetrecid_val in conceptrecids:
-        conceptrecid = PersistentIdentifier.get('recid', concpetrecid_val)
-        pv = PIDVersioning(parent=conceptrecid)
-        children_recids = pv.children.all()
-        indexer.bulk_index([str(p.object_uuid) for p in children_recids])
+    chunk_size = current_app.config['ZENODO_STATS_UPDATE_CHUNK_SIZE']
+    children = iter_concepts_children(
+        conceptrecids, chunk_size=chunk_size, with_pids=True)
+    bulk_partial_index(
+        _iter_stats_updates(children, chunk_size), chunk_size=chunk_size)
+
+
+def _iter_stats_updates(children, chunk_size):
+    """Build the "_stats" of records in batches."""
+    for chunk in chunkify(children, chunk_size):
+        stats = build_records_stats(
+            (recid, conceptrecid) for _, recid, conceptrecid in chunk)
+        records_stats = dict(
+            (uuid, stats[str(recid)]) for uuid, recid, _ in chunk)
+        cache_records_stats(records_stats)
+        for uuid, record_stats in records_stats.items():
+            yield uuid, {'_stats': record_stats}
 
 
 @shared_task(ignore_result=True, max_retries=3, default_retry_delay=60 * 60)
@@ -25,20 +25,27 @@
 """Statistics utilities."""
 
 import itertools
+from time import sleep, time
 
 from elasticsearch.exceptions import NotFoundError
-from flask import request
+from elasticsearch_dsl import Search
+from flask import current_app, request
+from invenio_cache import current_cache
+from invenio_db import db
+from invenio_pidrelations.models import PIDRelation
+from invenio_pidrelations.utils import resolve_relation_type_config
+from invenio_pidstore.models import PersistentIdentifier, PIDStatus
+from invenio_records.models import RecordMetadata
 from invenio_search.api import RecordsSearch
 from invenio_search.proxies import current_search_client
 from invenio_search.utils import build_alias_name
 from invenio_stats import current_stats
+from sqlalchemy.orm import aliased
 
+from zenodo.modules.records.api import ZenodoRecord
 from zenodo.modules.records.resolvers import record_resolver
 
-try:
-    from functools import lru_cache
-except ImportError:
-    from functools32 import lru_cache
+from .proxies import current_stats_record_cache
 
 
 def get_record_from_context(**kwargs):
@@ -66,46 +73,50 @@ def extract_event_record_metadata(record):
     )
 
 
-def build_record_stats(recid, conceptrecid):
-    """Build the record's stats."""
-    stats = {}
-    stats_sources = {
-        'record-view': {
-            'params': {'recid': recid},
-            'fields': {
-                'views': 'count',
-                'unique_views': 'unique_count',
-            },
+RECORD_STATS_SOURCES = {
+    'record-view': {
+        'param': 'recid',
+        'fields': {
+            'views': 'count',
+            'unique_views': 'unique_count',
         },
-        'record-download': {
-            'params': {'recid': recid},
-            'fields': {
-                'downloads': 'count',
-                'unique_downloads': 'unique_count',
-                'volume': 'volume',
-            },
+    },
+    'record-download': {
+        'param': 'recid',
+        'fields': {
+            'downloads': 'count',
+            'unique_downloads': 'unique_count',
+            'volume': 'volume',
         },
-        'record-view-all-versions': {
-            'params': {'conceptrecid': conceptrecid},
-            'fields': {
-                'version_views': 'count',
-                'version_unique_views': 'unique_count',
-            }
+    },
+    'record-view-all-versions': {
+        'param': 'conceptrecid',
+        'fields': {
+            'version_views': 'count',
+            'version_unique_views': 'unique_count',
+        }
+    },
+    'record-download-all-versions': {
+        'param': 'conceptrecid',
+        'fields': {
+            'version_downloads': 'count',
+            'version_unique_downloads': 'unique_count',
+            'version_volume': 'volume',
         },
-        'record-download-all-versions': {
-            'params': {'conceptrecid': conceptrecid},
-            'fields': {
-                'version_downloads': 'count',
-                'version_unique_downloads': 'unique_count',
-                'version_volume': 'volume',
-            },
-        },
-    }
-    for query_name, cfg in stats_sources.items():
+    },
+}
+"""Stats queries and the fields they provide for a record's "_stats"."""
+
+
+def build_record_stats(recid, conceptrecid):
+    """Build the record's stats."""
+    stats = {}
+    params = dict(recid=recid, conceptrecid=conceptrecid)
+    for query_name, cfg in RECORD_STATS_SOURCES.items():
         try:
             query_cfg = current_stats.queries[query_name]
             query = query_cfg.cls(name=query_name, **query_cfg.params)
-            result = query.run(**cfg['params'])
+            result = query.run(**{cfg['param']: params[cfg['param']]})
             for dst, src in cfg['fields'].items():
                 stats[dst] = result.get(src)
         except Exception:
@@ -113,7 +124,68 @@ def build_record_stats(recid, conceptrecid):
     return stats
 
 
-def get_record_stats(recordid, throws=True):
+def _run_batch_stats_query(query_name, param, values):
+    """Run a stats query for many values with a single terms aggregation.
+
+    Works like running the ``ESTermsQuery`` once for each of the values
+    (without a time range), but in one Elasticsearch request.
+
+    :returns: Dictionary of value to metrics.
+    """
+    query_cfg = current_stats.queries[query_name]
+    query = query_cfg.cls(name=query_name, **query_cfg.params)
+    field = query.required_filters[param]
+    search = Search(using=query.client, index=query.index)[0:0]
+    for modifier in query.query_modifiers:
+        search = modifier(search, **{param: values})
+    search = search.filter('terms', **{field: list(values)})
+    agg = search.aggs.bucket('values', 'terms', field=field, size=len(values))
+    for dst, (metric, metric_field, opts) in query.metric_fields.items():
+        agg.metric(dst, metric, field=metric_field, **opts)
+    result = search.execute()
+
+    # Values without any events have zero metrics
+    metrics = dict((value, dict((dst, 0.0) for dst in query.metric_fields))
+                   for value in values)
+    for bucket in result.aggregations['values'].buckets:
+        metrics[str(bucket.key)] = dict(
+            (dst, bucket[dst].value) for dst in query.metric_fields)
+    return metrics
+
+
+def build_records_stats(records):
+    """Build the stats of many records, e.g. of a bulk indexing batch.
+
+    Instead of one query per record and stats query (see
+    :py:func:`build_record_stats`), a single terms aggregation is executed
+    for each stats query. If a batch query fails, the stats of the records
+    are built one by one.
+
+    :param records: Iterable of ``(recid, conceptrecid)`` tuples.
+    :returns: Dictionary of recid to record stats.
+    """
+    records = [(str(recid), str(conceptrecid) if conceptrecid else None)
+               for recid, conceptrecid in records]
+    stats = dict((recid, {}) for recid, _ in records)
+    for query_name, cfg in RECORD_STATS_SOURCES.items():
+        index = 0 if cfg['param'] == 'recid' else 1
+        values = set(r[index] for r in records if r[index])
+        if not values:
+            continue
+        try:
+            metrics = _run_batch_stats_query(query_name, cfg['param'], values)
+        except Exception:
+            return dict((recid, build_record_stats(recid, conceptrecid))
+                        for recid, conceptrecid in records)
+        for record in records:
+            if record[index]:
+                result = metrics[record[index]]
+                for dst, src in cfg['fields'].items():
+                    stats[record[0]][dst] = result.get(src)
+    return stats
+
+
+def _fetch_record_stats(recordid):
     """Fetch record statistics from Elasticsearch."""
     try:
         res = current_search_client.get(
@@ -124,10 +196,64 @@ def get_record_stats(recordid, throws=True):
         return res['_source']['_stats']
     except NotFoundError:
         return None
+
+
+def record_stats_cache_key(recordid):
+    """Cache key of the record statistics."""
+    return 'stats:record:{0}'.format(recordid)
+
+
+def cache_records_stats(stats):
+    """Store the statistics of records in the cache.
+
+    Entries are considered fresh for ``ZENODO_STATS_CACHE_TIMEOUT`` seconds
+    and are kept for as long again, to be served while being refreshed.
+
+    :param stats: Dictionary of record UUID to record statistics.
+    """
+    timeout = current_app.config['ZENODO_STATS_CACHE_TIMEOUT']
+    expires = time() + timeout
+    current_cache.set_many(
+        dict((record_stats_cache_key(uuid), (expires, record_stats))
+             for uuid, record_stats in stats.items()),
+        timeout=2 * timeout)
+
+
+def get_record_stats(recordid, throws=True):
+    """Fetch record statistics, from the cache or Elasticsearch.
+
+    Only one client at a time refreshes an expired (or missing) entry, while
+    the others keep serving the expired value (or wait shortly for it).
+    """
+    key = record_stats_cache_key(recordid)
+    lock_key = key + ':lock'
+    lock_timeout = current_app.config['ZENODO_STATS_CACHE_LOCK_TIMEOUT']
+    try:
+        cached = current_cache.get(key)
+        if cached is None:
+            retries = current_app.config['ZENODO_STATS_CACHE_WAIT_RETRIES']
+            while not current_cache.add(lock_key, 1, timeout=lock_timeout):
+                if retries <= 0:
+                    return _fetch_record_stats(recordid)
+                retries -= 1
+                sleep(0.05)
+                cached = current_cache.get(key)
+                if cached is not None:
+                    return cached[1]
+        elif cached[0] > time() or \
+                not current_cache.add(lock_key, 1, timeout=lock_timeout):
+            return cached[1]
+
+        try:
+            stats = _fetch_record_stats(recordid)
+            if stats is not None:
+                cache_records_stats({recordid: stats})
+            return stats
+        finally:
+            current_cache.delete(lock_key)
     except Exception:
         if throws:
             raise
-        pass
 
 
 def chunkify(iterable, n):
@@ -140,14 +266,78 @@ def chunkify(iterable, n):
         yield chunk
 
 
-@lru_cache(maxsize=1024)
+def iter_concepts_children(conceptrecids, chunk_size=1000, with_pids=False):
+    """Iterate the record UUIDs of all versions of many concepts.
+
+    Resolves the children of all concepts with a single query over the
+    version relations, instead of one ``PIDVersioning`` query per concept.
+
+    :param conceptrecids: Iterable of concept recid values.
+    :param chunk_size: Number of rows fetched at a time.
+    :param with_pids: Yield ``(uuid, recid, conceptrecid)`` tuples instead.
+    :returns: Generator of unique record UUID strings.
+    """
+    conceptrecids = set(str(c) for c in conceptrecids)
+    if not conceptrecids:
+        return
+    parent = aliased(PersistentIdentifier)
+    child = aliased(PersistentIdentifier)
+    query = db.session.query(
+        child.object_uuid, child.pid_value, parent.pid_value
+    ).join(
+        PIDRelation, PIDRelation.child_id == child.id
+    ).join(
+        parent, PIDRelation.parent_id == parent.id
+    ).filter(
+        PIDRelation.relation_type ==
+        resolve_relation_type_config('version').id,
+        parent.pid_type == 'recid',
+        parent.pid_value.in_(sorted(conceptrecids)),
+        child.status == PIDStatus.REGISTERED,
+        child.object_uuid.isnot(None),
+    ).distinct().yield_per(chunk_size)
+
+    seen = set()
+    for uuid, recid, conceptrecid in query:
+        uuid = str(uuid)
+        if uuid not in seen:
+            seen.add(uuid)
+            yield (uuid, recid, conceptrecid) if with_pids else uuid
+
+
+def _load_records(recids):
+    """Load many records by their recid, with a single query."""
+    rows = db.session.query(
+        PersistentIdentifier.pid_value, RecordMetadata
+    ).join(
+        RecordMetadata, RecordMetadata.id == PersistentIdentifier.object_uuid
+    ).filter(
+        PersistentIdentifier.pid_type == 'recid',
+        PersistentIdentifier.pid_value.in_(sorted(recids)),
+        PersistentIdentifier.status == PIDStatus.REGISTERED,
+        PersistentIdentifier.object_type == 'rec',
+    )
+    return dict((recid, ZenodoRecord(model.json, model=model))
+                for recid, model in rows)
+
+
+def fetch_records(recids):
+    """Fetch many records by their recid, through the record cache.
+
+    Records that are deleted or don't exist are left out.
+
+    :param recids: Iterable of recid values.
+    :returns: Dictionary of recid (as a string) to cached record.
+    """
+    return current_stats_record_cache.get_records(recids, _load_records)
+
+
 def fetch_record(recid):
     """Cached record fetch."""
-    return record_resolver.resolve(recid)
+    return current_stats_record_cache.get_record(
+        recid, lambda r: record_resolver.resolve(r)[1])
 
 
-@lru_cache(maxsize=1024)
 def fetch_record_file(recid, filename):
     """Cached record file fetch."""
-    _, record = fetch_record(recid)
-    return record.files[filename].obj
+    return fetch_record(recid).get_file(filename)
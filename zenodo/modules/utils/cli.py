@@ -31,6 +31,7 @@ import os
 from io import SEEK_END, SEEK_SET
 
 import click
+from flask import current_app
 from flask.cli import with_appcontext
 from invenio_db import db
 from invenio_files_rest.models import ObjectVersion
@@ -40,6 +41,7 @@ from invenio_records.models import RecordMetadata
 
 from zenodo.modules.deposit.resolvers import deposit_resolver
 from zenodo.modules.deposit.tasks import datacite_register
+from zenodo.modules.records.indexer import ZenodoRecordIndexer
 from zenodo.modules.records.resolvers import record_resolver
 
 from .grants import OpenAIREGrantsDump
@@ -404,3 +406,15 @@ def update_openaire_communities(path):
         unresolved_communities, indent=4, separators=(', ', ': '))))
     click.secho('{0}'.format(json.dumps(mapping, indent=4,
                                         separators=(', ', ': '))), fg='blue')
+
+
+@utils.command('indexer_queues')
+@with_appcontext
+def indexer_queues():
+    """Show the depth and lag of the bulk indexing lanes."""
+    for lane in current_app.config['ZENODO_RECORDS_INDEXER_LANES']:
+        stats = ZenodoRecordIndexer(lane=lane).queue_stats()
+        lag = ('{0:.1f}s'.format(stats['lag']) if stats['lag'] is not None
+               else 'n/a')
+        click.secho('{0}: {1} queued, lag {2}'.format(
+            lane, stats['depth'], lag), fg='blue')
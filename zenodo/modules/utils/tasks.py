@@ -34,7 +34,6 @@ from flask import current_app
 from flask_mail import Message
 from invenio_db import db
 from invenio_files_rest.models import FileInstance
-from invenio_indexer.api import RecordIndexer
 from invenio_oaiserver.minters import oaiid_minter
 from invenio_oaiserver.models import OAISet
 from invenio_oaiserver.query import OAIServerSearch
@@ -44,6 +43,7 @@ from invenio_records.api import Record
 from invenio_records_files.models import RecordsBuckets
 from six.moves import filter
 
+from zenodo.modules.records.indexer import ZenodoRecordIndexer
 from zenodo.modules.records.serializers.schemas.common import ui_link_for
 from zenodo.modules.records.utils import is_deposit, is_record
 
@@ -126,7 +126,7 @@ def sync_record_oai(uuid, cache=None):
         rec['_oai']['sets'] = synced_sets
         rec.commit()
         db.session.commit()
-        RecordIndexer().bulk_index([str(rec.id), ])
+        ZenodoRecordIndexer().bulk_index([str(rec.id), ])
         logger.info('Minted new OAI PID ({pid}) for record {id}'.format(
             pid=pid, id=uuid))
     elif oai_pid_q.count() == 1:
@@ -150,7 +150,7 @@ def sync_record_oai(uuid, cache=None):
                 del rec['_oai']['sets']  # Don't store empty list
             rec.commit()
             db.session.commit()
-            RecordIndexer().bulk_index([str(rec.id), ])
+            ZenodoRecordIndexer().bulk_index([str(rec.id), ])
             logger.info('Matching OAI PID ({pid}) for record {id}'.format(
                 pid=pid, id=uuid))
 
@@ -195,7 +195,7 @@ def repair_record_metadata(uuid):
         rec['_files'] = good_revision['_files']
     rec.commit()
     db.session.commit()
-    RecordIndexer().bulk_index([str(rec.id), ])
+    ZenodoRecordIndexer().bulk_index([str(rec.id), ])
 
 
 @shared_task
@@ -209,7 +209,7 @@ def remove_oaiset_spec(record_uuid, spec):
         del rec['_oai']['sets']
     rec.commit()
     db.session.commit()
-    RecordIndexer().bulk_index([str(rec.id), ])
+    ZenodoRecordIndexer().bulk_index([str(rec.id), ])
 
 
 @shared_task
@@ -220,7 +220,7 @@ def add_oaiset_spec(record_uuid, spec):
     rec['_oai']['updated'] = datetime_to_datestamp(datetime.utcnow())
     rec.commit()
     db.session.commit()
-    RecordIndexer().bulk_index([str(rec.id), ])
+    ZenodoRecordIndexer().bulk_index([str(rec.id), ])
 
 
 def iter_record_oai_tasks(query, spec, func):